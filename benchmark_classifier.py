@@ -0,0 +1,298 @@
+"""
+Message Classifier Benchmark - Golden corpus check and speed comparison
+Checks message_classifier against classifier_golden.json (expected results
+recorded from the original per-message re.search loops) and times both
+implementations on the same messages.
+
+Usage:
+    python benchmark_classifier.py                # check + benchmark
+    python benchmark_classifier.py --rounds 500
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+import message_classifier
+
+GOLDEN_FILE = "classifier_golden.json"
+
+
+# ==================== ORIGINAL IMPLEMENTATION ====================
+# Copied from UnifiedWhatsAppHandler before message_classifier, for timing.
+
+def legacy_is_substitute_response(message: str) -> bool:
+    message_lower = message.lower().strip()
+    accept_patterns = [
+        r'accept\s+#?\d+',
+        r'yes\s+#?\d+',
+        r'confirm\s+#?\d+',
+        r'ok\s+#?\d+',
+    ]
+    decline_patterns = [
+        r'decline\s+#?\d+',
+        r'reject\s+#?\d+',
+        r'no\s+#?\d+',
+        r'cannot\s+#?\d+',
+        r'can\'t\s+#?\d+',
+    ]
+    all_patterns = accept_patterns + decline_patterns
+    return any(re.search(pattern, message_lower) for pattern in all_patterns)
+
+
+def legacy_is_manager_command(message: str) -> bool:
+    message_lower = message.lower().strip()
+    manager_keywords = [
+        'approve', 'reject', 'deny', 'status', 'list', 'pending',
+        'assign', 'help', 'commands'
+    ]
+    has_leave_id = re.search(r'#?\d+', message)
+    has_manager_keyword = any(keyword in message_lower for keyword in manager_keywords)
+    return bool(has_manager_keyword or (has_leave_id and len(message.split()) <= 5))
+
+
+def legacy_parse_leave_intent(message: str) -> bool:
+    message_lower = message.lower().strip()
+    leave_keywords = [
+        'leave', 'apply for leave', 'need leave', 'want leave', 'request leave',
+        'take leave', 'get leave', 'have leave', 'go on leave',
+        'time off', 'day off', 'days off', 'week off', 'weeks off',
+        'vacation', 'holiday', 'break', 'rest',
+        'absent', 'away', 'not available', 'unavailable', 'out of office',
+        'won\'t be in', 'will be away', 'cannot come', 'can\'t come',
+        'sick leave', 'medical leave', 'casual leave', 'emergency leave',
+        'personal leave', 'family leave', 'maternity leave', 'paternity leave',
+        'need to be away', 'have to go', 'going away', 'traveling',
+        'not coming', 'skip work', 'miss work', 'off work'
+    ]
+    intent_patterns = [
+        r'\bi\s+(need|want|would like|require|request)\s+.*(leave|time off|day off|vacation)',
+        r'\bi\s+(will be|am going to be|gonna be)\s+.*(away|absent|unavailable|out)',
+        r'\bi\s+(have to|need to|must)\s+.*(go|travel|be away|take time)',
+        r'\bcan\s+i\s+(get|have|take)\s+.*(leave|time off|day off)',
+        r'\bi\s+(won\'t|will not|cannot|can\'t)\s+be\s+(in|available|here)',
+        r'\bapply\s+for\s+.*(leave|vacation|time off)',
+        r'\brequest\s+.*(leave|vacation|time off)',
+        r'\btake\s+.*(leave|vacation|time off|day off|week off)',
+        r'\bneed\s+.*(leave|vacation|time off|day off|week off)',
+        r'\bgoing\s+on\s+.*(leave|vacation|holiday)',
+    ]
+    keyword_match = any(keyword in message_lower for keyword in leave_keywords)
+    pattern_match = any(re.search(pattern, message_lower) for pattern in intent_patterns)
+    return keyword_match or pattern_match
+
+
+def legacy_extract_leave_details(message: str) -> Dict:
+    details = {}
+    message_lower = message.lower().strip()
+    day_patterns = [
+        r'(\d+)\s*days?',
+        r'(\d+)\s*weeks?',
+        r'(\d+)\s*months?',
+        r'(one|two|three|four|five|six|seven|eight|nine|ten)\s*days?',
+        r'(one|two|three|four)\s*weeks?',
+        r'(a|an)\s*day',
+        r'(a|an)\s*week',
+        r'(a|an)\s*month',
+        r'for\s+(\d+)\s*days?',
+        r'for\s+(\d+)\s*weeks?',
+        r'for\s+(a|an|one)\s*(day|week)',
+        r'(\d+)\s*day\s*(leave|off|vacation)',
+        r'(\d+)\s*week\s*(leave|off|vacation)',
+        r'couple\s+of\s+days',
+        r'few\s+days',
+        r'several\s+days',
+    ]
+    for pattern in day_patterns:
+        match = re.search(pattern, message_lower)
+        if match:
+            day_text = match.group(1)
+            text_to_num = {
+                'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+                'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
+                'a': 1, 'an': 1, 'couple': 2, 'few': 3, 'several': 4
+            }
+            if day_text.isdigit():
+                days = int(day_text)
+            elif day_text in text_to_num:
+                days = text_to_num[day_text]
+            else:
+                continue
+            if 'week' in match.group(0):
+                days *= 7
+            elif 'month' in match.group(0):
+                days *= 30
+            details['days'] = days
+            break
+
+    reason_patterns = [
+        r'for\s+(.+?)(?:\.|$|because|due to|since)',
+        r'because\s+(.+?)(?:\.|$|for|due to)',
+        r'due to\s+(.+?)(?:\.|$|because|for)',
+        r'since\s+(.+?)(?:\.|$|because|for)',
+        r'as\s+(.+?)(?:\.|$|because|for)',
+        r'to\s+(.+?)(?:\.|$|because|for|due to)',
+        r'reason:?\s*(.+?)(?:\.|$)',
+        r'purpose:?\s*(.+?)(?:\.|$)',
+        r'(sick|ill|unwell|not feeling well)',
+        r'(doctor|hospital|medical|appointment)',
+        r'(family|personal|emergency)',
+        r'(vacation|holiday|travel|trip)',
+        r'(wedding|marriage|funeral)',
+        r'(pregnant|pregnancy|maternity|paternity)',
+        r'(business|conference|meeting|training)',
+        r'i\s+(am|will be|have to|need to|must)\s+(.+?)(?:\.|$)',
+        r'my\s+(.+?)(?:\.|$)',
+        r'going\s+(.+?)(?:\.|$)',
+        r'attending\s+(.+?)(?:\.|$)',
+        r'off\s+(.+?)(?:\.|$)',
+        r'leave\s+(.+?)(?:\.|$)',
+    ]
+    for pattern in reason_patterns:
+        match = re.search(pattern, message_lower)
+        if match:
+            reason = match.group(1).strip()
+            reason = re.sub(r'^(to|for|because|due to|since|as)\s+', '', reason)
+            reason = re.sub(r'\s+', ' ', reason)
+            if len(reason) > 2 and reason not in ['it', 'this', 'that', 'some', 'the']:
+                details['reason'] = reason
+                break
+    return details
+
+
+def legacy_parse_manager_command(message: str) -> Dict:
+    message_lower = message.lower().strip()
+    if any(word in message_lower for word in ['approve', 'accept']):
+        leave_id_match = re.search(r'#?(\d+)', message)
+        if leave_id_match:
+            return {'action': 'approve', 'leave_id': int(leave_id_match.group(1))}
+    elif any(word in message_lower for word in ['reject', 'deny']):
+        leave_id_match = re.search(r'#?(\d+)', message)
+        if leave_id_match:
+            return {'action': 'reject', 'leave_id': int(leave_id_match.group(1)), 'reason': message}
+    elif 'assign' in message_lower:
+        assign_match = re.search(r'assign\s+(.+?)\s+to\s+#?(\d+)', message_lower)
+        if assign_match:
+            return {
+                'action': 'assign',
+                'substitute_name': assign_match.group(1).strip(),
+                'leave_id': int(assign_match.group(2))
+            }
+    elif any(word in message_lower for word in ['status', 'check', 'info']):
+        leave_id_match = re.search(r'#?(\d+)', message)
+        if leave_id_match:
+            return {'action': 'status', 'leave_id': int(leave_id_match.group(1))}
+        else:
+            return {'action': 'status_all'}
+    elif any(word in message_lower for word in ['list', 'pending', 'show']):
+        return {'action': 'list'}
+    elif 'help' in message_lower or 'commands' in message_lower:
+        return {'action': 'help'}
+    return {'action': 'unknown'}
+
+
+# ==================== CHECK AND BENCHMARK ====================
+
+FIELDS: Dict[str, Callable] = {
+    "substitute_response": message_classifier.is_substitute_response,
+    "manager_command": message_classifier.is_manager_command,
+    "leave_intent": message_classifier.parse_leave_intent,
+    "leave_details": message_classifier.extract_leave_details,
+    "manager_parse": message_classifier.parse_manager_command,
+}
+
+# The same fields read from one classify() result (what the webhook does)
+CLASSIFIED: Dict[str, Callable] = {
+    "substitute_response": lambda c: c.substitute_response,
+    "manager_command": lambda c: c.manager_command,
+    "leave_intent": lambda c: c.leave_intent,
+    "leave_details": lambda c: c.leave_details,
+    "manager_parse": lambda c: c.command,
+}
+
+LEGACY: Dict[str, Callable] = {
+    "substitute_response": legacy_is_substitute_response,
+    "manager_command": legacy_is_manager_command,
+    "leave_intent": legacy_parse_leave_intent,
+    "leave_details": legacy_extract_leave_details,
+    "manager_parse": legacy_parse_manager_command,
+}
+
+
+def load_golden(path: str = GOLDEN_FILE) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["cases"]
+
+
+def check(cases: List[Dict]) -> int:
+    """Number of fields that differ from the golden results"""
+    mismatches = 0
+    for case in cases:
+        for field, classify in FIELDS.items():
+            got = classify(case["message"])
+            if got != case["expected"][field]:
+                mismatches += 1
+                print(f"❌ {field} of {case['message']!r}: expected {case['expected'][field]!r}, got {got!r}")
+        classified = message_classifier.classify(case["message"])
+        for field, read in CLASSIFIED.items():
+            got = read(classified)
+            if got != case["expected"][field]:
+                mismatches += 1
+                print(f"❌ classify().{field} of {case['message']!r}: expected {case['expected'][field]!r}, got {got!r}")
+    return mismatches
+
+
+def classify_all_fields(message: str) -> None:
+    classified = message_classifier.classify(message)
+    for read in CLASSIFIED.values():
+        read(classified)
+
+
+def time_per_message(functions: Dict[str, Callable], messages: List[str], rounds: int) -> float:
+    """Microseconds to run every function once over one message"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            for function in functions.values():
+                try:
+                    function(message)
+                except IndexError:
+                    # Original 'couple/few/several days' patterns had no group
+                    pass
+    return (time.perf_counter() - started) / (rounds * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    cases = load_golden()
+    messages = [case["message"] for case in cases]
+
+    print(f"🧪 {len(cases)} golden messages")
+    mismatches = check(cases)
+    print("✅ All fields match" if not mismatches else f"❌ {mismatches} mismatches")
+
+    legacy_us = time_per_message(LEGACY, messages, args.rounds)
+    compiled_us = time_per_message(FIELDS, messages, args.rounds)
+    print(f"\n⏱️  All five classifications per message ({args.rounds} rounds):")
+    print(f"   original re.search loops: {legacy_us:8.1f} µs")
+    print(f"   message_classifier:       {compiled_us:8.1f} µs")
+    classify_us = time_per_message({"classify": classify_all_fields}, messages, args.rounds)
+    print(f"   one classify() pass:      {classify_us:8.1f} µs")
+    print(f"   speedup:                  {legacy_us / compiled_us:8.1f}x")
+
+    print(f"\nPer function (µs per message):")
+    for field in FIELDS:
+        legacy_field = time_per_message({field: LEGACY[field]}, messages, args.rounds)
+        compiled_field = time_per_message({field: FIELDS[field]}, messages, args.rounds)
+        print(f"   {field:<20} {legacy_field:8.1f} -> {compiled_field:8.1f}  ({legacy_field / compiled_field:.1f}x)")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
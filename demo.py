@@ -2,6 +2,12 @@
 Demo: Integrated AI-Powered HRMS with LangChain + Gemini
 Simulates the complete leave management workflow
 """
+import os
+import tempfile
+
+# Keep demo leaves out of (and unblocked by) a running server's HR_STATE_DIR
+os.environ['HR_STATE_DIR'] = tempfile.mkdtemp(prefix='hr_demo_state_')
+
 from integrated_hr_agent import IntegratedHRAgent
 
 def print_separator():
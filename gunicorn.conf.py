@@ -0,0 +1,21 @@
+"""
+Gunicorn settings picked up automatically from the working directory
+Command-line flags (see Dockerfile) still take precedence.
+"""
+import sys
+import threading
+
+
+def post_worker_init(worker):
+    """Build the handler (and warm the AI chain) once the worker is serving, not on the first webhook"""
+    if 'unified_whatsapp_handler' not in sys.modules:
+        return
+
+    def warm():
+        try:
+            from unified_whatsapp_handler import get_unified_handler
+            get_unified_handler()
+        except Exception as e:
+            worker.log.warning(f"Handler warm-up failed: {e}")
+
+    threading.Thread(target=warm, name="handler-warm-up", daemon=True).start()
@@ -1,66 +1,34 @@
 """
 Integrated HR Agent combining LangChain/Gemini with HRMS structure
 """
-import pandas as pd
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-
-load_dotenv()
+from leave_rules import LeaveRuleStats, RuleAnalysis, analyze_leave
+from leave_store import Leave, Substitution, create_leave_store
+from llm_cache import create_llm_cache
+from llm_guard import LLMGuard
+from prompt_payload import build_prompt_inputs
+from roster_cache import load_roster
+from roster_index import RosterDiff, RosterIndex
+from roster_watcher import RosterWatcher
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-@dataclass
-class Teacher:
-    id: int
-    name: str
-    phone: str
-    department: Optional[str] = None
-    available_leaves: int = 0
-    pending_work: Optional[str] = None
-    role_criticality: Optional[str] = None
-
-
-@dataclass
-class Leave:
-    id: int
-    teacher_id: int
-    teacher_name: str
-    start_date: date
-    end_date: date
-    days: int
-    reason: str
-    status: str = "pending"  # pending, substitute_assigned, substitute_confirmed, approved, rejected
-    suggested_substitute: Optional[str] = None
-    substitute_note: Optional[str] = None
-
-
-@dataclass
-class Substitution:
-    id: int
-    leave_id: int
-    substitute_name: str
-    status: str = "pending"
+load_dotenv()
 
+LLM_MODEL = "gemini-2.5-flash"
 
-class IntegratedHRAgent:
-    """HR Agent using LangChain + Gemini for intelligent leave decisions"""
-    
-    def __init__(self, excel_file: str = "employees.xlsx"):
-        self.df = pd.read_excel(excel_file)
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.3
-        )
-        
-        # Leave analysis prompt (AI provides insights, not decisions)
-        self.leave_prompt = PromptTemplate(
-            input_variables=["employee_data", "employee_name", "leave_days", "reason", "available_substitutes"],
-            template="""
+LEAVE_PROMPT_TEMPLATE = """
 You are an AI HR Assistant analyzing a leave request. Provide insights to help the HOD make a decision.
 
 Employee requesting leave:
@@ -85,34 +53,243 @@ Analyze and provide:
 Format your response clearly with these sections. Be objective and data-driven.
 DO NOT make the final decision - only provide analysis and recommendation.
 """
+
+# Cached responses belong to one model + prompt wording
+LLM_CACHE_NAMESPACE = f"{LLM_MODEL}:{hashlib.sha256(LEAVE_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:16]}"
+
+
+@dataclass
+class Teacher:
+    id: int
+    name: str
+    phone: str
+    department: Optional[str] = None
+    available_leaves: int = 0
+    pending_work: Optional[str] = None
+    role_criticality: Optional[str] = None
+
+
+@dataclass
+class _PendingAnalysis:
+    """A leave whose analysis needs the LLM: prompt built, result not yet in"""
+    leave_id: int
+    summary: Dict
+    prompt_inputs: Dict
+    fingerprint: str
+    analysis: Dict = field(default_factory=dict)
+
+
+class IntegratedHRAgent:
+    """HR Agent using LangChain + Gemini for intelligent leave decisions"""
+    
+    def __init__(self, excel_file: str = "employees.xlsx"):
+        self.excel_file = excel_file
+        
+        # Memoized analyses: leave_id -> (input fingerprint, ai_analysis/analysis_source/triage)
+        self._analysis_cache: Dict[int, Tuple[str, Dict]] = {}
+        self._analysis_lock = threading.Lock()
+        
+        # Background pool so leave submission never waits on Gemini
+        self._analysis_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('AI_ANALYSIS_WORKERS', '2')),
+            thread_name_prefix="ai-analysis"
         )
+        # In-flight analyses by leave id: concurrent callers join instead of recomputing
+        self._analysis_futures: Dict[int, Future] = {}
+        self.coalesced_analyses = 0
+        
+        # Prefetches within the window are analyzed together (one concurrent batch)
+        self.batch_window = float(os.getenv('AI_BATCH_WINDOW_MS', '50')) / 1000
+        self.batch_concurrency = int(os.getenv('AI_BATCH_CONCURRENCY', '8'))
+        self._batch_queue: List[int] = []
+        self._batch_scheduled = False
+        
+        # Routine requests are analyzed by leave_rules without Gemini (AI_FAST_PATH=false to disable)
+        self.fast_path = os.getenv('AI_FAST_PATH', 'true').lower() in ('1', 'true', 'yes')
+        self.rule_stats = LeaveRuleStats()
         
-        self.chain = self.leave_prompt | self.llm | StrOutputParser()
+        # Gemini responses persisted by prompt inputs, across restarts and workers (LLM_CACHE=false to disable)
+        self.llm_cache = create_llm_cache(LLM_CACHE_NAMESPACE)
+        
+        # Deadline, concurrency cap and circuit breaker for every LLM call
+        self.llm_guard = LLMGuard()
+        
+        # Leave/substitution storage: journaled in-memory indexes or shared SQLite
+        # (HR_STORAGE_BACKEND); the roster is mirrored into it by set_roster
+        self.store = create_leave_store()
+        
+        self._roster_lock = threading.Lock()
+        self.set_roster_records(load_roster(excel_file))
+        
+        # Pick up edits to the workbook without a restart (ROSTER_WATCH_SECONDS, 0 = off)
+        self.roster_watcher = RosterWatcher(excel_file, self.reload_roster).start()
+        
+        # The Gemini client and prompt chain are built on first use (or by
+        # warm_up() in the background): most messages never need them
+        self._chain = None
+        self._llm = None
+        self._leave_prompt = None
+        self._chain_lock = threading.Lock()
+    
+    @property
+    def chain(self):
+        """leave_prompt | Gemini | StrOutputParser, constructed on first use"""
+        if self._chain is None:
+            with self._chain_lock:
+                if self._chain is None:
+                    self._chain = self._build_chain()
+        return self._chain
+    
+    @chain.setter
+    def chain(self, chain) -> None:
+        self._chain = chain
+    
+    @property
+    def llm(self):
+        self.chain
+        return self._llm
+    
+    @property
+    def leave_prompt(self):
+        self.chain
+        return self._leave_prompt
+    
+    def _create_llm(self):
+        """The chat model behind the chain (load tests substitute a fake)"""
+        # Imported here: langchain + google-genai account for most of the import time
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
+        return ChatGoogleGenerativeAI(
+            model=LLM_MODEL,
+            temperature=0.3
+        )
+    
+    def _build_chain(self):
+        from langchain_core.prompts import PromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        
+        llm = self._create_llm()
+        
+        # Leave analysis prompt (AI provides insights, not decisions)
+        leave_prompt = PromptTemplate(
+            input_variables=["employee_data", "employee_name", "leave_days", "reason", "available_substitutes"],
+            template=LEAVE_PROMPT_TEMPLATE
+        )
         
-        # In-memory storage (simulating database)
-        self.leaves: List[Leave] = []
-        self.substitutions: List[Substitution] = []
-        self.leave_counter = 1
-        self.sub_counter = 1
+        self._llm, self._leave_prompt = llm, leave_prompt
+        return leave_prompt | llm | StrOutputParser()
+    
+    def warm_up(self) -> None:
+        """Build the LLM chain ahead of the first analysis"""
+        try:
+            self.chain
+        except Exception as e:
+            # The first real analysis will retry (and report) the failure
+            print(f"AI warm-up failed: {e}")
     
-    def find_teacher_by_name(self, name: str) -> Optional[Dict]:
-        """Find teacher in the Excel database"""
-        teacher = self.df[self.df["name"].str.lower() == name.lower()]
-        if teacher.empty:
+    def start_warm_up(self) -> Optional[threading.Thread]:
+        """Warm up in a background thread unless AI_WARMUP=false"""
+        if os.getenv('AI_WARMUP', 'true').lower() not in ('1', 'true', 'yes'):
             return None
-        return teacher.to_dict(orient="records")[0]
+        thread = threading.Thread(target=self.warm_up, name="ai-warm-up", daemon=True)
+        thread.start()
+        return thread
+    
+    @property
+    def leaves(self) -> List[Leave]:
+        """All leave requests in id order (read-only snapshot)"""
+        return self.store.list_leaves()
+    
+    @property
+    def substitutions(self) -> List[Substitution]:
+        """All substitution records in id order (read-only snapshot)"""
+        return self.store.list_substitutions()
+    
+    @property
+    def leave_counter(self) -> int:
+        return self.store.leave_counter
+    
+    @property
+    def sub_counter(self) -> int:
+        return self.store.sub_counter
+    
+    def get_leave(self, leave_id: int) -> Optional[Leave]:
+        """Leave request by id"""
+        return self.store.get_leave(leave_id)
+    
+    def list_leaves(self, *statuses: str) -> List[Leave]:
+        """Leave requests in id order, optionally only those with the given statuses"""
+        return self.store.list_leaves(*statuses)
+    
+    def list_department_leaves(self, department: str, *statuses: str) -> List[Leave]:
+        """Leave requests from one department, e.g. pending leaves for the HOD of Science"""
+        return self.store.leaves_for_department(department, *statuses)
+    
+    def leave_count(self, status: Optional[str] = None) -> int:
+        """Number of leave requests, overall or with one status"""
+        return self.store.count_leaves(status)
+    
+    def get_substitutions(self, leave_id: int, status: Optional[str] = None) -> List[Substitution]:
+        """Substitutions assigned to a leave, optionally filtered by status"""
+        return self.store.substitutions_for_leave(leave_id, status)
+    
+    def find_substitution(self, leave_id: int, substitute_name: str) -> Optional[Substitution]:
+        """Substitution for a leave by substitute name (case-insensitive)"""
+        return self.store.find_substitution(leave_id, substitute_name)
+    
+    @property
+    def df(self) -> "pd.DataFrame":
+        """The roster as a DataFrame (built on demand; lookups use roster_index)"""
+        import pandas as pd
+        return pd.DataFrame(self.roster_index.records)
+    
+    def set_roster(self, df: "pd.DataFrame") -> RosterDiff:
+        """Replace the employee roster from a DataFrame; returns the row diff"""
+        return self.set_roster_records(df.to_dict(orient="records"))
+    
+    def set_roster_records(self, records: List[Dict]) -> RosterDiff:
+        """Replace the employee roster and update its lookup indexes; returns the row diff"""
+        with self._roster_lock:
+            current = getattr(self, 'roster_index', None)
+            if current is None:
+                roster_index, diff = RosterIndex(records), RosterDiff(added=records)
+            else:
+                # Only added/changed/removed rows are re-indexed
+                roster_index, diff = current.updated(records)
+                if diff.empty:
+                    return diff
+            
+            # The new index is complete before it is published, so concurrent
+            # lookups see either the old roster or the new one, never a mix
+            self.store.sync_roster(records)
+            self.roster_index = roster_index
+        
+        # Employee records feed the prompt, so cached analyses are stale now
+        self.invalidate_analysis()
+        return diff
+    
+    def reload_roster(self) -> RosterDiff:
+        """Re-read the Excel roster from disk (served from the compiled cache if unchanged)"""
+        return self.set_roster_records(load_roster(self.excel_file))
+    
+    def find_teacher_by_phone(self, phone: str) -> Optional[Dict]:
+        """Find teacher by phone number (last 10 digits, O(1) index lookup)"""
+        teacher = self.roster_index.find_by_phone(phone)
+        return dict(teacher) if teacher else None
+    
+    def find_teacher_by_name(self, name: str, fuzzy: bool = False) -> Optional[Dict]:
+        """Find teacher in the Excel database (case-insensitive; fuzzy=True tolerates typos)"""
+        teacher = self.roster_index.find_by_name(name, fuzzy=fuzzy)
+        return dict(teacher) if teacher else None
+    
+    def employee_names(self, exclude: Optional[str] = None) -> List[str]:
+        """All employee names in roster order, optionally excluding one person"""
+        return self.roster_index.employee_names(exclude)
     
     def suggest_substitutes(self, requesting_teacher: str, leave_days: int) -> List[str]:
         """Suggest available substitute teachers"""
-        # Get all teachers except the one requesting leave
-        available = self.df[self.df["name"].str.lower() != requesting_teacher.lower()]
-        
-        # Simple logic: suggest teachers with lower workload or same department
-        substitutes = []
-        for _, teacher in available.head(3).iterrows():
-            substitutes.append(f"{teacher['name']} (Dept: {teacher.get('department', 'N/A')})")
-        
-        return substitutes
+        # First three colleagues in roster order; labels are precomputed per roster row
+        return self.roster_index.substitute_candidates(requesting_teacher)
     
     def submit_leave_request(self, teacher_name: str, leave_days: int, reason: str, 
                            suggested_substitute: Optional[str] = None, 
@@ -124,20 +301,19 @@ DO NOT make the final decision - only provide analysis and recommendation.
             return {"status": "error", "message": "Teacher not found in database"}
         
         # Create leave record
-        leave = Leave(
-            id=self.leave_counter,
-            teacher_id=teacher.get("id", self.leave_counter),
+        leave = self.store.add_leave(
+            teacher_id=teacher.get("id", self.store.leave_counter),
             teacher_name=teacher_name,
             start_date=datetime.now().date(),
             end_date=datetime.now().date(),
             days=leave_days,
             reason=reason,
-            status="pending",
             suggested_substitute=suggested_substitute,
             substitute_note=substitute_note
         )
-        self.leaves.append(leave)
-        self.leave_counter += 1
+        
+        # Start the AI analysis now; notifications pick it up when ready
+        self.prefetch_ai_analysis(leave.id)
         
         return {
             "status": "success",
@@ -145,10 +321,10 @@ DO NOT make the final decision - only provide analysis and recommendation.
             "leave_id": leave.id
         }
     
-    def get_ai_analysis(self, leave_id: int) -> Dict:
-        """Get AI analysis for a leave request (doesn't make decision)"""
+    def get_leave_summary(self, leave_id: int) -> Dict:
+        """Get leave details, teacher record and substitutes without calling the LLM"""
         # Find the leave request
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
@@ -159,16 +335,6 @@ DO NOT make the final decision - only provide analysis and recommendation.
         
         # Get substitute suggestions
         substitutes = self.suggest_substitutes(leave.teacher_name, leave.days)
-        substitute_str = "\n".join([f"- {s}" for s in substitutes]) if substitutes else "None available"
-        
-        # Get AI analysis
-        response = self.chain.invoke({
-            "employee_data": teacher,
-            "employee_name": leave.teacher_name,
-            "leave_days": leave.days,
-            "reason": leave.reason,
-            "available_substitutes": substitute_str
-        })
         
         return {
             "status": "success",
@@ -176,21 +342,283 @@ DO NOT make the final decision - only provide analysis and recommendation.
             "teacher_name": leave.teacher_name,
             "leave_days": leave.days,
             "reason": leave.reason,
-            "ai_analysis": response,
+            "suggested_substitute": leave.suggested_substitute,
             "substitutes": substitutes,
             "teacher_data": teacher
         }
     
+    def triage_leave(self, summary: Dict) -> RuleAnalysis:
+        """Deterministic checks on a leave summary: routine (answer now) or escalate to the LLM"""
+        suggested = summary.get("suggested_substitute")
+        busy = self._employees_on_leave()
+        # Only candidates who are free themselves can be the fallback substitute
+        free = [label for label in summary["substitutes"]
+                if self._substitute_available(label.rsplit(" (Dept: ", 1)[0], busy)]
+        return analyze_leave(
+            summary["teacher_data"], summary["leave_days"], summary["reason"], free,
+            suggested_substitute=suggested,
+            substitute_available=self._substitute_available(suggested, busy) if suggested else True
+        )
+    
+    def _employees_on_leave(self) -> Set[str]:
+        """Lower-cased names with a leave open now or still to come"""
+        today = date.today()
+        return {leave.teacher_name.strip().lower()
+                for leave in self.store.list_leaves("pending", "substitute_assigned", "substitute_confirmed", "approved")
+                if leave.status != "approved" or leave.end_date >= today}
+    
+    def _substitute_available(self, name: str, busy: Optional[Set[str]] = None) -> bool:
+        """On the roster and not on leave (or asking for leave) themselves"""
+        substitute = self.find_teacher_by_name(name)
+        if not substitute:
+            return False
+        busy = self._employees_on_leave() if busy is None else busy
+        return substitute["name"].strip().lower() not in busy
+    
+    def get_ai_analysis(self, leave_id: int) -> Dict:
+        """Get AI analysis for a leave request (doesn't make decision)
+        
+        Single flight: concurrent callers for the same leave (say the
+        manager's "Approve #5" during the substitute's "Accept #5") wait on
+        one computation and share its result.
+        """
+        claimed, running = self._claim_analyses([leave_id])
+        if running:
+            return running[leave_id].result()
+        
+        try:
+            result = self._compute_ai_analysis(leave_id)
+        except Exception as e:
+            self._settle(claimed, {leave_id: e})
+            raise
+        self._settle(claimed, {leave_id: result})
+        return result
+    
+    def get_ai_analyses(self, leave_ids: List[int], max_concurrency: Optional[int] = None) -> Dict[int, Dict]:
+        """AI analyses for several leaves, with their LLM calls sent out together
+        
+        Wall time is about one LLM round-trip for up to `max_concurrency`
+        leaves (AI_BATCH_CONCURRENCY, within LLM_MAX_CONCURRENCY). A failed
+        LLM call gives that leave the rule-based fallback summary instead of
+        failing the batch. Leaves already being analyzed are joined, not redone.
+        """
+        leave_ids = list(dict.fromkeys(leave_ids))
+        claimed, running = self._claim_analyses(leave_ids)
+        
+        try:
+            results = self._analyze_batch(list(claimed), max_concurrency)
+        except Exception as e:
+            results = {leave_id: e for leave_id in claimed}
+        self._settle(claimed, results)
+        for leave_id, future in running.items():
+            try:
+                results[leave_id] = future.result()
+            except Exception as e:
+                results[leave_id] = e
+        
+        return {
+            leave_id: ({"status": "error", "message": f"AI analysis failed: {results[leave_id]}"}
+                       if isinstance(results[leave_id], Exception) else results[leave_id])
+            for leave_id in leave_ids
+        }
+    
+    def prefetch_ai_analysis(self, leave_id: int) -> Future:
+        """Queue AI analysis for a leave on the background pool (returns its Future)"""
+        return self.prefetch_ai_analyses([leave_id])[leave_id]
+    
+    def prefetch_ai_analyses(self, leave_ids: List[int]) -> Dict[int, Future]:
+        """Queue AI analyses on the background pool; returns a Future per leave
+        
+        Leaves queued within AI_BATCH_WINDOW_MS of each other (several
+        submissions at once, or a whole list) share one batch.
+        """
+        claimed, running = self._claim_analyses(leave_ids, queue=True)
+        with self._analysis_lock:
+            flush = bool(claimed) and not self._batch_scheduled
+            if flush:
+                self._batch_scheduled = True
+        if flush:
+            self._analysis_executor.submit(self._flush_analysis_batch)
+        return {**running, **claimed}
+    
+    def _claim_analyses(self, leave_ids: List[int], queue: bool = False) -> Tuple[Dict[int, Future], Dict[int, Future]]:
+        """Split leaves into those this caller now computes (a new in-flight Future
+        each) and those already in flight elsewhere (their Futures, to join)"""
+        claimed, running = {}, {}
+        with self._analysis_lock:
+            for leave_id in dict.fromkeys(leave_ids):
+                future = self._analysis_futures.get(leave_id)
+                if future is not None:
+                    running[leave_id] = future
+                    self.coalesced_analyses += 1
+                    continue
+                future = claimed[leave_id] = self._analysis_futures[leave_id] = Future()
+                if queue:
+                    self._batch_queue.append(leave_id)
+        
+        # Registered outside the lock: the callback takes it, and runs inline if already done
+        for leave_id, future in claimed.items():
+            future.add_done_callback(lambda f, leave_id=leave_id: self._forget_analysis_future(leave_id, f))
+        return claimed, running
+    
+    @staticmethod
+    def _settle(futures: Dict[int, Future], results: Dict[int, object]) -> None:
+        """Hand each claimed leave's result (or exception) to everyone waiting on it"""
+        for leave_id, future in futures.items():
+            result = results[leave_id]
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    def _flush_analysis_batch(self) -> None:
+        """Analyze everything queued by prefetch_ai_analyses during the batch window"""
+        time.sleep(self.batch_window)
+        with self._analysis_lock:
+            leave_ids, self._batch_queue = self._batch_queue, []
+            self._batch_scheduled = False
+            futures = {leave_id: self._analysis_futures[leave_id] for leave_id in leave_ids}
+        
+        try:
+            results = self._analyze_batch(leave_ids)
+        except Exception as e:
+            results = {leave_id: e for leave_id in leave_ids}
+        self._settle(futures, results)
+    
+    def _forget_analysis_future(self, leave_id: int, future: Future) -> None:
+        """Drop a finished analysis (its result now lives in the memo)"""
+        with self._analysis_lock:
+            if self._analysis_futures.get(leave_id) is future:
+                del self._analysis_futures[leave_id]
+    
+    def analysis_stats(self) -> Dict:
+        """Fast-path decisions, LLM time saved, and single-flight joins"""
+        with self._analysis_lock:
+            in_flight = len(self._analysis_futures)
+        return {**self.rule_stats.stats(), "coalesced": self.coalesced_analyses, "in_flight": in_flight}
+    
+    def _compute_ai_analysis(self, leave_id: int) -> Dict:
+        """Answer from the memo, the rule-based fast path, the response cache or the LLM, in that order"""
+        pending = self._prepare_analysis(leave_id)
+        if isinstance(pending, dict):
+            return pending
+        
+        started = time.perf_counter()
+        try:
+            response = self.llm_guard.call(self.chain.invoke, pending.prompt_inputs)
+        except Exception as e:
+            return self._fallback_analysis(pending, e)
+        return self._finish_analysis(pending, response, time.perf_counter() - started)
+    
+    def _analyze_batch(self, leave_ids: List[int], max_concurrency: Optional[int] = None) -> Dict[int, object]:
+        """Result dict (or the exception raised) per leave; LLM calls go out concurrently"""
+        results, pending = {}, []
+        for leave_id in leave_ids:
+            try:
+                prepared = self._prepare_analysis(leave_id)
+            except Exception as e:
+                prepared = e
+            if isinstance(prepared, _PendingAnalysis):
+                pending.append(prepared)
+            else:
+                results[leave_id] = prepared
+        
+        if pending:
+            # Each call is guarded on its own (deadline, concurrency cap, breaker)
+            started = time.perf_counter()
+            responses = self.llm_guard.map(self.chain.invoke, [item.prompt_inputs for item in pending],
+                                           max_concurrency or self.batch_concurrency)
+            elapsed = time.perf_counter() - started
+            for item, response in zip(pending, responses):
+                results[item.leave_id] = (self._fallback_analysis(item, response) if isinstance(response, Exception)
+                                          else self._finish_analysis(item, response, elapsed))
+        return results
+    
+    def _prepare_analysis(self, leave_id: int):
+        """Shared first half of an analysis: the finished result dict (error, memoized,
+        rule-based or from the response cache), or a _PendingAnalysis holding the
+        prompt inputs for the LLM"""
+        summary = self.get_leave_summary(leave_id)
+        if summary["status"] != "success":
+            return summary
+        
+        # Only the roster fields the analysis reads, in a fixed compact layout
+        prompt_inputs = build_prompt_inputs(summary)
+        triage = None
+        if self.fast_path:
+            # Substitute availability changes without the prompt inputs changing,
+            # so the chosen substitute is part of the fingerprint too
+            started = time.perf_counter()
+            triage = self.triage_leave(summary)
+            rule_seconds = time.perf_counter() - started
+            fingerprint = self._fingerprint({**prompt_inputs, "rule_substitute": triage.substitute})
+        else:
+            fingerprint = self._fingerprint(prompt_inputs)
+        
+        # Reuse the previous analysis while its inputs are unchanged
+        with self._analysis_lock:
+            cached = self._analysis_cache.get(leave_id)
+        if cached and cached[0] == fingerprint:
+            return {**summary, **cached[1], "cached": True}
+        
+        pending = _PendingAnalysis(leave_id, summary, prompt_inputs, fingerprint)
+        if triage is not None:
+            decision = self.rule_stats.record(leave_id, triage, rule_seconds)
+            pending.analysis["triage"] = {**triage.as_dict(), **decision}
+            if triage.routine:
+                return self._store_analysis(pending, ai_analysis=triage.analysis, analysis_source="rules")
+        
+        if self.llm_cache is not None:
+            response = self.llm_cache.get(prompt_inputs)
+            if response is not None:
+                return self._store_analysis(pending, ai_analysis=response, analysis_source="llm_cache")
+        return pending
+    
+    def _finish_analysis(self, pending: "_PendingAnalysis", response: str, seconds: float) -> Dict:
+        self.rule_stats.record_llm(seconds)
+        if self.llm_cache is not None:
+            self.llm_cache.put(pending.prompt_inputs, response, seconds)
+        return self._store_analysis(pending, ai_analysis=response, analysis_source="llm")
+    
+    def _fallback_analysis(self, pending: "_PendingAnalysis", error: Exception) -> Dict:
+        """Rule-based summary when the LLM failed, timed out or its circuit is open (not memoized)"""
+        print(f"AI analysis for leave #{pending.leave_id} unavailable ({type(error).__name__}: {error}); "
+              f"using the rule-based summary")
+        triage = self.triage_leave(pending.summary)
+        return {**pending.summary, **pending.analysis, "ai_analysis": triage.analysis,
+                "analysis_source": "fallback", "ai_error": str(error)}
+    
+    def _store_analysis(self, pending: "_PendingAnalysis", **analysis) -> Dict:
+        pending.analysis.update(analysis)
+        with self._analysis_lock:
+            self._analysis_cache[pending.leave_id] = (pending.fingerprint, pending.analysis)
+        return {**pending.summary, **pending.analysis}
+    
+    def invalidate_analysis(self, leave_id: Optional[int] = None) -> None:
+        """Drop the cached analysis for one leave, or for all leaves"""
+        with self._analysis_lock:
+            if leave_id is None:
+                self._analysis_cache.clear()
+            else:
+                self._analysis_cache.pop(leave_id, None)
+    
+    @staticmethod
+    def _fingerprint(prompt_inputs: Dict) -> str:
+        """Stable hash of the values that go into the analysis prompt"""
+        payload = json.dumps(prompt_inputs, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
     def approve_leave(self, leave_id: int) -> Dict:
         """HOD approves the leave request (only after substitute is confirmed)"""
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
         if leave.status != "substitute_confirmed":
             return {"status": "error", "message": f"Cannot approve leave. Current status: {leave.status}. Substitute must be assigned and confirmed first."}
         
-        leave.status = "approved"
+        self.store.set_leave_status(leave, "approved")
+        self.invalidate_analysis(leave_id)
         return {
             "status": "success",
             "message": f"Leave #{leave_id} fully approved for {leave.teacher_name}",
@@ -199,11 +627,12 @@ DO NOT make the final decision - only provide analysis and recommendation.
     
     def finalize_leave_approval(self, leave_id: int) -> Dict:
         """Finalize leave approval after substitute accepts"""
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
-        leave.status = "approved"
+        self.store.set_leave_status(leave, "approved")
+        self.invalidate_analysis(leave_id)
         return {
             "status": "success",
             "message": f"Leave #{leave_id} fully approved for {leave.teacher_name}",
@@ -212,11 +641,12 @@ DO NOT make the final decision - only provide analysis and recommendation.
     
     def reject_leave(self, leave_id: int, reason: str = "") -> Dict:
         """HOD rejects the leave request"""
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
-        leave.status = "rejected"
+        self.store.set_leave_status(leave, "rejected")
+        self.invalidate_analysis(leave_id)
         return {
             "status": "success",
             "message": f"Leave #{leave_id} rejected for {leave.teacher_name}",
@@ -226,7 +656,7 @@ DO NOT make the final decision - only provide analysis and recommendation.
     
     def assign_substitute(self, leave_id: int, substitute_name: str) -> Dict:
         """Assign a substitute teacher to pending leave"""
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
@@ -239,17 +669,10 @@ DO NOT make the final decision - only provide analysis and recommendation.
             return {"status": "error", "message": "Substitute teacher not found"}
         
         # Update leave status
-        leave.status = "substitute_assigned"
+        self.store.set_leave_status(leave, "substitute_assigned")
         
         # Create substitution record
-        sub = Substitution(
-            id=self.sub_counter,
-            leave_id=leave_id,
-            substitute_name=substitute_name,
-            status="pending"
-        )
-        self.substitutions.append(sub)
-        self.sub_counter += 1
+        sub = self.store.add_substitution(leave_id, substitute_name)
         
         return {
             "status": "success",
@@ -259,11 +682,11 @@ DO NOT make the final decision - only provide analysis and recommendation.
     
     def confirm_substitution(self, substitution_id: int) -> Dict:
         """Substitute confirms acceptance"""
-        sub = next((s for s in self.substitutions if s.id == substitution_id), None)
+        sub = self.store.get_substitution(substitution_id)
         if not sub:
             return {"status": "error", "message": "Substitution not found"}
         
-        sub.status = "confirmed"
+        self.store.set_substitution_status(sub, "confirmed")
         return {
             "status": "success",
             "message": f"Substitution #{substitution_id} confirmed by {sub.substitute_name}"
@@ -271,33 +694,43 @@ DO NOT make the final decision - only provide analysis and recommendation.
     
     def confirm_substitution_by_leave_id(self, leave_id: int, substitute_name: str) -> Dict:
         """Confirm substitution by leave ID and substitute name (case-insensitive)"""
-        sub = next((s for s in self.substitutions 
-                   if s.leave_id == leave_id 
-                   and s.substitute_name.lower().strip() == substitute_name.lower().strip()), None)
+        sub = self.store.find_substitution(leave_id, substitute_name)
         if not sub:
             return {"status": "error", "message": "Substitution not found"}
         
         # Update substitution status
-        sub.status = "confirmed"
+        self.store.set_substitution_status(sub, "confirmed")
         
         # Update leave status to allow manager approval
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if leave:
-            leave.status = "substitute_confirmed"
+            self.store.set_leave_status(leave, "substitute_confirmed")
         
         return {
             "status": "success",
             "message": f"Substitution confirmed by {substitute_name} for leave #{leave_id}"
         }
     
+    def decline_substitution(self, leave_id: int, substitute_name: str) -> Dict:
+        """Substitute declines the assignment (case-insensitive name match)"""
+        sub = self.store.find_substitution(leave_id, substitute_name)
+        if not sub:
+            return {"status": "error", "message": "Substitution not found"}
+        
+        self.store.set_substitution_status(sub, "declined")
+        return {
+            "status": "success",
+            "message": f"Substitution declined by {substitute_name} for leave #{leave_id}"
+        }
+    
     def get_leave_status(self, leave_id: int) -> Dict:
         """Get current status of a leave request"""
-        leave = next((l for l in self.leaves if l.id == leave_id), None)
+        leave = self.store.get_leave(leave_id)
         if not leave:
             return {"status": "error", "message": "Leave request not found"}
         
         # Get associated substitutions
-        subs = [s for s in self.substitutions if s.leave_id == leave_id]
+        subs = self.store.substitutions_for_leave(leave_id)
         
         return {
             "status": "success",
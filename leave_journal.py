@@ -0,0 +1,129 @@
+"""
+Leave Journal - Write-ahead log and snapshots for the in-memory LeaveStore
+Every state transition is appended to journal.jsonl before it is acknowledged;
+the journal is periodically compacted into snapshot.json. At startup the
+snapshot is loaded and the journal tail replayed, so pending leaves and the
+id counters survive restarts and deploys.
+
+Layout of the state directory (HR_STATE_DIR, default ./hr_state):
+    snapshot.json   full store state as of the last compaction
+    journal.jsonl   one JSON record per transition since that snapshot
+    lock            flock held by the one open journal that owns the directory
+"""
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Iterator, Optional
+
+
+class StateDirLockedError(RuntimeError):
+    """Another open journal (in any process, this one included) already writes this state directory"""
+
+
+class LeaveJournal:
+    """Append-only JSON-lines journal with atomic snapshot compaction"""
+
+    def __init__(self, state_dir: Optional[str] = None, snapshot_every: Optional[int] = None,
+                 fsync: Optional[bool] = None):
+        self.state_dir = state_dir or os.getenv('HR_STATE_DIR', 'hr_state')
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.journal_path = os.path.join(self.state_dir, 'journal.jsonl')
+        self.snapshot_path = os.path.join(self.state_dir, 'snapshot.json')
+        # Compact after this many journal records
+        self.snapshot_every = snapshot_every or int(os.getenv('HR_SNAPSHOT_EVERY', '500'))
+        # fsync each record (survives power loss) or only flush (survives process crashes)
+        if fsync is None:
+            fsync = os.getenv('HR_JOURNAL_FSYNC', 'true').lower() in ('1', 'true', 'yes')
+        self.fsync = fsync
+
+        # Two writers would interleave journals and overwrite each other's snapshots.
+        # flock is per open file, so a second store in this same process is refused too:
+        # each LeaveStore keeps its own id counters and would reuse ids.
+        self._lock_file = open(os.path.join(self.state_dir, 'lock'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise StateDirLockedError(
+                f"{self.state_dir} is already held by another leave store, in another process or "
+                f"earlier in this one. The memory backend allows one store per state directory: "
+                f"close the other store, give this one its own HR_STATE_DIR, or use "
+                f"HR_STORAGE_BACKEND=sqlite for several workers"
+            ) from None
+
+        self._lock = threading.Lock()
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self.records_since_snapshot = 0
+
+    def append(self, record: Dict) -> None:
+        """Durably write one transition record"""
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records_since_snapshot += 1
+
+    def needs_snapshot(self) -> bool:
+        return self.records_since_snapshot >= self.snapshot_every
+
+    def load_snapshot(self) -> Optional[Dict]:
+        """Last compacted state, or None on first start"""
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def replay(self) -> Iterator[Dict]:
+        """Records written since the last snapshot, in order
+
+        A torn final line (crash mid-write) or a corrupt record ends the
+        replay, and the journal is cut back to the last good record so new
+        appends don't land behind it.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+        valid_bytes = 0
+        with open(self.journal_path, 'rb') as f:
+            for number, line in enumerate(f, start=1):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError as e:
+                    print(f"Discarding journal from line {number} ({e})")
+                    break
+                valid_bytes += len(line)
+                self.records_since_snapshot += 1
+                yield record
+
+        if valid_bytes < os.path.getsize(self.journal_path):
+            with self._lock:
+                self._file.flush()
+                os.truncate(self.journal_path, valid_bytes)
+
+    def write_snapshot(self, state: Dict) -> None:
+        """Atomically replace the snapshot and start an empty journal
+
+        The caller must stop appends while this runs (LeaveStore holds its lock).
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # The snapshot now covers every journaled record, so the journal can restart
+        with self._lock:
+            self._file.close()
+            self._file = open(self.journal_path, 'w', encoding='utf-8')
+            os.fsync(self._file.fileno())
+            self.records_since_snapshot = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        self._lock_file.close()  # releases the flock
@@ -0,0 +1,219 @@
+"""
+Leave Rules - Deterministic fast path for routine leave requests
+Computes leave balance, role criticality, pending work and substitute
+availability straight from the roster record. Short leaves from
+substitutable roles with enough balance and a free substitute are answered
+here in microseconds, in the same six sections the LLM analysis uses; the
+rest (high criticality, low balance, long or unclear requests, nobody to
+cover) are escalated to Gemini.
+"""
+import os
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Keywords -> reason category shown in the analysis
+REASON_CATEGORIES = [
+    ("medical", ("sick", "ill", "unwell", "fever", "flu", "cold", "doctor", "hospital", "medical",
+                 "appointment", "surgery", "checkup", "not feeling well", "health")),
+    ("bereavement", ("funeral", "death", "passed away", "bereavement")),
+    ("family", ("family", "wedding", "marriage", "child", "son", "daughter", "wife", "husband",
+                "mother", "father", "parent", "sister", "brother", "maternity", "paternity", "pregnan")),
+    ("emergency", ("emergency", "urgent", "accident")),
+    ("travel", ("vacation", "holiday", "travel", "trip", "hometown")),
+    ("work", ("conference", "training", "business", "meeting", "exam")),
+    ("personal", ("personal",)),
+]
+
+# Keywords match at word starts ("son" must not hit "reason"; "pregnan" covers pregnancy)
+_CATEGORY_PATTERNS = [
+    (category, re.compile(r'\b(?:' + '|'.join(re.escape(keyword) for keyword in keywords) + r')'))
+    for category, keywords in REASON_CATEGORIES
+]
+
+UNCLEAR_REASONS = {"", "not specified", "none", "na", "n/a", "nothing", "no reason"}
+
+# Used for "latency saved" until a real LLM analysis has been timed
+DEFAULT_LLM_SECONDS = 3.0
+
+
+@dataclass
+class RuleAnalysis:
+    """Outcome of the deterministic checks for one leave request"""
+    routine: bool
+    days: int
+    available_leaves: Optional[int]
+    criticality: str
+    substitutable: bool
+    reason_category: str
+    substitute: Optional[str]
+    escalation_reasons: List[str] = field(default_factory=list)
+    analysis: str = ""
+
+    @property
+    def decision(self) -> str:
+        return "fast_path" if self.routine else "escalate"
+
+    def as_dict(self) -> Dict:
+        return {
+            "decision": self.decision,
+            "available_leaves": self.available_leaves,
+            "criticality": self.criticality,
+            "substitutable": self.substitutable,
+            "reason_category": self.reason_category,
+            "substitute": self.substitute,
+            "escalation_reasons": list(self.escalation_reasons)
+        }
+
+
+def _as_int(value) -> Optional[int]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else int(number)  # NaN from empty cells
+
+
+def _yes(value) -> bool:
+    return str(value).strip().lower() in ("yes", "y", "true", "1")
+
+
+def reason_category(reason: Optional[str]) -> str:
+    """'medical', 'family', ... from keywords; 'unclear' for an empty reason, else 'other'"""
+    text = (reason or "").strip().lower()
+    if text in UNCLEAR_REASONS or len(text) < 3:
+        return "unclear"
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(text):
+            return category
+    return "other"
+
+
+def analyze_leave(employee: Dict, days, reason: Optional[str], substitutes: List[str],
+                  suggested_substitute: Optional[str] = None, substitute_available: bool = True,
+                  max_days: Optional[int] = None) -> RuleAnalysis:
+    """Check a leave against the roster record; routine=True means no LLM review is needed
+
+    `substitutes` are the roster's candidate labels, already narrowed to those
+    free to cover; `substitute_available` is False when the suggested
+    substitute is unknown or on leave themselves.
+    """
+    max_days = max_days if max_days is not None else int(os.getenv('AI_FAST_PATH_MAX_DAYS', '2'))
+    days = _as_int(days) or 0
+    balance = _as_int(employee.get('available_leaves'))
+    criticality = str(employee.get('task_criticality') or 'Unknown').strip().title()
+    substitutable = _yes(employee.get('can_be_substituted'))
+    category = reason_category(reason)
+    substitute = suggested_substitute if suggested_substitute and substitute_available else None
+    if substitute is None and not suggested_substitute and substitutes:
+        substitute = substitutes[0]
+
+    escalate = []
+    if days < 1:
+        escalate.append("number of days unknown")
+    elif days > max_days:
+        escalate.append(f"{days} days is longer than the {max_days}-day fast path")
+    if balance is None:
+        escalate.append("leave balance unknown")
+    elif days > balance:
+        escalate.append(f"only {balance} leaves available")
+    if criticality not in ("Low", "Medium"):
+        escalate.append(f"{criticality.lower()} task criticality")
+    if not substitutable:
+        escalate.append("role marked as not substitutable")
+    if substitute is None:
+        escalate.append(f"suggested substitute {suggested_substitute} unavailable" if suggested_substitute
+                        else "no substitute available")
+    if category == "unclear":
+        escalate.append("reason unclear")
+
+    result = RuleAnalysis(
+        routine=not escalate, days=days, available_leaves=balance, criticality=criticality,
+        substitutable=substitutable, reason_category=category, substitute=substitute,
+        escalation_reasons=escalate
+    )
+    result.analysis = format_analysis(employee, reason, result)
+    return result
+
+
+def format_analysis(employee: Dict, reason: Optional[str], result: RuleAnalysis) -> str:
+    """The six sections of the LLM prompt, filled in from the rule checks"""
+    if result.available_leaves is None:
+        balance = "Unknown - no balance on record."
+    else:
+        left = result.available_leaves - result.days
+        balance = (f"{result.days} of {result.available_leaves} days requested; {left} left after this leave."
+                   if left >= 0 else f"Insufficient: {result.days} requested, {result.available_leaves} available.")
+    role = employee.get('role') or 'Role not recorded'
+    substitute = (f"{result.substitute} can cover." if result.substitute
+                  else "No confirmed substitute yet.")
+    if result.routine:
+        recommendation = "Approve - routine request, all checks passed (rule-based, no AI review needed)."
+    else:
+        recommendation = "Review - " + "; ".join(result.escalation_reasons) + "."
+    return (
+        f"1. LEAVE BALANCE: {balance}\n"
+        f"2. REASON VALIDITY: {reason or 'Not specified'} ({result.reason_category}).\n"
+        f"3. ROLE IMPACT: {role}, {result.criticality} criticality, "
+        f"{'can' if result.substitutable else 'cannot'} be substituted.\n"
+        f"4. WORKLOAD IMPACT: Pending: {employee.get('pending_tasks') or 'none recorded'}.\n"
+        f"5. SUBSTITUTE AVAILABILITY: {substitute}\n"
+        f"6. RECOMMENDATION: {recommendation}"
+    )
+
+
+class LeaveRuleStats:
+    """Fast-path vs escalated decisions, with the LLM time the fast path saved"""
+
+    def __init__(self, history: int = 100):
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.escalated = 0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+        self.seconds_saved = 0.0
+        self.recent = deque(maxlen=history)
+
+    def expected_llm_seconds(self) -> float:
+        """Mean observed LLM analysis time (DEFAULT_LLM_SECONDS before the first one)"""
+        with self._lock:
+            return self.llm_seconds / self.llm_calls if self.llm_calls else DEFAULT_LLM_SECONDS
+
+    def record_llm(self, seconds: float) -> None:
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def record(self, leave_id: int, result: RuleAnalysis, seconds: float) -> Dict:
+        """Log one decision; returns the per-request record"""
+        saved = max(0.0, self.expected_llm_seconds() - seconds) if result.routine else 0.0
+        entry = {
+            "leave_id": leave_id,
+            "decision": result.decision,
+            "escalation_reasons": list(result.escalation_reasons),
+            "rule_ms": round(seconds * 1000, 3),
+            "latency_saved_ms": round(saved * 1000, 1)
+        }
+        with self._lock:
+            if result.routine:
+                self.fast_path += 1
+                self.seconds_saved += saved
+            else:
+                self.escalated += 1
+            self.recent.append(entry)
+        return entry
+
+    def stats(self) -> Dict:
+        with self._lock:
+            decided = self.fast_path + self.escalated
+            return {
+                "fast_path": self.fast_path,
+                "escalated": self.escalated,
+                "fast_path_rate": round(self.fast_path / decided, 3) if decided else None,
+                "llm_calls": self.llm_calls,
+                "llm_mean_seconds": round(self.llm_seconds / self.llm_calls, 3) if self.llm_calls else None,
+                "seconds_saved": round(self.seconds_saved, 1),
+                "recent": list(self.recent)[-10:]
+            }
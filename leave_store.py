@@ -0,0 +1,315 @@
+"""
+Leave Store - Indexed in-memory storage for leave requests and substitutions
+Lookups by id, status, teacher and (leave, substitute) are dict reads instead of list scans
+
+Two backends share this interface (pick with HR_STORAGE_BACKEND):
+    memory  LeaveStore below, journaled to disk (default)
+    sqlite  SQLiteLeaveStore in sqlite_leave_store.py, shared by all workers
+"""
+import os
+import threading
+from dataclasses import asdict, dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from leave_journal import LeaveJournal
+from roster_index import normalize_name
+
+
+@dataclass
+class Leave:
+    id: int
+    teacher_id: int
+    teacher_name: str
+    start_date: date
+    end_date: date
+    days: int
+    reason: str
+    status: str = "pending"  # pending, substitute_assigned, substitute_confirmed, approved, rejected
+    suggested_substitute: Optional[str] = None
+    substitute_note: Optional[str] = None
+
+
+@dataclass
+class Substitution:
+    id: int
+    leave_id: int
+    substitute_name: str
+    status: str = "pending"
+
+
+class LeaveStore:
+    """Leaves and substitutions with primary and secondary indexes
+
+    Status changes must go through set_leave_status / set_substitution_status
+    so the secondary indexes stay in step with the records. With a journal,
+    every change is written ahead to it and replayed by recover().
+    """
+
+    def __init__(self, journal: Optional[LeaveJournal] = None):
+        self._lock = threading.RLock()
+        self.journal = journal
+        self.leave_counter = 1
+        self.sub_counter = 1
+
+        # Primary indexes (dicts keep insertion order, i.e. id order)
+        self._leaves: Dict[int, Leave] = {}
+        self._substitutions: Dict[int, Substitution] = {}
+
+        # Secondary indexes
+        self._leaves_by_status: Dict[str, Dict[int, Leave]] = {}
+        self._leaves_by_teacher: Dict[str, Dict[int, Leave]] = {}
+        self._subs_by_leave: Dict[int, Dict[int, Substitution]] = {}
+        self._subs_by_leave_and_name: Dict[Tuple[int, str], Substitution] = {}
+
+        # Roster name key -> department, for department queries
+        self._departments: Dict[str, str] = {}
+
+    # ---------- leaves ----------
+
+    def add_leave(self, teacher_id: int, teacher_name: str, start_date: date, end_date: date,
+                  days: int, reason: str, suggested_substitute: Optional[str] = None,
+                  substitute_note: Optional[str] = None) -> Leave:
+        """Create a pending leave with the next id"""
+        with self._lock:
+            leave = Leave(
+                id=self.leave_counter,
+                teacher_id=teacher_id,
+                teacher_name=teacher_name,
+                start_date=start_date,
+                end_date=end_date,
+                days=days,
+                reason=reason,
+                status="pending",
+                suggested_substitute=suggested_substitute,
+                substitute_note=substitute_note
+            )
+            self._record("add_leave", leave=asdict(leave))
+            self.leave_counter += 1
+            self._index_leave(leave)
+            self._maybe_compact()
+            return leave
+
+    def _index_leave(self, leave: Leave) -> None:
+        self._leaves[leave.id] = leave
+        self._leaves_by_status.setdefault(leave.status, {})[leave.id] = leave
+        self._leaves_by_teacher.setdefault(normalize_name(leave.teacher_name), {})[leave.id] = leave
+
+    def get_leave(self, leave_id: int) -> Optional[Leave]:
+        """Leave by id"""
+        return self._leaves.get(leave_id)
+
+    def set_leave_status(self, leave: Leave, status: str) -> None:
+        """Change a leave's status and move it between status indexes"""
+        with self._lock:
+            self._record("leave_status", id=leave.id, status=status)
+            old = self._leaves_by_status.get(leave.status)
+            if old is not None:
+                old.pop(leave.id, None)
+            leave.status = status
+            self._leaves_by_status.setdefault(status, {})[leave.id] = leave
+            self._maybe_compact()
+
+    def list_leaves(self, *statuses: str) -> List[Leave]:
+        """Leaves in id order, optionally only those with one of the given statuses"""
+        with self._lock:
+            if not statuses:
+                return list(self._leaves.values())
+            selected = [leave for status in statuses
+                        for leave in self._leaves_by_status.get(status, {}).values()]
+        return sorted(selected, key=lambda leave: leave.id)
+
+    def leaves_for_teacher(self, teacher_name: str) -> List[Leave]:
+        """All leaves requested by a teacher, in id order"""
+        with self._lock:
+            return list(self._leaves_by_teacher.get(normalize_name(teacher_name), {}).values())
+
+    def leaves_for_department(self, department: str, *statuses: str) -> List[Leave]:
+        """Leaves of everyone in a department (case-insensitive), optionally by status"""
+        wanted = department.strip().casefold()
+        with self._lock:
+            keys = [key for key, dept in self._departments.items() if dept == wanted]
+            selected = [leave for key in keys for leave in self._leaves_by_teacher.get(key, {}).values()
+                        if not statuses or leave.status in statuses]
+        return sorted(selected, key=lambda leave: leave.id)
+
+    def count_leaves(self, status: Optional[str] = None) -> int:
+        """Number of leaves, overall or with one status"""
+        with self._lock:
+            if status is None:
+                return len(self._leaves)
+            return len(self._leaves_by_status.get(status, {}))
+
+    def statuses(self) -> List[str]:
+        """Statuses that currently have at least one leave"""
+        with self._lock:
+            return [status for status, leaves in self._leaves_by_status.items() if leaves]
+
+    # ---------- substitutions ----------
+
+    def add_substitution(self, leave_id: int, substitute_name: str) -> Substitution:
+        """Create a pending substitution with the next id"""
+        with self._lock:
+            sub = Substitution(
+                id=self.sub_counter,
+                leave_id=leave_id,
+                substitute_name=substitute_name,
+                status="pending"
+            )
+            self._record("add_substitution", substitution=asdict(sub))
+            self.sub_counter += 1
+            self._index_substitution(sub)
+            self._maybe_compact()
+            return sub
+
+    def _index_substitution(self, sub: Substitution) -> None:
+        self._substitutions[sub.id] = sub
+        self._subs_by_leave.setdefault(sub.leave_id, {})[sub.id] = sub
+        # First assignment of a name wins, matching the old first-match scan
+        self._subs_by_leave_and_name.setdefault((sub.leave_id, normalize_name(sub.substitute_name)), sub)
+
+    def get_substitution(self, substitution_id: int) -> Optional[Substitution]:
+        """Substitution by id"""
+        return self._substitutions.get(substitution_id)
+
+    def find_substitution(self, leave_id: int, substitute_name: str) -> Optional[Substitution]:
+        """Substitution for a leave by substitute name (case-insensitive)"""
+        return self._subs_by_leave_and_name.get((leave_id, normalize_name(substitute_name)))
+
+    def substitutions_for_leave(self, leave_id: int, status: Optional[str] = None) -> List[Substitution]:
+        """Substitutions of a leave in id order, optionally filtered by status"""
+        with self._lock:
+            subs = list(self._subs_by_leave.get(leave_id, {}).values())
+        if status is not None:
+            subs = [s for s in subs if s.status == status]
+        return subs
+
+    def set_substitution_status(self, sub: Substitution, status: str) -> None:
+        """Change a substitution's status"""
+        with self._lock:
+            self._record("substitution_status", id=sub.id, status=status)
+            sub.status = status
+            self._maybe_compact()
+
+    def list_substitutions(self) -> List[Substitution]:
+        """All substitutions in id order"""
+        with self._lock:
+            return list(self._substitutions.values())
+
+    # ---------- roster ----------
+
+    def sync_roster(self, records: List[Dict]) -> None:
+        """Remember each employee's department for leaves_for_department"""
+        departments = {}
+        for record in records:
+            key = normalize_name(record.get('name'))
+            department = record.get('department')
+            if key and isinstance(department, str) and key not in departments:
+                departments[key] = department.strip().casefold()
+        with self._lock:
+            self._departments = departments
+
+    # ---------- durability ----------
+
+    def _record(self, op: str, **fields) -> None:
+        """Write a transition ahead to the journal (caller holds the lock)"""
+        if self.journal is None:
+            return
+        self.journal.append({"op": op, **fields})
+
+    def _maybe_compact(self) -> None:
+        """Fold the journal into a snapshot once it grows long (caller holds the lock, after applying)"""
+        if self.journal is not None and self.journal.needs_snapshot():
+            self.journal.write_snapshot(self._state())
+
+    def _state(self) -> Dict:
+        """Full store contents for a snapshot (caller holds the lock)"""
+        return {
+            "leave_counter": self.leave_counter,
+            "sub_counter": self.sub_counter,
+            "leaves": [asdict(leave) for leave in self._leaves.values()],
+            "substitutions": [asdict(sub) for sub in self._substitutions.values()]
+        }
+
+    def recover(self) -> int:
+        """Rebuild the store from the journal's snapshot and tail; returns records replayed"""
+        if self.journal is None:
+            return 0
+        with self._lock:
+            state = self.journal.load_snapshot()
+            if state:
+                for fields in state["leaves"]:
+                    self._index_leave(_leave_from_dict(fields))
+                for fields in state["substitutions"]:
+                    self._index_substitution(Substitution(**fields))
+                self.leave_counter = state["leave_counter"]
+                self.sub_counter = state["sub_counter"]
+
+            replayed = 0
+            for record in self.journal.replay():
+                self._apply(record)
+                replayed += 1
+        return replayed
+
+    def _apply(self, record: Dict) -> None:
+        """Redo one journaled transition without journaling it again"""
+        op = record["op"]
+        if op == "add_leave":
+            leave = _leave_from_dict(record["leave"])
+            self._index_leave(leave)
+            self.leave_counter = max(self.leave_counter, leave.id + 1)
+        elif op == "leave_status":
+            leave = self._leaves.get(record["id"])
+            if leave is not None:
+                self._leaves_by_status.get(leave.status, {}).pop(leave.id, None)
+                leave.status = record["status"]
+                self._leaves_by_status.setdefault(leave.status, {})[leave.id] = leave
+        elif op == "add_substitution":
+            sub = Substitution(**record["substitution"])
+            self._index_substitution(sub)
+            self.sub_counter = max(self.sub_counter, sub.id + 1)
+        elif op == "substitution_status":
+            sub = self._substitutions.get(record["id"])
+            if sub is not None:
+                sub.status = record["status"]
+        else:
+            print(f"Skipping unknown journal record: {op}")
+
+    def snapshot(self) -> None:
+        """Compact the journal now (e.g. on shutdown)"""
+        if self.journal is None:
+            return
+        with self._lock:
+            self.journal.write_snapshot(self._state())
+
+    def close(self) -> None:
+        """Compact the journal and release the state directory for another store"""
+        if self.journal is None:
+            return
+        self.snapshot()
+        self.journal.close()
+
+
+def _leave_from_dict(fields: Dict) -> Leave:
+    """Leave from its JSON form (dates are stored as ISO strings)"""
+    fields = dict(fields)
+    for key in ("start_date", "end_date"):
+        if isinstance(fields.get(key), str):
+            fields[key] = date.fromisoformat(fields[key])
+    return Leave(**fields)
+
+
+def create_leave_store(backend: Optional[str] = None):
+    """Storage backend named by HR_STORAGE_BACKEND ('memory' or 'sqlite'), recovered and ready"""
+    backend = (backend or os.getenv('HR_STORAGE_BACKEND', 'memory')).lower()
+    if backend == 'sqlite':
+        from sqlite_leave_store import SQLiteLeaveStore
+        return SQLiteLeaveStore()
+    if backend != 'memory':
+        raise ValueError(f"Unknown HR_STORAGE_BACKEND: {backend}")
+
+    store = LeaveStore(journal=LeaveJournal())
+    replayed = store.recover()
+    if store.leave_counter > 1:
+        print(f"Restored {store.count_leaves()} leave requests ({replayed} journal records replayed)")
+    return store
@@ -0,0 +1,142 @@
+"""
+LLM Cache - Persistent prompt -> response cache for the leave analysis chain
+Identical prompts (same employee record, days, reason and substitutes) are
+answered from a local SQLite file instead of Gemini, across restarts and
+shared by all gunicorn workers. Keys are a canonical hash of the prompt
+inputs plus a namespace (model + prompt template), so editing the prompt
+or switching models starts afresh. Entries expire after LLM_CACHE_TTL_HOURS;
+beyond LLM_CACHE_SIZE the least recently used go first.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlite_db import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    latency REAL NOT NULL,       -- seconds the original LLM call took
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used);
+"""
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def canonical(value: Any) -> Any:
+    """Normalize prompt inputs so equivalent values hash alike
+
+    Whitespace is collapsed, NaN becomes None, 5.0 becomes 5 and dict keys
+    are sorted (by json.dumps).
+    """
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, str):
+        return _WHITESPACE.sub(' ', value).strip()
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+    if value is None or isinstance(value, (bool, int)):
+        return value
+    return canonical(str(value))
+
+
+def cache_key(prompt_inputs: Dict, namespace: str = "") -> str:
+    payload = json.dumps([namespace, canonical(prompt_inputs)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache with TTL and LRU size eviction"""
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, maxsize: Optional[int] = None,
+                 namespace: str = ""):
+        self.db = SQLiteDatabase(path or os.getenv('LLM_CACHE_PATH', 'llm_cache.db'), SCHEMA)
+        self.ttl = ttl if ttl is not None else float(os.getenv('LLM_CACHE_TTL_HOURS', '168')) * 3600
+        self.maxsize = maxsize or int(os.getenv('LLM_CACHE_SIZE', '5000'))
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.evictions = 0
+
+    def key(self, prompt_inputs: Dict) -> str:
+        return cache_key(prompt_inputs, self.namespace)
+
+    def get(self, prompt_inputs: Dict) -> Optional[str]:
+        """Cached response for these inputs, or None if missing/expired"""
+        key, now = self.key(prompt_inputs), time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT response, latency FROM llm_responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE llm_responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.seconds_saved += row["latency"]
+        return row["response"]
+
+    def put(self, prompt_inputs: Dict, response: str, latency: float) -> None:
+        """Store a fresh response, then drop expired and least recently used entries"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, latency, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.key(prompt_inputs), response, latency, now, now)
+            )
+            removed = conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)
+            ).rowcount
+        if removed:
+            with self._lock:
+                self.evictions += removed
+
+    def clear(self) -> None:
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM llm_responses")
+
+    def stats(self) -> Dict:
+        """Hit rate and saved LLM time (this worker) and shared entry count"""
+        size = self.db.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "seconds_saved": round(self.seconds_saved, 1),
+                "evictions": self.evictions,
+                "size": size,
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl
+            }
+
+
+def create_llm_cache(namespace: str = "") -> Optional[LLMResponseCache]:
+    """The persistent response cache, or None when LLM_CACHE=false"""
+    if os.getenv('LLM_CACHE', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    return LLMResponseCache(namespace=namespace)
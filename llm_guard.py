@@ -0,0 +1,199 @@
+"""
+LLM Guard - Deadline, concurrency cap and circuit breaker around LLM calls
+Every Gemini call goes through LLMGuard.call:
+  * a per-call deadline (LLM_TIMEOUT_SECONDS): the caller gets
+    LLMTimeoutError instead of stalling a worker thread
+  * a semaphore (LLM_MAX_CONCURRENCY) on calls in flight; a call past its
+    deadline keeps its slot until it really returns, so a hung provider
+    cannot pile up threads
+  * a circuit breaker: after LLM_BREAKER_FAILURES consecutive failures
+    calls fail fast with CircuitOpenError for LLM_BREAKER_RESET_SECONDS,
+    then a single trial call decides whether to close it again
+Callers catch LLMUnavailableError and fall back to a non-AI summary.
+"""
+import bisect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+
+class LLMUnavailableError(Exception):
+    """The LLM was not asked (circuit open, no free slot) or did not answer in time"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    pass
+
+
+class LatencyHistogram:
+    """Cumulative-style bucket counts of call durations in seconds"""
+
+    BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            buckets, running = {}, 0
+            for bound, count in zip(list(self.BUCKETS) + ["+Inf"], self.counts):
+                running += count
+                buckets[f"le_{bound}"] = running
+            return {"buckets": buckets, "count": self.count, "sum_seconds": round(self.total, 3)}
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half_open after `reset_timeout`"""
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+        self.reset_timeout = reset_timeout or float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """May a call go out now? In half_open only one trial call at a time"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def cancel_trial(self) -> None:
+        """An allowed call never went out; let the next one be the trial"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened,
+                    "failure_threshold": self.failure_threshold, "reset_seconds": self.reset_timeout}
+
+
+class LLMGuard:
+    """Runs LLM calls under a deadline, a concurrency cap and a circuit breaker"""
+
+    def __init__(self, timeout: Optional[float] = None, max_concurrency: Optional[int] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT_SECONDS', '15'))
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        # Calls run here so the caller can stop waiting at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.latency = LatencyHistogram()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def call(self, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """function(*args, **kwargs) under the guard; raises LLMUnavailableError or the call's own error"""
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError("LLM circuit open after repeated failures")
+
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            # Waiting for a slot isn't the provider's fault: no breaker failure
+            self._count("timeouts")
+            self.breaker.cancel_trial()
+            raise LLMTimeoutError(f"no free LLM slot within {self.timeout:.0f}s")
+        with self._lock:
+            self.in_flight += 1
+        future = self._executor.submit(function, *args, **kwargs)
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=max(0.0, self.timeout - (time.monotonic() - started)))
+        except FutureTimeout:
+            self._count("timeouts")
+            self.breaker.record_failure()
+            raise LLMTimeoutError(f"LLM call exceeded {self.timeout:.0f}s") from None
+        except Exception:
+            self._count("errors")
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.latency.observe(time.monotonic() - started)
+
+        self._count("successes")
+        self.breaker.record_success()
+        return result
+
+    def map(self, function: Callable[[Any], Any], items: List[Any], max_concurrency: int) -> List[Any]:
+        """function(item) for each item through call(), up to max_concurrency at once
+
+        Returns results in order, with the exception in place of a failed item.
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(items)), thread_name_prefix="llm-batch") as pool:
+            futures = [pool.submit(self.call, function, item) for item in items]
+        return [future.exception() or future.result() for future in futures]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "successes": self.successes,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "rejected_open_circuit": self.rejected,
+                "in_flight": self.in_flight,
+                "max_concurrency": self.max_concurrency,
+                "timeout_seconds": self.timeout
+            }
+        return {**counters, "breaker": self.breaker.stats(), "latency": self.latency.snapshot()}
@@ -0,0 +1,433 @@
+"""
+Webhook Load Test - Replays inbound WhatsApp traffic against /webhook
+Nothing external is touched:
+  * a local fake Twilio REST server records every messages.create call
+    (the app is pointed at it with TWILIO_API_BASE_URL)
+  * a fake LLM with configurable latency stands in for Gemini
+so capacity can be planned against the real app under gunicorn.
+
+Traffic is JSONL, one inbound message per line, as Twilio form-posts it:
+    {"From": "whatsapp:+918106778477", "Body": "I need 2 days leave for fever", "at": 0.0}
+"at" (seconds from start, optional) keeps recorded timing and --speed scales
+it; --rate instead sends the messages in file order at a fixed rate.
+Messages from one number are never in flight together, so conversations
+replay in order.
+
+With --auto-reply, numbers that receive an "Accept #N" or "Approve #N"
+prompt answer it, so substitute acceptance, the AI analysis and manager
+approval run end to end even though leave ids aren't known in advance.
+
+Reports p50/p95/p99 webhook latency, errors, and how many outbound
+messages reached the fake Twilio and how fast.
+
+Usage:
+    python load_test_webhook.py --generate traffic.jsonl --conversations 200 --duration 60
+    python load_test_webhook.py traffic.jsonl --speed 2 --llm-latency 3 --auto-reply
+    python load_test_webhook.py traffic.jsonl --rate 25 --workers 2 --send-rate 20
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import requests
+
+MANAGER_PHONE = "+919999900000"
+ERROR_REPLY = "Sorry, there was an error processing your request"
+# Lets the replay read the server's /metrics at the end
+ADMIN_TOKEN = "load-test-admin"
+
+# Outbound prompts the stand-in substitutes and manager answer with --auto-reply
+AUTO_REPLIES = [
+    (re.compile(r'"Accept #(\d+)"'), "Accept #{}"),
+    (re.compile(r'"Approve #(\d+)"'), "Approve #{}"),
+]
+
+
+# ==================== FAKE SERVICES ====================
+
+def create_app():
+    """gunicorn entry point ("load_test_webhook:create_app()"): the real app with a fake LLM"""
+    from langchain_core.language_models.llms import LLM
+
+    import integrated_hr_agent
+    import unified_whatsapp_handler
+
+    class FakeLLM(LLM):
+        """Sleeps like a provider round-trip, then returns a canned analysis"""
+        latency: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "fake-latency"
+
+        def _call(self, prompt: str, stop=None, run_manager=None, **kwargs) -> str:
+            time.sleep(self.latency)
+            name = next((line.split(":", 1)[1].strip() for line in prompt.splitlines()
+                         if line.startswith("Name:")), "the employee")
+            return (f"1. LEAVE BALANCE: sufficient for {name}.\n2. REASON VALIDITY: valid.\n"
+                    f"3. ROLE IMPACT: moderate.\n4. WORKLOAD IMPACT: manageable.\n"
+                    f"5. SUBSTITUTE AVAILABILITY: available.\n6. RECOMMENDATION: approve.")
+
+    latency = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+    integrated_hr_agent.IntegratedHRAgent._create_llm = lambda agent: FakeLLM(latency=latency)
+    return unified_whatsapp_handler.app
+
+
+class FakeTwilio:
+    """Local stand-in for POST /2010-04-01/Accounts/<sid>/Messages.json"""
+
+    def __init__(self, latency: float = 0.0, on_message: Optional[Callable[[str, str], None]] = None):
+        self.latency = latency
+        self.on_message = on_message
+        self.messages = []  # (monotonic time, to, body)
+        self._lock = threading.Lock()
+        self._sids = itertools.count(1)
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                if fake.latency:
+                    time.sleep(fake.latency)
+                to, body = form.get("To", [""])[0], form.get("Body", [""])[0]
+                with fake._lock:
+                    fake.messages.append((time.monotonic(), to, body))
+                    sid = f"SMfake{next(fake._sids):08d}"
+                payload = json.dumps({"sid": sid, "status": "queued", "to": to,
+                                      "from": form.get("From", [""])[0], "body": body}).encode()
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                if fake.on_message:
+                    fake.on_message(to, body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, name="fake-twilio", daemon=True).start()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self.messages)
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, twilio_url: str, state_dir: str):
+    """gunicorn running create_app() with shared state in a scratch directory"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "HR_STORAGE_BACKEND": "sqlite",
+        "HR_DB_PATH": os.path.join(state_dir, "hr.db"),
+        "OUTBOX_DB_PATH": os.path.join(state_dir, "outbox.db"),
+        "LLM_CACHE_PATH": os.path.join(state_dir, "llm_cache.db"),
+        "ROSTER_WATCH_SECONDS": "0",
+        "MANAGER_PHONE": MANAGER_PHONE,
+        "TWILIO_API_BASE_URL": twilio_url,
+        "TWILIO_ACCOUNT_SID": "ACloadtest",
+        "TWILIO_AUTH_TOKEN": "loadtest",
+        "GOOGLE_API_KEY": "load-test",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "ADMIN_API_TOKEN": ADMIN_TOKEN,
+    }
+    if args.send_rate:
+        env["TWILIO_SEND_RATE"] = str(args.send_rate)
+        env["TWILIO_SEND_BURST"] = str(max(1, int(args.send_rate * 2)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(args.workers), "--threads", str(args.threads), "--timeout", "120",
+         "load_test_webhook:create_app()"],
+        env=env, stdout=subprocess.DEVNULL, stderr=None if args.server_logs else subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            # The first /webhook builds the handler; do it before the clock starts
+            if requests.get(f"{base_url}/webhook", timeout=30).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not come up")
+
+
+# ==================== TRAFFIC ====================
+
+def generate_traffic(path: str, conversations: int, duration: float, seed: int = 7) -> None:
+    """Synthetic recording: leave conversations from roster employees plus manager checks"""
+    from roster_cache import load_roster
+
+    rng = random.Random(seed)
+    roster = load_roster("employees.xlsx")
+    days = ["1 day", "2 days", "3 days", "a week", "two days"]
+    reasons = ["fever", "a family wedding", "a doctor appointment", "personal work", "a conference"]
+    messages = []
+    for number in range(conversations):
+        employee = roster[number % len(roster)]
+        substitute = rng.choice([other for other in roster if other["name"] != employee["name"]])
+        # A distinct number per conversation; matching uses the last 10 digits
+        phone = f"+{81 + number // len(roster)}{str(employee['phone'])[-10:]}"
+        at = rng.uniform(0, duration)
+        for body in (f"I need {rng.choice(days)} leave for {rng.choice(reasons)}", "yes", substitute["name"]):
+            messages.append({"From": f"whatsapp:{phone}", "Body": body, "at": round(at, 3)})
+            at += rng.uniform(2, 6)  # think time between turns
+    for _ in range(max(1, conversations // 10)):
+        messages.append({"From": f"whatsapp:{MANAGER_PHONE}", "Body": rng.choice(["pending", "status", "list"]),
+                         "at": round(rng.uniform(0, duration), 3)})
+
+    messages.sort(key=lambda message: message["at"])
+    with open(path, "w", encoding="utf-8") as f:
+        for message in messages:
+            f.write(json.dumps(message, ensure_ascii=False) + "\n")
+    print(f"📝 Wrote {len(messages)} messages ({conversations} conversations over {duration:.0f}s) to {path}")
+
+
+def load_traffic(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def schedule(messages: List[Dict], rate: Optional[float], speed: float) -> List[float]:
+    """Send offset (seconds) for every message"""
+    if rate or any("at" not in message for message in messages):
+        interval = 1.0 / (rate or 10.0)
+        return [index * interval for index in range(len(messages))]
+    start = messages[0]["at"]
+    return [(message["at"] - start) / speed for message in messages]
+
+
+# ==================== REPLAY ====================
+
+class Replay:
+    def __init__(self, base_url: str, concurrency: int, timeout: float, reply_delay: Optional[float] = None):
+        self.url = f"{base_url}/webhook"
+        self.timeout = timeout
+        self.reply_delay = reply_delay
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.local = threading.local()
+        self.phone_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.lags: List[float] = []
+        self.errors: Counter = Counter()
+        self.sids = itertools.count(1)
+        self.futures = []
+        self.timers = 0
+        self.replied = set()
+        self.auto_replies = 0
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def _send(self, message: Dict, due: float) -> None:
+        with self.phone_locks[message["From"]]:
+            started = time.monotonic()
+            error = None
+            try:
+                response = self._session().post(self.url, data={
+                    "From": message["From"],
+                    "Body": message["Body"],
+                    "MessageSid": f"SMreplay{next(self.sids):08d}"
+                }, timeout=self.timeout)
+                if response.status_code != 200:
+                    error = f"HTTP {response.status_code}"
+                elif ERROR_REPLY in response.text:
+                    error = "error reply"
+            except requests.Timeout:
+                error = "timeout"
+            except requests.RequestException as e:
+                error = type(e).__name__
+            elapsed = time.monotonic() - started
+        with self.lock:
+            self.latencies.append(elapsed)
+            self.lags.append(started - due)
+            if error:
+                self.errors[error] += 1
+
+    def _submit(self, message: Dict, due: float) -> None:
+        future = self.pool.submit(self._send, message, due)
+        with self.lock:
+            self.futures.append(future)
+
+    def on_outbound(self, to: str, body: str) -> None:
+        """Fake Twilio callback: answer 'Accept #N' / 'Approve #N' prompts once, after a think time"""
+        if self.reply_delay is None:
+            return
+        for pattern, reply in AUTO_REPLIES:
+            match = pattern.search(body)
+            if not match or (to, pattern.pattern, match.group(1)) in self.replied:
+                continue
+            with self.lock:
+                self.replied.add((to, pattern.pattern, match.group(1)))
+                self.timers += 1
+                self.auto_replies += 1
+            message = {"From": to, "Body": reply.format(match.group(1))}
+
+            def fire(message=message):
+                with self.lock:
+                    self.timers -= 1
+                self._submit(message, time.monotonic())
+
+            threading.Timer(self.reply_delay, fire).start()
+            return
+
+    def run(self, messages: List[Dict], offsets: List[float]) -> float:
+        """Open loop: each message goes out at its offset whether or not earlier ones finished"""
+        started = time.monotonic()
+        for message, offset in zip(messages, offsets):
+            due = started + offset
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._submit(message, due)
+        self.wait()
+        return time.monotonic() - started
+
+    def busy(self) -> bool:
+        with self.lock:
+            return self.timers > 0 or any(not future.done() for future in self.futures)
+
+    def wait(self) -> None:
+        while self.busy():
+            time.sleep(0.05)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def drain(replay: Replay, twilio: FakeTwilio, quiet: float, limit: float) -> float:
+    """Until no reply is pending and the fake Twilio has seen nothing new for `quiet` seconds"""
+    started = time.monotonic()
+    last_count, last_change = twilio.count(), time.monotonic()
+    while time.monotonic() - started < limit:
+        time.sleep(0.25)
+        count = twilio.count()
+        if count != last_count or replay.busy():
+            last_count, last_change = count, time.monotonic()
+        elif time.monotonic() - last_change >= quiet:
+            break
+    replay.wait()
+    return time.monotonic() - started
+
+
+def report(replay: Replay, twilio: FakeTwilio, elapsed: float, replay_started: float, metrics: Dict) -> None:
+    latencies = replay.latencies
+    print(f"\n📨 Inbound: {len(latencies)} webhooks in {elapsed:.1f}s ({len(latencies) / elapsed:.1f}/s)")
+    print(f"   latency ms   p50 {percentile(latencies, 0.50) * 1000:8.1f}   p95 {percentile(latencies, 0.95) * 1000:8.1f}"
+          f"   p99 {percentile(latencies, 0.99) * 1000:8.1f}   max {max(latencies, default=0) * 1000:8.1f}")
+    print(f"   send lag ms  p95 {percentile(replay.lags, 0.95) * 1000:8.1f}  (waiting on the same number or the client pool)")
+    if replay.reply_delay is not None:
+        print(f"   including {replay.auto_replies} auto-replies to outbound prompts")
+    errors = sum(replay.errors.values())
+    print(f"   errors: {errors} ({errors / max(1, len(latencies)):.1%})"
+          + (" - " + ", ".join(f"{kind}: {count}" for kind, count in replay.errors.most_common()) if errors else ""))
+
+    sent = [message for message in twilio.messages if message[0] >= replay_started]
+    print(f"\n📤 Outbound (fake Twilio): {len(sent)} messages")
+    if sent:
+        span = max(sent[-1][0] - sent[0][0], 1e-6)
+        print(f"   throughput {len(sent) / span:.2f}/s over {span:.1f}s, last one {sent[-1][0] - replay_started:.1f}s after start")
+        recipients = Counter("manager" if to.endswith(MANAGER_PHONE) else "employees" for _, to, _ in sent)
+        print("   to " + ", ".join(f"{kind}: {count}" for kind, count in recipients.most_common()))
+
+    outbound = metrics.get("outbound", {})
+    if outbound:
+        counts = {key: outbound[key] for key in ("pending", "sending", "sent", "failed", "dead") if key in outbound}
+        print(f"   outbox: {counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traffic", nargs="?", help="JSONL of inbound messages")
+    parser.add_argument("--generate", metavar="PATH", help="write synthetic traffic to PATH and exit")
+    parser.add_argument("--conversations", type=int, default=100, help="with --generate")
+    parser.add_argument("--duration", type=float, default=60, help="with --generate: seconds the traffic spans")
+    parser.add_argument("--rate", type=float, help="messages per second (ignores recorded timing)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for recorded timing")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--concurrency", type=int, default=64, help="max webhooks in flight from the client")
+    parser.add_argument("--timeout", type=float, default=30, help="webhook timeout (Twilio gives up after 15s)")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="fake LLM seconds per analysis")
+    parser.add_argument("--twilio-latency", type=float, default=0.05, help="fake Twilio seconds per send")
+    parser.add_argument("--send-rate", type=float, help="TWILIO_SEND_RATE for the app (default: its own)")
+    parser.add_argument("--auto-reply", type=float, metavar="SECONDS", nargs="?", const=5.0,
+                        help="substitutes accept and the manager approves what they are sent, after SECONDS")
+    parser.add_argument("--drain", type=float, default=60, help="max seconds to wait for outbound to finish")
+    parser.add_argument("--server-logs", action="store_true", help="show gunicorn output")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_traffic(args.generate, args.conversations, args.duration)
+        return
+    if not args.traffic:
+        parser.error("give a traffic file (or --generate PATH)")
+
+    messages = load_traffic(args.traffic)
+    offsets = schedule(messages, args.rate, args.speed)
+    print(f"🧪 {len(messages)} messages over ~{offsets[-1]:.0f}s, {args.workers} worker(s) x {args.threads} threads, "
+          f"LLM {args.llm_latency:.2f}s, Twilio {args.twilio_latency * 1000:.0f}ms")
+
+    twilio = FakeTwilio(args.twilio_latency)
+    state_dir = tempfile.mkdtemp(prefix="hr-replay-")
+    process, base_url = start_server(args, twilio.base_url, state_dir)
+    try:
+        replay = Replay(base_url, args.concurrency, args.timeout, args.auto_reply)
+        twilio.on_message = replay.on_outbound
+        replay_started = time.monotonic()
+        elapsed = replay.run(messages, offsets)
+        elapsed += drain(replay, twilio, quiet=max(3.0, args.llm_latency * 2), limit=args.drain)
+        try:
+            metrics = requests.get(f"{base_url}/metrics", timeout=10,
+                                   headers={"Authorization": f"Bearer {ADMIN_TOKEN}"}).json()
+        except (requests.RequestException, ValueError):
+            metrics = {}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        twilio.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report(replay, twilio, elapsed, replay_started, metrics)
+    sys.exit(1 if replay.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
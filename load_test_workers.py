@@ -0,0 +1,175 @@
+"""
+Multi-worker load test for the unified webhook
+Starts gunicorn with 1, 2, 4... workers on the shared SQLite backend, drives
+LLM-free conversations through /webhook and reports throughput per worker count.
+
+Every employee conversation is two turns (leave request -> confirmation
+prompt, "no" -> cancelled). Consecutive turns of one conversation land on
+whichever worker gunicorn picks, so a lost session shows up as a failed turn.
+
+Usage:
+    python load_test_workers.py                   # workers 1 2 4, 15s each
+    python load_test_workers.py --workers 1 2 4 8 --duration 30
+"""
+import argparse
+import itertools
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+import requests
+
+MANAGER_PHONE = "+919999900000"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, threads: int, state_dir: str):
+    """gunicorn with shared state in a scratch directory; returns (process, base_url)"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "HR_STORAGE_BACKEND": "sqlite",
+        "HR_DB_PATH": os.path.join(state_dir, "hr.db"),
+        "OUTBOX_DB_PATH": os.path.join(state_dir, "outbox.db"),
+        "MANAGER_PHONE": MANAGER_PHONE,
+        "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "load-test"),
+        "TWILIO_ACCOUNT_SID": os.getenv("TWILIO_ACCOUNT_SID", "ACload"),
+        "TWILIO_AUTH_TOKEN": os.getenv("TWILIO_AUTH_TOKEN", "load"),
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--threads", str(threads), "--timeout", "120",
+         "unified_whatsapp_handler:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not come up")
+
+
+class Client(threading.Thread):
+    """One phone number sending turns back to back"""
+
+    sids = itertools.count()
+
+    def __init__(self, base_url: str, phone: str, turns, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.url = f"{base_url}/webhook"
+        self.phone = phone
+        self.turns = turns
+        self.stop = stop
+        self.latencies = []
+        self.failures = 0
+        self.recording = False
+
+    def run(self):
+        http = requests.Session()
+        while not self.stop.is_set():
+            for body, expected in self.turns:
+                started = time.perf_counter()
+                try:
+                    reply = http.post(self.url, data={
+                        "Body": body,
+                        "From": f"whatsapp:{self.phone}",
+                        "MessageSid": f"SMload{next(self.sids)}"
+                    }, timeout=30).text
+                    ok = expected.lower() in reply.lower()
+                except requests.RequestException:
+                    ok = False
+                if self.recording:
+                    self.latencies.append(time.perf_counter() - started)
+                    self.failures += not ok
+
+
+def run_level(workers: int, threads: int, duration: float, warmup: float, phones) -> dict:
+    state_dir = tempfile.mkdtemp(prefix="hr-load-")
+    process, base_url = start_server(workers, threads, state_dir)
+    try:
+        stop = threading.Event()
+        employee_turns = [("I need 2 days leave for fever", "confirm"),
+                          ("no", "Leave application cancelled")]
+        manager_turns = [("pending", "leave requests")]
+        clients = [Client(base_url, phone, employee_turns, stop) for phone in phones]
+        clients += [Client(base_url, MANAGER_PHONE, manager_turns, stop) for _ in range(2)]
+        for client in clients:
+            client.start()
+
+        # Let every worker build its handler before measuring
+        time.sleep(warmup)
+        for client in clients:
+            client.recording = True
+        time.sleep(duration)
+        for client in clients:
+            client.recording = False
+        stop.set()
+        for client in clients:
+            client.join(timeout=30)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    latencies = sorted(latency for client in clients for latency in client.latencies)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "throughput": len(latencies) / duration,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+        "failures": sum(client.failures for client in clients),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--clients-per-employee", type=int, default=4,
+                        help="parallel conversations per roster employee (each on its own number)")
+    args = parser.parse_args()
+
+    # Every client needs its own phone number for its conversation; reuse the
+    # roster's employees by varying the country-code prefix (matching uses the last 10 digits)
+    roster = pd.read_excel("employees.xlsx")
+    phones = [f"+{prefix}{str(phone)[-10:]}"
+              for phone in roster["phone"]
+              for prefix in range(81, 81 + args.clients_per_employee)]
+
+    print(f"🧪 {len(phones)} employee conversations + 2 manager clients, {args.duration:.0f}s per level, "
+          f"{os.cpu_count()} CPU cores\n")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'efficiency':>10} {'failed':>7}")
+    baseline = None
+    for workers in args.workers:
+        result = run_level(workers, args.threads, args.duration, args.warmup, phones)
+        baseline = baseline or result["throughput"] / workers
+        speedup = result["throughput"] / baseline if baseline else 0.0
+        print(f"{workers:>7} {result['throughput']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+              f"{speedup:>7.2f}x {speedup / workers:>9.0%} {result['failures']:>7}")
+
+    if os.cpu_count() and max(args.workers) > os.cpu_count():
+        print(f"\n⚠️ More workers than CPU cores ({os.cpu_count()}); scaling flattens beyond that point")
+
+
+if __name__ == "__main__":
+    main()
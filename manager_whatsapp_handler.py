@@ -3,14 +3,15 @@ Manager WhatsApp Handler - For approving/rejecting leaves via WhatsApp
 Production-ready separate webhook for managers
 """
 import os
-import re
 from typing import Dict, Optional
 from flask import Flask, request, Response
 from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client as TwilioClient
 from dotenv import load_dotenv
 
+import message_classifier
 from integrated_hr_agent import IntegratedHRAgent
+from outbound_queue import create_twilio_client
+from session_store import create_session_store
 
 load_dotenv()
 
@@ -20,15 +21,12 @@ manager_handler_instance = None
 class ManagerWhatsAppHandler:
     def __init__(self):
         self.hr_agent = IntegratedHRAgent()
-        self.twilio_client = TwilioClient(
-            os.getenv('TWILIO_ACCOUNT_SID'),
-            os.getenv('TWILIO_AUTH_TOKEN')
-        )
+        self.twilio_client = create_twilio_client()
         self.twilio_from = os.getenv('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
         
         # Manager sessions for tracking approval workflow
         if not hasattr(ManagerWhatsAppHandler, '_manager_sessions'):
-            ManagerWhatsAppHandler._manager_sessions = {}
+            ManagerWhatsAppHandler._manager_sessions = create_session_store('manager')
     
     @property
     def manager_sessions(self):
@@ -60,32 +58,30 @@ class ManagerWhatsAppHandler:
     
     def parse_manager_command(self, message: str) -> Dict:
         """Parse manager commands from WhatsApp message"""
-        message_lower = message.lower().strip()
+        words = message_classifier.COMMAND_WORDS.found(message.lower().strip())
+        leave_id = message_classifier.leave_id(message)
         
         # Check for approval commands
-        if any(word in message_lower for word in ['approve', 'accept', 'yes']):
-            # Extract leave ID
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
+        if words & {'approve', 'accept', 'yes'}:
+            if leave_id is not None:
                 return {
                     'action': 'approve',
-                    'leave_id': int(leave_id_match.group(1))
+                    'leave_id': leave_id
                 }
         
         # Check for rejection commands
-        elif any(word in message_lower for word in ['reject', 'deny', 'no']):
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
+        elif words & {'reject', 'deny', 'no'}:
+            if leave_id is not None:
                 return {
                     'action': 'reject',
-                    'leave_id': int(leave_id_match.group(1)),
+                    'leave_id': leave_id,
                     'reason': message  # Full message as reason
                 }
         
         # Check for substitute assignment
-        elif 'assign' in message_lower:
+        elif 'assign' in words:
             # Pattern: "assign [name] to #[id]"
-            assign_match = re.search(r'assign\s+(.+?)\s+to\s+#?(\d+)', message_lower)
+            assign_match = message_classifier.ASSIGN_COMMAND.search(message.lower().strip())
             if assign_match:
                 return {
                     'action': 'assign',
@@ -94,20 +90,19 @@ class ManagerWhatsAppHandler:
                 }
         
         # Check for status inquiry
-        elif any(word in message_lower for word in ['status', 'check', 'info']):
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
+        elif words & {'status', 'check', 'info'}:
+            if leave_id is not None:
                 return {
                     'action': 'status',
-                    'leave_id': int(leave_id_match.group(1))
+                    'leave_id': leave_id
                 }
         
         # Check for help
-        elif 'help' in message_lower or 'commands' in message_lower:
+        elif words & {'help', 'commands'}:
             return {'action': 'help'}
         
         # Check for list pending leaves
-        elif any(word in message_lower for word in ['list', 'pending', 'show']):
+        elif words & {'list', 'pending', 'show'}:
             return {'action': 'list'}
         
         return {'action': 'unknown'}
@@ -146,10 +141,10 @@ class ManagerWhatsAppHandler:
     
     def approve_leave(self, leave_id: int) -> str:
         """Approve a leave request"""
-        # Get AI analysis first
-        ai_result = self.hr_agent.get_ai_analysis(leave_id)
-        if ai_result['status'] != 'success':
-            return f"❌ Error: {ai_result['message']}"
+        # Get leave details first (no LLM call needed)
+        leave_info = self.hr_agent.get_leave_summary(leave_id)
+        if leave_info['status'] != 'success':
+            return f"❌ Error: {leave_info['message']}"
         
         # Approve the leave
         result = self.hr_agent.approve_leave(leave_id)
@@ -157,7 +152,7 @@ class ManagerWhatsAppHandler:
             return f"❌ Error approving leave: {result['message']}"
         
         # Get suggested substitutes
-        substitutes = ai_result.get('substitutes', [])
+        substitutes = leave_info.get('substitutes', [])
         
         # Notify the employee
         employee_phone = self.get_employee_phone_by_leave_id(leave_id)
@@ -165,8 +160,8 @@ class ManagerWhatsAppHandler:
             employee_msg = f"""
 ✅ Great News! Your leave request #{leave_id} has been APPROVED!
 
-📅 Days: {ai_result['leave_days']} days
-📝 Reason: {ai_result['reason']}
+📅 Days: {leave_info['leave_days']} days
+📝 Reason: {leave_info['reason']}
 
 Your substitute teacher will be assigned shortly. You'll receive confirmation once everything is set up.
 
@@ -181,8 +176,8 @@ Enjoy your time off! 🌟
         return f"""
 ✅ Leave #{leave_id} APPROVED successfully!
 
-👤 Employee: {ai_result['teacher_name']}
-📅 Days: {ai_result['leave_days']} days
+👤 Employee: {leave_info['teacher_name']}
+📅 Days: {leave_info['leave_days']} days
 
 Employee has been notified via WhatsApp.
 
@@ -199,9 +194,9 @@ Example: "Assign Priya Sharma to #{leave_id}"
     def reject_leave(self, leave_id: int, reason: str) -> str:
         """Reject a leave request"""
         # Get leave details first
-        ai_result = self.hr_agent.get_ai_analysis(leave_id)
-        if ai_result['status'] != 'success':
-            return f"❌ Error: {ai_result['message']}"
+        leave_info = self.hr_agent.get_leave_summary(leave_id)
+        if leave_info['status'] != 'success':
+            return f"❌ Error: {leave_info['message']}"
         
         # Reject the leave
         result = self.hr_agent.reject_leave(leave_id, reason)
@@ -216,8 +211,8 @@ Example: "Assign Priya Sharma to #{leave_id}"
 
 Your leave request #{leave_id} has been reviewed and unfortunately cannot be approved at this time.
 
-📅 Requested: {ai_result['leave_days']} days
-📝 Reason: {ai_result['reason']}
+📅 Requested: {leave_info['leave_days']} days
+📝 Reason: {leave_info['reason']}
 
 💬 Manager's feedback: {reason}
 
@@ -229,7 +224,7 @@ Please contact your manager directly to discuss alternative arrangements or resu
         return f"""
 ❌ Leave #{leave_id} REJECTED
 
-👤 Employee: {ai_result['teacher_name']} has been notified via WhatsApp.
+👤 Employee: {leave_info['teacher_name']} has been notified via WhatsApp.
 📝 Rejection reason: {reason}
 
 The employee can resubmit a new request if needed.
@@ -295,7 +290,7 @@ The substitute has been notified and will confirm their availability.
     
     def list_pending_leaves(self) -> str:
         """List all pending leave requests"""
-        pending_leaves = [l for l in self.hr_agent.leaves if l.status == 'pending']
+        pending_leaves = self.hr_agent.list_leaves('pending')
         
         if not pending_leaves:
             return "📋 No pending leave requests at the moment."
@@ -312,7 +307,7 @@ The substitute has been notified and will confirm their availability.
     def get_employee_phone_by_leave_id(self, leave_id: int) -> Optional[str]:
         """Get employee phone number by leave ID"""
         # Find the leave request
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
+        leave = self.hr_agent.get_leave(leave_id)
         if not leave:
             return None
         
@@ -0,0 +1,466 @@
+"""
+Message Classifier - Precompiled intent and command recognition
+The WhatsApp handlers used to rebuild their pattern lists and run dozens of
+uncompiled re.search calls for every message. Everything is now compiled
+once at import:
+
+  * keyword lists become one literal alternation each (sre scans these
+    with a first-character prefix, far cheaper than one `in` per keyword)
+  * any-match pattern lists (leave intent, substitute replies) become one
+    alternation each
+  * ordered lists (days, reasons) stay ordered, since the first pattern
+    *in list order* must win rather than the leftmost match in the text;
+    they are precompiled, and days are skipped outright when the text
+    mentions no day, week or month
+
+Results are identical to the original handlers (classifier_golden.json,
+checked by benchmark_classifier.py).
+
+The webhook classifies each message once with classify() and the handlers
+read the MessageClassification; the per-question functions remain for
+one-off checks and the benchmarks.
+
+    classify("I need 2 days leave for a wedding")  # .leave_intent True, .days 2, .reason 'a wedding'
+"""
+import re
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# ==================== PATTERN TABLES ====================
+
+LEAVE_KEYWORDS = [
+    # Direct leave requests
+    'leave', 'apply for leave', 'need leave', 'want leave', 'request leave',
+    'take leave', 'get leave', 'have leave', 'go on leave',
+
+    # Time off variations
+    'time off', 'day off', 'days off', 'week off', 'weeks off',
+    'vacation', 'holiday', 'break', 'rest',
+
+    # Absence indicators
+    'absent', 'away', 'not available', 'unavailable', 'out of office',
+    'won\'t be in', 'will be away', 'cannot come', 'can\'t come',
+
+    # Specific leave types
+    'sick leave', 'medical leave', 'casual leave', 'emergency leave',
+    'personal leave', 'family leave', 'maternity leave', 'paternity leave',
+
+    # Informal expressions
+    'need to be away', 'have to go', 'going away', 'traveling',
+    'not coming', 'skip work', 'miss work', 'off work'
+]
+
+INTENT_PATTERNS = [
+    r'\bi\s+(need|want|would like|require|request)\s+.*(leave|time off|day off|vacation)',
+    r'\bi\s+(will be|am going to be|gonna be)\s+.*(away|absent|unavailable|out)',
+    r'\bi\s+(have to|need to|must)\s+.*(go|travel|be away|take time)',
+    r'\bcan\s+i\s+(get|have|take)\s+.*(leave|time off|day off)',
+    r'\bi\s+(won\'t|will not|cannot|can\'t)\s+be\s+(in|available|here)',
+    r'\bapply\s+for\s+.*(leave|vacation|time off)',
+    r'\brequest\s+.*(leave|vacation|time off)',
+    r'\btake\s+.*(leave|vacation|time off|day off|week off)',
+    r'\bneed\s+.*(leave|vacation|time off|day off|week off)',
+    r'\bgoing\s+on\s+.*(leave|vacation|holiday)',
+]
+
+DAY_PATTERNS = [
+    # Direct numbers with days/weeks
+    r'(\d+)\s*days?',
+    r'(\d+)\s*weeks?',
+    r'(\d+)\s*months?',
+
+    # Written numbers
+    r'(one|two|three|four|five|six|seven|eight|nine|ten)\s*days?',
+    r'(one|two|three|four)\s*weeks?',
+    r'(a|an)\s*day',
+    r'(a|an)\s*week',
+    r'(a|an)\s*month',
+
+    # Time expressions
+    r'for\s+(\d+)\s*days?',
+    r'for\s+(\d+)\s*weeks?',
+    r'for\s+(a|an|one)\s*(day|week)',
+    r'(\d+)\s*day\s*(leave|off|vacation)',
+    r'(\d+)\s*week\s*(leave|off|vacation)',
+
+    # Casual expressions
+    r'(couple)\s+of\s+days',
+    r'(few)\s+days',
+    r'(several)\s+days',
+]
+
+TEXT_TO_NUM = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
+    'a': 1, 'an': 1, 'couple': 2, 'few': 3, 'several': 4
+}
+
+REASON_PATTERNS = [
+    # Common prepositions
+    r'for\s+(.+?)(?:\.|$|because|due to|since)',
+    r'because\s+(.+?)(?:\.|$|for|due to)',
+    r'due to\s+(.+?)(?:\.|$|because|for)',
+    r'since\s+(.+?)(?:\.|$|because|for)',
+    r'as\s+(.+?)(?:\.|$|because|for)',
+    r'to\s+(.+?)(?:\.|$|because|for|due to)',
+
+    # Reason indicators
+    r'reason:?\s*(.+?)(?:\.|$)',
+    r'purpose:?\s*(.+?)(?:\.|$)',
+
+    # Medical/personal reasons (standalone)
+    r'(sick|ill|unwell|not feeling well)',
+    r'(doctor|hospital|medical|appointment)',
+    r'(family|personal|emergency)',
+    r'(vacation|holiday|travel|trip)',
+    r'(wedding|marriage|funeral)',
+    r'(pregnant|pregnancy|maternity|paternity)',
+    r'(business|conference|meeting|training)',
+
+    # Contextual extraction
+    r'i\s+(am|will be|have to|need to|must)\s+(.+?)(?:\.|$)',
+    r'my\s+(.+?)(?:\.|$)',
+    r'going\s+(.+?)(?:\.|$)',
+    r'attending\s+(.+?)(?:\.|$)',
+
+    # Catch-all for "off" constructions
+    r'off\s+(.+?)(?:\.|$)',
+    r'leave\s+(.+?)(?:\.|$)',
+]
+
+GENERIC_REASONS = frozenset(['it', 'this', 'that', 'some', 'the'])
+
+SUBSTITUTE_ACCEPT_WORDS = ['accept', 'yes', 'confirm', 'ok']
+SUBSTITUTE_DECLINE_WORDS = ['decline', 'reject', 'no', 'cannot', 'can\'t']
+
+MANAGER_KEYWORDS = [
+    'approve', 'reject', 'deny', 'status', 'list', 'pending',
+    'assign', 'help', 'commands'
+]
+
+# Every word either manager command parser branches on
+MANAGER_COMMAND_WORDS = [
+    'approve', 'accept', 'yes', 'reject', 'deny', 'no', 'assign',
+    'status', 'check', 'info', 'list', 'pending', 'show', 'help', 'commands'
+]
+
+# Manager command words whose branch reads a leave id
+ID_COMMAND_WORDS = frozenset(['approve', 'accept', 'reject', 'deny', 'status', 'check', 'info'])
+
+SUBSTITUTE_NAME_PREFIXES = [
+    'i suggest', 'i recommend', 'i prefer', 'i want', 'i choose',
+    'suggest', 'recommend', 'prefer', 'choose', 'select',
+    'my suggestion is', 'i think', 'maybe', 'how about'
+]
+
+LEAVE_ID = re.compile(r'#?(\d+)')
+ASSIGN_COMMAND = re.compile(r'assign\s+(.+?)\s+to\s+#?(\d+)')
+REASON_PREFIX = re.compile(r'^(to|for|because|due to|since|as)\s+')
+WHITESPACE = re.compile(r'\s+')
+NAME_LEAD_IN = re.compile(r'^(is|would be|could be|should be)\s+', re.IGNORECASE)
+
+
+# ==================== COMPILED MATCHERS ====================
+
+class KeywordSet:
+    """Substring keywords (`keyword in text`), as one literal alternation"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(dict.fromkeys(keywords))
+        # A pure literal alternation lets sre skip ahead on the first characters
+        self._any = re.compile('|'.join(re.escape(keyword) for keyword in
+                                        sorted(self.keywords, key=len, reverse=True)))
+
+    def any(self, text: str) -> bool:
+        return self._any.search(text) is not None
+
+    def found(self, text: str) -> FrozenSet[str]:
+        # Plain `in` beats an overlapping regex scan for a dozen short words
+        return frozenset(keyword for keyword in self.keywords if keyword in text)
+
+
+class OrderedPatterns:
+    """Precompiled regexes where the first pattern *in list order* wins
+
+    first() gives what `for pattern in patterns: re.search(pattern, text)`
+    gives. `requires` lists literals of which every pattern contains at
+    least one, so text without any of them is rejected in a single scan.
+    """
+
+    def __init__(self, patterns: List[str], requires: Iterable[str] = ()):
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.requires = KeywordSet(requires) if requires else None
+
+    def first(self, text: str, convert: Callable[[re.Match], Optional[object]] = None
+              ) -> Optional[Tuple[int, object]]:
+        """(pattern index, value) for the first pattern whose match converts to a value
+
+        convert returning None rejects the match and moves on to the next
+        pattern, like `continue` in the original loops.
+        """
+        if self.requires and not self.requires.any(text):
+            return None
+        for index, pattern in enumerate(self.patterns):
+            match = pattern.search(text)
+            if match:
+                value = convert(match) if convert else match
+                if value is not None:
+                    return index, value
+        return None
+
+
+# Keywords and phrases are separate passes: literals alone compile to a fast prefix scan
+LEAVE_KEYWORD = KeywordSet(LEAVE_KEYWORDS)
+LEAVE_PHRASE = re.compile('|'.join(f'(?:{pattern})' for pattern in INTENT_PATTERNS))
+SUBSTITUTE_RESPONSE = re.compile(
+    '(?:' + '|'.join(re.escape(word) for word in SUBSTITUTE_ACCEPT_WORDS + SUBSTITUTE_DECLINE_WORDS) + r')\s+#?\d+'
+)
+SUBSTITUTE_WORDS = KeywordSet(SUBSTITUTE_ACCEPT_WORDS + SUBSTITUTE_DECLINE_WORDS)
+MANAGER_WORDS = KeywordSet(MANAGER_KEYWORDS)
+COMMAND_WORDS = KeywordSet(MANAGER_COMMAND_WORDS)
+# Alternatives are tried in list order, so the first listed prefix wins as before
+SUBSTITUTE_NAME_PREFIX = re.compile('|'.join(re.escape(prefix) for prefix in SUBSTITUTE_NAME_PREFIXES))
+# Every day pattern mentions a day, week or month
+DAYS = OrderedPatterns(DAY_PATTERNS, requires=['day', 'week', 'month'])
+REASONS = OrderedPatterns(REASON_PATTERNS)
+
+
+def _normalize(message: str) -> str:
+    return message.lower().strip()
+
+
+def days_from_match(match: re.Match) -> Optional[int]:
+    day_text = match.group(1)
+    if day_text.isdigit():
+        days = int(day_text)
+    elif day_text in TEXT_TO_NUM:
+        days = TEXT_TO_NUM[day_text]
+    else:
+        return None
+
+    # Convert weeks/months to days
+    if 'week' in match.group(0):
+        days *= 7
+    elif 'month' in match.group(0):
+        days *= 30
+    return days
+
+
+def reason_from_match(match: re.Match) -> Optional[str]:
+    reason = REASON_PREFIX.sub('', match.group(1).strip())
+    reason = WHITESPACE.sub(' ', reason)
+
+    # Skip very short or generic reasons
+    if len(reason) > 2 and reason not in GENERIC_REASONS:
+        return reason
+    return None
+
+
+# ==================== SCANS ON NORMALIZED TEXT ====================
+# Shared by the one-off functions below and by MessageClassification, which
+# normalizes a message once and runs each scan at most once.
+
+# Marks a value MessageClassification (or a caller) has not computed yet
+_UNSCANNED = object()
+
+
+def _leave_id(message: str) -> Optional[int]:
+    match = LEAVE_ID.search(message)
+    return int(match.group(1)) if match else None
+
+
+def _is_substitute_response(text: str) -> bool:
+    return SUBSTITUTE_RESPONSE.search(text) is not None
+
+
+def _substitute_action(text: str) -> Optional[str]:
+    words = SUBSTITUTE_WORDS.found(text)
+    if any(word in words for word in SUBSTITUTE_ACCEPT_WORDS):
+        return 'accept'
+    if any(word in words for word in SUBSTITUTE_DECLINE_WORDS):
+        return 'decline'
+    return None
+
+
+def _is_manager_command(text: str, message: str, number: Optional[int]) -> bool:
+    return MANAGER_WORDS.any(text) or (number is not None and len(message.split()) <= 5)
+
+
+def _leave_intent(text: str) -> bool:
+    return LEAVE_KEYWORD.any(text) or LEAVE_PHRASE.search(text) is not None
+
+
+def _days(text: str) -> Optional[int]:
+    found = DAYS.first(text, days_from_match)
+    return found[1] if found else None
+
+
+def _reason(text: str) -> Optional[str]:
+    found = REASONS.first(text, reason_from_match)
+    return found[1] if found else None
+
+
+def _manager_command(text: str, message: str, number=_UNSCANNED) -> Dict:
+    words = COMMAND_WORDS.found(text)
+    # Only the id-taking branches look for a leave id
+    if number is _UNSCANNED and words & ID_COMMAND_WORDS:
+        number = _leave_id(message)
+
+    # Branch order matters: 'reject' beats 'status', 'status' beats 'list'...
+    if 'approve' in words or 'accept' in words:
+        if number is not None:
+            return {'action': 'approve', 'leave_id': number}
+
+    elif 'reject' in words or 'deny' in words:
+        if number is not None:
+            return {'action': 'reject', 'leave_id': number, 'reason': message}
+
+    elif 'assign' in words:
+        assign_match = ASSIGN_COMMAND.search(text)
+        if assign_match:
+            return {
+                'action': 'assign',
+                'substitute_name': assign_match.group(1).strip(),
+                'leave_id': int(assign_match.group(2))
+            }
+
+    elif 'status' in words or 'check' in words or 'info' in words:
+        if number is not None:
+            return {'action': 'status', 'leave_id': number}
+        # No ID provided, show all leaves status
+        return {'action': 'status_all'}
+
+    elif 'list' in words or 'pending' in words or 'show' in words:
+        return {'action': 'list'}
+
+    elif 'help' in words or 'commands' in words:
+        return {'action': 'help'}
+
+    return {'action': 'unknown'}
+
+
+def _leave_details(days: Optional[int], reason: Optional[str]) -> Dict:
+    details = {}
+    if days is not None:
+        details['days'] = days
+    if reason is not None:
+        details['reason'] = reason
+    return details
+
+
+# ==================== PUBLIC API ====================
+
+def leave_id(message: str) -> Optional[int]:
+    """First number in the message ('#12' or '12')"""
+    return _leave_id(message)
+
+
+def is_substitute_response(message: str) -> bool:
+    """'Accept #3', 'no 3', "can't #3"..."""
+    return _is_substitute_response(_normalize(message))
+
+
+def substitute_action(message: str) -> Optional[str]:
+    """'accept', 'decline' or None for a substitute's reply (accept words win)"""
+    return _substitute_action(_normalize(message))
+
+
+def is_manager_command(message: str) -> bool:
+    """Manager keyword anywhere, or a short message carrying a leave id"""
+    return _is_manager_command(_normalize(message), message, _leave_id(message))
+
+
+def parse_leave_intent(message: str) -> bool:
+    """Leave keyword or intent phrase anywhere in the message"""
+    return _leave_intent(_normalize(message))
+
+
+def extract_leave_details(message: str) -> Dict:
+    """{'days': int, 'reason': str}, each only when found"""
+    text = _normalize(message)
+    return _leave_details(_days(text), _reason(text))
+
+
+def parse_manager_command(message: str) -> Dict:
+    """Manager command as {'action': ..., 'leave_id': ..., ...}; 'unknown' if not understood"""
+    return _manager_command(_normalize(message), message)
+
+
+def extract_substitute_name(message: str) -> str:
+    """Title-cased name from 'I suggest vikram singh' etc.; '' if it doesn't look like a name"""
+    message = message.strip()
+
+    # Remove common prefixes
+    prefix = SUBSTITUTE_NAME_PREFIX.match(message.lower())
+    if prefix:
+        message = message[prefix.end():].strip()
+
+    # Clean up the name
+    message = NAME_LEAD_IN.sub('', message)
+    message = message.strip('.,!?')
+
+    # Basic name validation (at least 1 word, reasonable length)
+    words = message.split()
+    if len(words) >= 1 and len(message) <= 50 and len(message) >= 2 and all(word.replace('-', '').replace("'", '').isalpha() for word in words):
+        return message.title()  # Proper case
+
+    return ""
+
+
+class MessageClassification:
+    """Everything the handlers decide about one message
+
+    The message is normalized and its leave id found once. The routing
+    flags are read for every message and computed up front; the day,
+    reason, intent and command scans run on first access and are kept, so
+    however many handlers look at a message each scan runs at most once.
+    """
+
+    def __init__(self, message: str):
+        self.message = message
+        self.text = _normalize(message)
+        self.leave_id = _leave_id(message)
+        self.substitute_response = _is_substitute_response(self.text)
+        self.manager_command = _is_manager_command(self.text, message, self.leave_id)
+        self._leave_intent = self._days = self._reason = _UNSCANNED
+        self._substitute_action = self._command = _UNSCANNED
+
+    @property
+    def leave_intent(self) -> bool:
+        if self._leave_intent is _UNSCANNED:
+            self._leave_intent = _leave_intent(self.text)
+        return self._leave_intent
+
+    @property
+    def days(self) -> Optional[int]:
+        if self._days is _UNSCANNED:
+            self._days = _days(self.text)
+        return self._days
+
+    @property
+    def reason(self) -> Optional[str]:
+        if self._reason is _UNSCANNED:
+            self._reason = _reason(self.text)
+        return self._reason
+
+    @property
+    def leave_details(self) -> Dict:
+        """{'days': int, 'reason': str}, as extract_leave_details"""
+        return _leave_details(self.days, self.reason)
+
+    @property
+    def substitute_action(self) -> Optional[str]:
+        if self._substitute_action is _UNSCANNED:
+            self._substitute_action = _substitute_action(self.text)
+        return self._substitute_action
+
+    @property
+    def command(self) -> Dict:
+        """Manager command, as parse_manager_command"""
+        if self._command is _UNSCANNED:
+            self._command = _manager_command(self.text, self.message, self.leave_id)
+        return self._command
+
+
+def classify(message: str) -> MessageClassification:
+    """Classify a message once; handlers read intent, leave id, days and reason from the result"""
+    return MessageClassification(message)
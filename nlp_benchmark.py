@@ -0,0 +1,244 @@
+"""
+NLP Benchmark - Throughput and regression check for message parsing
+Runs the parsing behind UnifiedWhatsAppHandler (parse_leave_intent,
+extract_leave_details, extract_substitute_name, parse_manager_command; the
+handler methods delegate to message_classifier) over a deterministic corpus
+of realistic WhatsApp messages and reports:
+  * messages per second for each function
+  * per-pattern hit rates (which pattern produced each field)
+
+It fails (exit code 1) when an extracted field differs from
+nlp_regression.json or when throughput drops more than --tolerance below
+the recorded baseline (measured relative to a fixed reference workload, so
+baselines carry across machines). After an intended change, record the new results:
+
+    python nlp_benchmark.py                 # check
+    python nlp_benchmark.py --update        # accept current fields + throughput
+    python nlp_benchmark.py --show-hits 30
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List
+
+import benchmark_classifier
+import message_classifier
+
+REGRESSION_FILE = "nlp_regression.json"
+GOLDEN_FILE = "classifier_golden.json"
+
+FUNCTIONS: Dict[str, Callable] = {
+    "parse_leave_intent": message_classifier.parse_leave_intent,
+    "extract_leave_details": message_classifier.extract_leave_details,
+    "extract_substitute_name": message_classifier.extract_substitute_name,
+    "parse_manager_command": message_classifier.parse_manager_command,
+}
+
+# ==================== CORPUS ====================
+
+NAMES = ["Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Priya Sharma", "Kiran", "Meera Iyer",
+         "Rohan", "Lakshmi", "Deepak Rao", "Fatima", "Suresh", "Kavya", "Anil Kumar", "D'Souza"]
+DAYS = ["2 days", "3 days", "1 day", "a day", "one day", "two days", "five days", "a week", "one week",
+        "2 weeks", "10 days", "1 month", "couple of days", "few days", "4days", "half a day", "an week"]
+REASONS = ["fever", "my sister's wedding", "family emergency", "a doctor appointment", "a conference in Pune",
+           "my son's school annual day", "medical checkup", "a funeral", "personal work", "travel to my hometown",
+           "maternity", "a training program", "my exams", "moving house", "it", "the flu", "surgery"]
+GREETINGS = ["", "Hi, ", "Hello sir, ", "Good morning. ", "hey "]
+LEAVE_TEMPLATES = [
+    "{greet}I need {days} leave for {reason}",
+    "{greet}I want {days} off because of {reason}",
+    "{greet}Can I take {days} off for {reason}?",
+    "{greet}I will be away for {days} due to {reason}",
+    "{greet}Requesting {days} of leave. Reason: {reason}",
+    "{greet}{days} leave please, {reason}",
+    "{greet}I won't be in for {days}, {reason}",
+    "{greet}Apply for {days} sick leave",
+    "{greet}I have to go for {reason}, need {days}",
+    "{greet}going on vacation for {days}",
+    "{greet}I need leave",
+    "{greet}need time off for {reason}",
+    "{greet}I am not feeling well, can I get {days} off",
+    "{greet}My {reason} is coming up so I'll be absent {days}",
+]
+FOLLOW_UPS = ["{days}", "for {days}", "because {reason}", "{reason}", "reason: {reason}",
+              "{days}, {reason}", "it's for {reason}", "since {reason}"]
+SUBSTITUTE_TEMPLATES = ["{name}", "I suggest {name}", "maybe {name}", "How about {name}?", "I think {name}",
+                        "select {name}", "my suggestion is {name}", "{name} would be good",
+                        "is {name}", "I prefer {name}.", "anyone is fine", "not sure", "{name} or {other}"]
+MANAGER_TEMPLATES = ["Approve #{id}", "approve {id}", "APPROVE {id}", "Reject #{id} {reason}",
+                     "reject {id} not enough coverage", "deny #{id}", "Assign {name} to #{id}",
+                     "assign {name} to {id}", "Status #{id}", "status", "check {id}", "info",
+                     "List", "pending", "show pending", "help", "commands", "approve", "reject"]
+REPLY_TEMPLATES = ["Accept #{id}", "accept {id}", "Decline #{id}", "yes {id}", "ok #{id}", "confirm {id}",
+                   "No #{id}", "cannot {id}", "can't #{id}", "I accept", "sorry I can't"]
+CHATTER = ["hi", "hello", "thanks", "thank you!", "ok", "yes", "no", "reset", "good morning",
+           "What is my leave balance?", "who is my manager", "👍", "", "?", "Please call me back"]
+
+
+def build_corpus(size: int = 2000, seed: int = 17) -> List[str]:
+    """Deterministic mix of employee, substitute and manager traffic (plus the classifier golden set)"""
+    rng = random.Random(seed)
+
+    def fill(template: str) -> str:
+        return template.format(greet=rng.choice(GREETINGS), days=rng.choice(DAYS), reason=rng.choice(REASONS),
+                               name=rng.choice(NAMES), other=rng.choice(NAMES), id=rng.randint(1, 250))
+
+    mix = [(LEAVE_TEMPLATES, 0.35), (FOLLOW_UPS, 0.15), (SUBSTITUTE_TEMPLATES, 0.15),
+           (MANAGER_TEMPLATES, 0.2), (REPLY_TEMPLATES, 0.1), (CHATTER, 0.05)]
+    messages = []
+    for templates, share in mix:
+        messages += [fill(rng.choice(templates)) for _ in range(int(size * share))]
+
+    if os.path.exists(GOLDEN_FILE):
+        with open(GOLDEN_FILE, encoding="utf-8") as f:
+            messages += [case["message"] for case in json.load(f)["cases"]]
+    rng.shuffle(messages)
+    return messages
+
+
+# ==================== MEASUREMENTS ====================
+
+def extract_fields(message: str) -> Dict:
+    return {name: function(message) for name, function in FUNCTIONS.items()}
+
+
+def _best_pass(function: Callable, messages: List[str]) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        function(message)
+    return time.perf_counter() - started
+
+
+def throughput(messages: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Messages per second for each function, absolute and relative to a reference
+
+    Each function keeps its best of `repeat` passes, as timeit does. CPU
+    speed on shared machines drifts by tens of percent between runs, so
+    every pass is paired with a pass of the frozen original
+    parse_leave_intent (benchmark_classifier) and the regression check
+    compares the ratio, which drift cancels out of.
+    """
+    reference = benchmark_classifier.legacy_parse_leave_intent
+    results = {}
+    for name, function in FUNCTIONS.items():
+        best, best_reference = float("inf"), float("inf")
+        for _ in range(repeat):
+            best_reference = min(best_reference, _best_pass(reference, messages))
+            best = min(best, _best_pass(function, messages))
+        results[name] = {"msg_per_s": len(messages) / best, "relative": best_reference / best}
+    return results
+
+
+def pattern_hits(messages: List[str]) -> Dict[str, Counter]:
+    """Which pattern produced each field, per function"""
+    hits = {"days": Counter(), "reason": Counter(), "intent": Counter(), "substitute_prefix": Counter(),
+            "manager_action": Counter()}
+    for message in messages:
+        text = message.lower().strip()
+
+        days = message_classifier.DAYS.first(text, message_classifier.days_from_match)
+        hits["days"][message_classifier.DAY_PATTERNS[days[0]] if days else "(none)"] += 1
+
+        reason = message_classifier.REASONS.first(text, message_classifier.reason_from_match)
+        hits["reason"][message_classifier.REASON_PATTERNS[reason[0]] if reason else "(none)"] += 1
+
+        keyword = next((keyword for keyword in message_classifier.LEAVE_KEYWORDS if keyword in text), None)
+        if keyword:
+            hits["intent"][f"keyword '{keyword}'"] += 1
+        elif message_classifier.LEAVE_PHRASE.search(text):
+            hits["intent"]["intent phrase"] += 1
+        else:
+            hits["intent"]["(none)"] += 1
+
+        prefix = message_classifier.SUBSTITUTE_NAME_PREFIX.match(text)
+        hits["substitute_prefix"][prefix.group(0) if prefix else "(none)"] += 1
+
+        hits["manager_action"][message_classifier.parse_manager_command(message)["action"]] += 1
+    return hits
+
+
+# ==================== REGRESSION ====================
+
+def load_regression(path: str = REGRESSION_FILE) -> Dict:
+    if not os.path.exists(path):
+        return {"throughput": {}, "fields": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def field_regressions(messages: List[str], recorded: Dict[str, Dict]) -> List[str]:
+    problems = []
+    for message in dict.fromkeys(messages):
+        expected = recorded.get(message)
+        if expected is None:
+            problems.append(f"no recorded result for {message!r} (run with --update)")
+            continue
+        for name, value in extract_fields(message).items():
+            if value != expected[name]:
+                problems.append(f"{name}({message!r}): expected {expected[name]!r}, got {value!r}")
+    return problems
+
+
+def throughput_regressions(measured: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                           tolerance: float) -> List[str]:
+    problems = []
+    for name, result in measured.items():
+        recorded = baseline.get(name, {}).get("relative")
+        if recorded and result["relative"] < recorded * (1 - tolerance):
+            problems.append(f"{name}: {result['relative']:.2f}x the reference is "
+                            f"{1 - result['relative'] / recorded:.0%} below the baseline {recorded:.2f}x")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2000, help="generated messages (before the golden set)")
+    parser.add_argument("--repeat", type=int, default=15, help="timed passes per function (best is kept)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed throughput drop vs baseline")
+    parser.add_argument("--show-hits", type=int, default=8, help="patterns shown per field")
+    parser.add_argument("--update", action="store_true", help="record current fields and throughput")
+    args = parser.parse_args()
+
+    messages = build_corpus(args.size)
+    print(f"🧪 {len(messages)} messages ({len(set(messages))} distinct)\n")
+
+    measured = throughput(messages, args.repeat)
+    print("Throughput:")
+    for name, result in measured.items():
+        print(f"  {name:<26} {result['msg_per_s']:>12,.0f} msg/s  ({1e6 / result['msg_per_s']:6.1f} µs/msg)"
+              f"  {result['relative']:6.2f}x reference")
+
+    print("\nPattern hit rates:")
+    for field, counter in pattern_hits(messages).items():
+        print(f"  {field}:")
+        for pattern, count in counter.most_common(args.show_hits):
+            print(f"    {count / len(messages):6.1%}  {pattern}")
+
+    if args.update:
+        with open(REGRESSION_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "throughput": {name: {"msg_per_s": round(result["msg_per_s"]), "relative": round(result["relative"], 3)}
+                               for name, result in measured.items()},
+                "fields": {message: extract_fields(message) for message in dict.fromkeys(messages)}
+            }, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n📝 Recorded {len(set(messages))} results and throughput in {REGRESSION_FILE}")
+        return
+
+    recorded = load_regression()
+    problems = field_regressions(messages, recorded["fields"])
+    problems += throughput_regressions(measured, recorded["throughput"], args.tolerance)
+    if problems:
+        print(f"\n❌ {len(problems)} regressions:")
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\n✅ No field or throughput regressions")
+
+
+if __name__ == "__main__":
+    main()
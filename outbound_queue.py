@@ -0,0 +1,231 @@
+"""
+Outbound Queue - Sends WhatsApp notifications off the request thread
+Webhook handlers enqueue messages; a pool of sender workers talks to Twilio.
+Messages are persisted in the Outbox first, so failures are retried and
+nothing is lost across restarts.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client as TwilioClient
+
+from outbox import Outbox
+from rate_limiter import SenderRateLimiters
+
+# Lower sends first: replies someone is waiting on jump ahead of status updates
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Seconds to hold a sender's bucket empty after Twilio answers 429
+RATE_LIMIT_PENALTY = float(os.getenv('TWILIO_429_PENALTY_SECONDS', '5'))
+
+# Seconds before a Twilio REST call is abandoned; must stay below the outbox
+# claim timeout, or a hung send is reclaimed and delivered twice
+TWILIO_HTTP_TIMEOUT = float(os.getenv('TWILIO_HTTP_TIMEOUT_SECONDS', '30'))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Twilio 4xx errors (bad number, unverified recipient...) won't succeed on retry; 429 will"""
+    status = getattr(error, 'status', None)
+    if isinstance(status, int) and 400 <= status < 500 and status != 429:
+        return False
+    return True
+
+
+class RedirectingHttpClient(TwilioHttpClient):
+    """Sends Twilio REST calls to another host (a local stand-in), keeping path and auth"""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, url, *args, **kwargs):
+        path = url.split('://', 1)[-1].split('/', 1)[-1]
+        return super().request(method, f"{self.base_url}/{path}", *args, **kwargs)
+
+
+def create_twilio_client() -> TwilioClient:
+    """Twilio REST client from the environment; TWILIO_API_BASE_URL redirects it (load tests)"""
+    base_url = os.getenv('TWILIO_API_BASE_URL')
+    return TwilioClient(
+        os.getenv('TWILIO_ACCOUNT_SID'),
+        os.getenv('TWILIO_AUTH_TOKEN'),
+        http_client=(RedirectingHttpClient(base_url, timeout=TWILIO_HTTP_TIMEOUT) if base_url
+                     else TwilioHttpClient(timeout=TWILIO_HTTP_TIMEOUT))
+    )
+
+
+class OutboundQueue:
+    """Bounded in-process wake-up queue over a durable outbox, drained by sender workers"""
+
+    def __init__(self, client, from_number: str, outbox: Optional[Outbox] = None,
+                 workers: Optional[int] = None, maxsize: Optional[int] = None,
+                 rate_limiters: Optional[SenderRateLimiters] = None):
+        self.client = client
+        self.from_number = from_number
+        self.outbox = outbox or Outbox()
+        http_client = getattr(client, 'http_client', None)
+        if isinstance(http_client, TwilioHttpClient):
+            http_timeout = http_client.timeout
+            if http_timeout is None or http_timeout >= self.outbox.claim_timeout:
+                raise ValueError(
+                    f"Twilio HTTP timeout ({http_timeout}s) must be below OUTBOX_CLAIM_TIMEOUT_SECONDS "
+                    f"({self.outbox.claim_timeout:.0f}s), or a slow send can be reclaimed and sent twice"
+                )
+        # Buckets live in the outbox database so all gunicorn workers share one send rate
+        self.rate_limiters = rate_limiters or SenderRateLimiters(self.outbox.db)
+        self.workers = workers or int(os.getenv('OUTBOUND_WORKERS', '4'))
+        self.maxsize = maxsize or int(os.getenv('OUTBOUND_QUEUE_SIZE', '1000'))
+        # How often the scheduler looks for due retries and overflowed messages
+        self.poll_interval = float(os.getenv('OUTBOUND_POLL_SECONDS', '1'))
+        self.retention_seconds = float(os.getenv('OUTBOX_RETENTION_HOURS', '72')) * 3600
+
+        # (priority, seq, id) waiting for a worker; the outbox row is the source of truth
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=self.maxsize)
+        self._sequence = itertools.count()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"outbound-{i}", daemon=True)
+            worker.start()
+        threading.Thread(target=self._scheduler_loop, name="outbound-scheduler", daemon=True).start()
+
+    def enqueue(self, to_phone: str, body: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[str]:
+        """Persist a message and wake a sender; returns its tracking id"""
+        try:
+            message_id = self.outbox.add(to_phone, body, priority)
+        except Exception as e:
+            print(f"Error writing outbound message to outbox: {e}")
+            return None
+
+        # A full queue is fine: the scheduler picks the row up from the outbox
+        self._schedule(priority, message_id)
+        return message_id
+
+    def get_status(self, message_id: str) -> Optional[Dict]:
+        """Delivery status of a queued message, without its recipient or body"""
+        record = self.outbox.get(message_id)
+        if record is None:
+            return None
+        return {
+            "id": record["id"],
+            "status": record["status"],
+            "attempts": record["attempts"],
+            "last_error": record.get("error"),
+            "created_at": record.get("created_at"),
+            "sent_at": record.get("sent_at"),
+            "failed_at": record.get("failed_at")
+        }
+
+    def stats(self) -> Dict:
+        """Queue depth and delivery counters"""
+        backlog = self.outbox.backlog_by_priority()
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self.maxsize,
+            "workers": self.workers,
+            "backlog_interactive": backlog.get(PRIORITY_INTERACTIVE, 0),
+            "backlog_bulk": backlog.get(PRIORITY_BULK, 0),
+            "consecutive_failures": self._consecutive_failures,
+            "rate_limits": self.rate_limiters.snapshot(),
+            **self.outbox.counts()
+        }
+
+    def _schedule(self, priority: int, message_id: str) -> bool:
+        with self._lock:
+            if message_id in self._scheduled:
+                return True
+            try:
+                self._queue.put_nowait((priority, next(self._sequence), message_id))
+            except queue.Full:
+                return False
+            self._scheduled.add(message_id)
+            return True
+
+    def _scheduler_loop(self) -> None:
+        """Feed due retries (and anything that overflowed the queue) to the workers"""
+        last_prune = 0.0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                free = self.maxsize - self._queue.qsize()
+                if free > 0:
+                    for priority, message_id in self.outbox.due(free):
+                        if not self._schedule(priority, message_id):
+                            break
+
+                if time.time() - last_prune > 3600:
+                    self.outbox.prune_sent(self.retention_seconds)
+                    last_prune = time.time()
+            except Exception as e:
+                print(f"Outbound scheduler error: {e}")
+
+    def _worker_loop(self) -> None:
+        bucket = self.rate_limiters.for_sender(self.from_number)
+        while True:
+            item = self._queue.get()
+            _, _, message_id = item
+
+            # No token yet: put the message back so a higher-priority arrival
+            # can overtake it, and try again once the bucket has refilled
+            wait = bucket.try_acquire()
+            if wait > 0:
+                try:
+                    self._queue.put_nowait(item)
+                    self._queue.task_done()
+                    time.sleep(wait)
+                    continue
+                except queue.Full:
+                    time.sleep(wait)
+                    bucket.acquire()
+
+            try:
+                self._deliver(message_id)
+            except Exception as e:
+                print(f"Outbound worker error for {message_id}: {e}")
+            finally:
+                with self._lock:
+                    self._scheduled.discard(message_id)
+                self._queue.task_done()
+
+    def _deliver(self, message_id: str) -> None:
+        """Send one message through Twilio and record the outcome"""
+        # Claiming makes sure no other worker or process sends it twice
+        message = self.outbox.claim(message_id)
+        if message is None:
+            return
+
+        try:
+            result = self.client.messages.create(
+                from_=self.from_number,
+                to=message['to_phone'],
+                body=message['body']
+            )
+        except Exception as e:
+            print(f"Error sending WhatsApp message to {message['to_phone']}: {e}")
+            if getattr(e, 'status', None) == 429:
+                self.rate_limiters.for_sender(self.from_number).penalize(RATE_LIMIT_PENALTY)
+            status = self.outbox.mark_failed(message_id, str(e), retryable=is_retryable_error(e))
+            if status == "dead":
+                print(f"Outbound message {message_id} moved to dead letters")
+            with self._lock:
+                self._consecutive_failures += 1
+            return
+
+        self.outbox.mark_sent(message_id, getattr(result, 'sid', None))
+
+        with self._lock:
+            recovered = self._consecutive_failures > 0
+            self._consecutive_failures = 0
+        if recovered:
+            # Provider is back: drain the retry backlog now instead of waiting out each backoff
+            released = self.outbox.release_backoff()
+            if released:
+                print(f"Twilio recovered; releasing {released} delayed messages")
@@ -0,0 +1,221 @@
+"""
+Outbox - Durable record of outbound WhatsApp messages
+Every notification is written to SQLite before it is sent, retried with
+jittered exponential backoff, and moved to a dead-letter table when it keeps failing.
+
+Inspect from the command line:
+    python outbox.py stats
+    python outbox.py dead-letters
+    python outbox.py requeue <message_id>
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlite_db import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    to_phone TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued, sending, sent
+    priority INTEGER NOT NULL DEFAULT 1,    -- 0 interactive, 1 bulk
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    sid TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    sent_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id TEXT PRIMARY KEY,
+    to_phone TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    failed_at TEXT NOT NULL
+);
+"""
+
+
+class Outbox:
+    """SQLite-backed outbox with claim-based delivery, retries and dead letters"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.db = SQLiteDatabase(path or os.getenv('OUTBOX_DB_PATH', 'outbox.db'), SCHEMA)
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+        self.retry_base = float(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '2'))
+        self.retry_max = float(os.getenv('OUTBOX_RETRY_MAX_SECONDS', '300'))
+        # A 'sending' claim older than this is assumed to belong to a dead process
+        self.claim_timeout = float(os.getenv('OUTBOX_CLAIM_TIMEOUT_SECONDS', '120'))
+
+    def add(self, to_phone: str, body: str, priority: int = 1) -> str:
+        """Record a new outbound message; returns its id"""
+        message_id = uuid.uuid4().hex
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO outbox (id, to_phone, body, priority, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (message_id, to_phone, body, priority, time.time(), datetime.now().isoformat())
+            )
+        return message_id
+
+    def claim(self, message_id: str) -> Optional[Dict]:
+        """Take ownership of a queued message for sending (None if someone else has it)"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            updated = conn.execute(
+                "UPDATE outbox SET status = 'sending', claimed_at = ? "
+                "WHERE id = ? AND (status = 'queued' OR (status = 'sending' AND claimed_at < ?))",
+                (now, message_id, now - self.claim_timeout)
+            ).rowcount
+            if not updated:
+                return None
+            row = conn.execute("SELECT * FROM outbox WHERE id = ?", (message_id,)).fetchone()
+        return dict(row)
+
+    def mark_sent(self, message_id: str, sid: Optional[str]) -> None:
+        """Record a successful send"""
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', sid = ?, error = NULL, attempts = attempts + 1, sent_at = ? "
+                "WHERE id = ?",
+                (sid, datetime.now().isoformat(), message_id)
+            )
+
+    def mark_failed(self, message_id: str, error: str, retryable: bool = True) -> str:
+        """Schedule a retry with backoff, or dead-letter the message; returns the new status"""
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT * FROM outbox WHERE id = ?", (message_id,)).fetchone()
+            if row is None:
+                return "missing"
+
+            attempts = row["attempts"] + 1
+            if retryable and attempts < self.max_attempts:
+                conn.execute(
+                    "UPDATE outbox SET status = 'queued', attempts = ?, error = ?, next_attempt_at = ?, claimed_at = NULL "
+                    "WHERE id = ?",
+                    (attempts, error, time.time() + self.backoff_delay(attempts), message_id)
+                )
+                return "queued"
+
+            conn.execute(
+                "INSERT OR REPLACE INTO dead_letters (id, to_phone, body, attempts, error, created_at, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (message_id, row["to_phone"], row["body"], attempts, error, row["created_at"], datetime.now().isoformat())
+            )
+            conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            return "dead"
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Exponential backoff with jitter: half fixed, half random, capped at retry_max"""
+        delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def due(self, limit: int) -> List[Tuple[int, str]]:
+        """(priority, id) of messages ready to be (re)sent, interactive first, then oldest first"""
+        now = time.time()
+        rows = self.db.conn.execute(
+            "SELECT priority, id FROM outbox WHERE (status = 'queued' AND next_attempt_at <= ?) "
+            "OR (status = 'sending' AND claimed_at < ?) ORDER BY priority, next_attempt_at LIMIT ?",
+            (now, now - self.claim_timeout, limit)
+        ).fetchall()
+        return [(row["priority"], row["id"]) for row in rows]
+
+    def release_backoff(self) -> int:
+        """Make every waiting retry due now (used once the provider recovers)"""
+        with self.db.transaction() as conn:
+            return conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE status = 'queued' AND next_attempt_at > ?",
+                (time.time(), time.time())
+            ).rowcount
+
+    def prune_sent(self, older_than_seconds: float) -> int:
+        """Delete delivered messages older than the retention window"""
+        cutoff = datetime.fromtimestamp(time.time() - older_than_seconds).isoformat()
+        with self.db.transaction() as conn:
+            return conn.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?", (cutoff,)
+            ).rowcount
+
+    def get(self, message_id: str) -> Optional[Dict]:
+        """Current record of a message (from the outbox or the dead-letter table)"""
+        conn = self.db.conn
+        row = conn.execute("SELECT * FROM outbox WHERE id = ?", (message_id,)).fetchone()
+        if row is not None:
+            return dict(row)
+        row = conn.execute("SELECT * FROM dead_letters WHERE id = ?", (message_id,)).fetchone()
+        return {**dict(row), "status": "dead"} if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of messages per status, including dead letters"""
+        conn = self.db.conn
+        counts = {"queued": 0, "sending": 0, "sent": 0}
+        for row in conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        counts["dead"] = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return counts
+
+    def backlog_by_priority(self) -> Dict[int, int]:
+        """Unsent messages (queued or sending) per priority"""
+        rows = self.db.conn.execute(
+            "SELECT priority, COUNT(*) AS n FROM outbox WHERE status != 'sent' GROUP BY priority"
+        )
+        return {row["priority"]: row["n"] for row in rows}
+
+    def dead_letters(self, limit: int = 50) -> List[Dict]:
+        """Most recent dead-lettered messages"""
+        rows = self.db.conn.execute(
+            "SELECT * FROM dead_letters ORDER BY failed_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue_dead_letter(self, message_id: str) -> bool:
+        """Move a dead letter back into the outbox for another round of attempts"""
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT * FROM dead_letters WHERE id = ?", (message_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute(
+                "INSERT INTO outbox (id, to_phone, body, priority, next_attempt_at, created_at) VALUES (?, ?, ?, 0, ?, ?)",
+                (row["id"], row["to_phone"], row["body"], time.time(), row["created_at"])
+            )
+            conn.execute("DELETE FROM dead_letters WHERE id = ?", (message_id,))
+        return True
+
+
+def main():
+    """Command-line inspection of the outbox"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    outbox = Outbox()
+
+    if command == "stats":
+        for status, count in outbox.counts().items():
+            print(f"{status:>8}: {count}")
+    elif command == "dead-letters":
+        letters = outbox.dead_letters(int(sys.argv[2]) if len(sys.argv) > 2 else 50)
+        if not letters:
+            print("📭 No dead letters")
+        for letter in letters:
+            print(f"{letter['id']}  to={letter['to_phone']}  attempts={letter['attempts']}  failed_at={letter['failed_at']}")
+            print(f"    error: {letter['error']}")
+            print(f"    body:  {letter['body'][:80]!r}")
+    elif command == "requeue" and len(sys.argv) > 2:
+        if outbox.requeue_dead_letter(sys.argv[2]):
+            print(f"✅ Requeued {sys.argv[2]}")
+        else:
+            print(f"❌ No dead letter with id {sys.argv[2]}")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
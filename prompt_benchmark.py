@@ -0,0 +1,121 @@
+"""
+Prompt Benchmark - Size (and optionally latency) of the leave analysis prompt
+Renders leave_prompt for every roster employee with the original payload
+(the raw roster dict) and with prompt_payload's compact one, and reports
+characters and approximate tokens per request.
+
+With --live, each prompt is also sent to Gemini (needs GOOGLE_API_KEY) and
+the real input token counts and response latencies are compared.
+
+Usage:
+    python prompt_benchmark.py
+    python prompt_benchmark.py --live 5
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from integrated_hr_agent import LEAVE_PROMPT_TEMPLATE, LLM_MODEL
+from prompt_payload import build_prompt_inputs, employee_payload
+from roster_cache import load_roster
+from roster_index import RosterIndex
+
+LEAVES = [(1, "fever"), (2, "my sister's wedding"), (5, "family emergency in my hometown")]
+
+# Roughly one token per word piece or punctuation mark (Gemini's tokenizer is not available offline)
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    return len(_TOKEN.findall(text))
+
+
+def original_prompt_inputs(summary: Dict) -> Dict:
+    """leave_prompt inputs as built before prompt_payload: the roster dict as-is"""
+    substitutes = summary["substitutes"]
+    return {
+        "employee_data": summary["teacher_data"],
+        "employee_name": summary["teacher_name"],
+        "leave_days": summary["leave_days"],
+        "reason": summary["reason"],
+        "available_substitutes": "\n".join([f"- {s}" for s in substitutes]) if substitutes else "None available"
+    }
+
+
+def prompts(excel_file: str) -> List[Tuple[str, str]]:
+    """(original, compact) rendered prompt pairs for every employee and sample leave"""
+    index = RosterIndex(load_roster(excel_file))
+    pairs = []
+    for record in index.records:
+        for days, reason in LEAVES:
+            summary = {"teacher_data": dict(record), "teacher_name": record["name"], "leave_days": days,
+                       "reason": reason, "substitutes": index.substitute_candidates(record["name"])}
+            pairs.append((LEAVE_PROMPT_TEMPLATE.format(**original_prompt_inputs(summary)),
+                          LEAVE_PROMPT_TEMPLATE.format(**build_prompt_inputs(summary))))
+    return pairs
+
+
+def live(pairs: List[Tuple[str, str]], rounds: int) -> Dict[str, Dict[str, List[float]]]:
+    """Latency and provider-counted input tokens for each payload"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=0.3)
+    results = {"original": {"seconds": [], "tokens": []}, "compact": {"seconds": [], "tokens": []}}
+    for round_number in range(rounds):
+        for original, compact in pairs:
+            order = [("original", original), ("compact", compact)]
+            # Alternate which goes first so provider-side warmth favours neither
+            for name, prompt in (order if round_number % 2 == 0 else order[::-1]):
+                started = time.perf_counter()
+                message = llm.invoke(prompt)
+                results[name]["seconds"].append(time.perf_counter() - started)
+                usage = getattr(message, "usage_metadata", None) or {}
+                if usage.get("input_tokens"):
+                    results[name]["tokens"].append(usage["input_tokens"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--excel", default="employees.xlsx")
+    parser.add_argument("--live", type=int, default=0, metavar="ROUNDS", help="also call Gemini ROUNDS times per prompt")
+    args = parser.parse_args()
+
+    pairs = prompts(args.excel)
+    original = [(len(a), approx_tokens(a)) for a, _ in pairs]
+    compact = [(len(b), approx_tokens(b)) for _, b in pairs]
+    print(f"🧪 {len(pairs)} prompts (roster employees x sample leaves)\n")
+    print(f"{'per request':<22}{'original':>10}{'compact':>10}{'saved':>9}")
+    for column, label in ((0, "characters"), (1, "approx tokens")):
+        before = statistics.mean(row[column] for row in original)
+        after = statistics.mean(row[column] for row in compact)
+        print(f"  {label:<20}{before:>10.0f}{after:>10.0f}{1 - after / before:>9.1%}")
+
+    # The employee record section alone (the part prompt_payload rewrites)
+    index = RosterIndex(load_roster(args.excel))
+    before = statistics.mean(approx_tokens(str(dict(record))) for record in index.records)
+    after = statistics.mean(approx_tokens(employee_payload(record)) for record in index.records)
+    print(f"  {'employee_data tokens':<20}{before:>10.0f}{after:>10.0f}{1 - after / before:>9.1%}")
+
+    if not args.live:
+        print("\n(run with --live N to measure Gemini latency and token counts)")
+        return
+
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise SystemExit("❌ --live needs GOOGLE_API_KEY")
+    results = live(pairs, args.live)
+    print(f"\nGemini, {args.live} round(s):")
+    for name, measured in results.items():
+        tokens = f"{statistics.mean(measured['tokens']):.0f} input tokens" if measured["tokens"] else "no usage data"
+        print(f"  {name:<10} p50 {statistics.median(measured['seconds']) * 1000:7.0f} ms  "
+              f"mean {statistics.mean(measured['seconds']) * 1000:7.0f} ms  {tokens}")
+    saved = statistics.median(results["original"]["seconds"]) - statistics.median(results["compact"]["seconds"])
+    print(f"  median latency saved per request: {saved * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Prompt Payload - Compact, stable inputs for the leave analysis prompt
+The raw roster row carries every Excel column (ids, phone numbers, NaN
+cells) as a Python dict repr. The analysis only reads a handful of fields,
+so they are projected into short "Label: value" lines in a fixed order:
+fewer prompt tokens, and equal records always produce the same text
+(which keeps the LLM response cache effective).
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+# (label in the prompt, roster columns that may hold it - first non-empty wins)
+EMPLOYEE_FIELDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("Role", ("role",)),
+    ("Department", ("department",)),
+    ("Available leaves", ("available_leaves",)),
+    ("Task criticality", ("task_criticality", "role_criticality")),
+    ("Can be substituted", ("can_be_substituted",)),
+    ("Pending work", ("pending_tasks", "pending_work")),
+]
+
+
+def _value(value) -> Optional[str]:
+    """Prompt text for a cell, or None for empty/NaN"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            value = int(value)
+    text = " ".join(str(value).split())
+    return text or None
+
+
+def employee_payload(record: Dict) -> str:
+    """The fields the analysis uses, one "Label: value" line each"""
+    lines = []
+    for label, columns in EMPLOYEE_FIELDS:
+        value = next((text for text in (_value(record.get(column)) for column in columns) if text), None)
+        if value is not None:
+            lines.append(f"{label}: {value}")
+    return "\n".join(lines) or "No record details"
+
+
+def substitutes_payload(substitutes: List[str]) -> str:
+    return "\n".join(f"- {s}" for s in substitutes) if substitutes else "None available"
+
+
+def build_prompt_inputs(summary: Dict) -> Dict:
+    """leave_prompt inputs from a get_leave_summary result"""
+    return {
+        "employee_data": employee_payload(summary["teacher_data"]),
+        "employee_name": summary["teacher_name"],
+        "leave_days": summary["leave_days"],
+        "reason": summary["reason"],
+        "available_substitutes": substitutes_payload(summary["substitutes"])
+    }
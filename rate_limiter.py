@@ -0,0 +1,164 @@
+"""
+Rate Limiter - Token buckets that keep Twilio sends under per-sender throughput limits
+With a SQLite database (the outbox file) the buckets are shared, so the
+configured rate holds for the whole deployment however many gunicorn
+workers are sending.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlite_db import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    sender TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL     -- wall clock: compared across processes
+);
+"""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity` saved for bursts"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return seconds until the next one"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block until a token is available (False if the timeout runs out first)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        """Empty the bucket and hold it empty for `seconds` (e.g. after a 429)"""
+        with self._lock:
+            self._tokens = -seconds * self.rate
+            self._updated = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        """Current bucket state for metrics"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {"rate": self.rate, "capacity": self.capacity, "tokens": round(self._tokens, 2)}
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """TokenBucket whose state lives in a shared SQLite row, updated atomically by every process
+
+    Times are wall clock (time.time) because monotonic clocks are per process.
+    """
+
+    def __init__(self, db: SQLiteDatabase, sender: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.db = db
+        self.sender = sender
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO rate_buckets (sender, tokens, updated_at) VALUES (?, ?, ?)",
+                         (sender, capacity, time.time()))
+
+    def _refilled(self, conn, now: float) -> float:
+        row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE sender = ?", (self.sender,)).fetchone()
+        if row is None:
+            return self.capacity
+        return min(self.capacity, row["tokens"] + max(0.0, now - row["updated_at"]) * self.rate)
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return seconds until the next one"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            # Refill and take in one UPDATE under the write lock (BEGIN IMMEDIATE)
+            taken = conn.execute(
+                "UPDATE rate_buckets SET tokens = MIN(?, tokens + MAX(0, ? - updated_at) * ?) - 1, "
+                "updated_at = MAX(updated_at, ?) "
+                "WHERE sender = ? AND MIN(?, tokens + MAX(0, ? - updated_at) * ?) >= 1",
+                (self.capacity, now, self.rate, now, self.sender, self.capacity, now, self.rate)
+            ).rowcount
+            if taken:
+                return 0.0
+            tokens = self._refilled(conn, now)
+        return (1 - tokens) / self.rate
+
+    def penalize(self, seconds: float) -> None:
+        """Empty the bucket and hold it empty for `seconds` (e.g. after a 429), for every worker"""
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (sender, tokens, updated_at) VALUES (?, ?, ?)",
+                         (self.sender, -seconds * self.rate, time.time()))
+
+    def snapshot(self) -> Dict:
+        """Current bucket state for metrics"""
+        return {"rate": self.rate, "capacity": self.capacity,
+                "tokens": round(self._refilled(self.db.conn, time.time()), 2), "shared": True}
+
+
+def parse_sender_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse 'whatsapp:+1415...=1/5,whatsapp:+1202...=20' into {sender: (rate, burst)}"""
+    limits = {}
+    for entry in spec.split(','):
+        if '=' not in entry:
+            continue
+        sender, value = entry.rsplit('=', 1)
+        rate, _, burst = value.partition('/')
+        limits[sender.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class SenderRateLimiters:
+    """One token bucket per Twilio sender number (shared through `db` when given)"""
+
+    def __init__(self, db: Optional[SQLiteDatabase] = None):
+        self.db = db
+        if db is not None:
+            db.conn.executescript(SCHEMA)
+        self.default_rate = float(os.getenv('TWILIO_SEND_RATE', '1'))
+        self.default_burst = float(os.getenv('TWILIO_SEND_BURST', '5'))
+        self.overrides = parse_sender_limits(os.getenv('TWILIO_SEND_RATES', ''))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def for_sender(self, sender: str) -> TokenBucket:
+        """Bucket for a sender (created from config on first use)"""
+        with self._lock:
+            bucket = self._buckets.get(sender)
+            if bucket is None:
+                rate, burst = self.overrides.get(sender, (self.default_rate, self.default_burst))
+                bucket = (SQLiteTokenBucket(self.db, sender, rate, burst) if self.db is not None
+                          else TokenBucket(rate, burst))
+                self._buckets[sender] = bucket
+            return bucket
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """State of every sender bucket"""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {sender: bucket.snapshot() for sender, bucket in buckets.items()}
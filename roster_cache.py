@@ -0,0 +1,131 @@
+"""
+Roster Cache - Compiled binary copy of employees.xlsx
+Parsing xlsx through openpyxl is slow and was paid by every process start.
+The first load parses the workbook and pickles its rows (plain Python
+values) next to a small header (mtime, size, sha256); later loads read the
+pickle in milliseconds as long as the workbook is unchanged, without
+importing pandas at all.
+
+Precompile (e.g. at image build time) and compare timings:
+    python roster_cache.py [employees.xlsx]
+"""
+import hashlib
+import os
+import pickle
+import sys
+import time
+from typing import Dict, List, Optional
+
+CACHE_FORMAT = 2
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path_for(excel_file: str, cache_dir: Optional[str] = None) -> str:
+    cache_dir = cache_dir or os.getenv('ROSTER_CACHE_DIR', '.roster_cache')
+    return os.path.join(cache_dir, os.path.basename(excel_file) + '.pkl')
+
+
+def _read_header(cache_path: str) -> Optional[Dict]:
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _read_records(cache_path: str) -> List[Dict]:
+    with open(cache_path, 'rb') as f:
+        pickle.load(f)  # header
+        return pickle.load(f)
+
+
+def plain_value(value):
+    """numpy/pandas cell -> built-in Python value, so the cache unpickles without them"""
+    if hasattr(value, 'to_pydatetime'):
+        return value.to_pydatetime()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def parse_workbook(excel_file: str) -> List[Dict]:
+    """Rows of the workbook as dicts of plain values (the slow path)"""
+    import pandas as pd
+    df = pd.read_excel(excel_file)
+    return [{key: plain_value(value) for key, value in row.items()}
+            for row in df.to_dict(orient="records")]
+
+
+def _write(cache_path: str, header: Dict, records: List[Dict]) -> None:
+    """Header first so a staleness check never has to unpickle the rows"""
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Atomic: concurrent workers see the old cache or the new one
+    os.replace(tmp_path, cache_path)
+
+
+def load_roster(excel_file: str, cache_dir: Optional[str] = None) -> List[Dict]:
+    """Roster rows, from the compiled cache when it matches the workbook"""
+    cache_path = cache_path_for(excel_file, cache_dir)
+    stat = os.stat(excel_file)
+    header = _read_header(cache_path)
+    usable = header is not None and header.get('format') == CACHE_FORMAT
+
+    try:
+        if usable and header['mtime_ns'] == stat.st_mtime_ns and header['size'] == stat.st_size:
+            return _read_records(cache_path)
+
+        sha256 = file_sha256(excel_file)
+        if usable and header['sha256'] == sha256:
+            # Touched (checkout, copy) but unchanged: reuse and remember the new mtime
+            records = _read_records(cache_path)
+            _write(cache_path, {**header, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}, records)
+            return records
+    except Exception as e:
+        print(f"Roster cache unreadable ({e}); rebuilding from {excel_file}")
+        sha256 = file_sha256(excel_file)
+
+    records = parse_workbook(excel_file)
+    header = {
+        'format': CACHE_FORMAT,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': sha256
+    }
+    try:
+        _write(cache_path, header, records)
+    except OSError as e:
+        # Read-only filesystem etc.: still serve the parsed roster
+        print(f"Could not write roster cache {cache_path}: {e}")
+    return records
+
+
+def main():
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else 'employees.xlsx'
+
+    started = time.perf_counter()
+    parse_workbook(excel_file)
+    parse_ms = (time.perf_counter() - started) * 1000
+
+    load_roster(excel_file)  # make sure the cache is current
+    started = time.perf_counter()
+    records = load_roster(excel_file)
+    cached_ms = (time.perf_counter() - started) * 1000
+
+    print(f"📇 {excel_file}: {len(records)} employees -> {cache_path_for(excel_file)}")
+    print(f"   read_excel:   {parse_ms:8.1f} ms")
+    print(f"   roster cache: {cached_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Roster Index - Precomputed lookup tables over the employee roster
+Built once per roster load so webhook lookups don't scan the DataFrame,
+and patched row by row (copy-on-write) when employees.xlsx changes
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+# Minimum Dice similarity between trigram sets for a fuzzy name match
+FUZZY_NAME_THRESHOLD = 0.6
+
+
+def normalize_phone(phone) -> str:
+    """Normalize a phone number to its last 10 digits ('' if it is too short)"""
+    # Excel columns holding blanks come back as floats (918106778477.0)
+    if isinstance(phone, float):
+        if phone != phone:  # NaN
+            return ''
+        if phone.is_integer():
+            phone = int(phone)
+
+    digits = re.sub(r'[^\d]', '', str(phone))
+    return digits[-10:] if len(digits) >= 10 else ''
+
+
+def normalize_name(name) -> str:
+    """Case-fold a name and collapse whitespace ('' for missing names)"""
+    if not isinstance(name, str):
+        return ''
+    return ' '.join(name.casefold().split())
+
+
+def name_trigrams(key: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so short names still match"""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def row_identity(record: Dict, position: int) -> Hashable:
+    """Stable identity of a roster row across edits: employee_id, else its position"""
+    employee_id = record.get('employee_id')
+    if employee_id is None or (isinstance(employee_id, float) and employee_id != employee_id):
+        return ('row', position)
+    return employee_id
+
+
+def _row_signature(record: Dict) -> Tuple:
+    """Comparable form of a row (NaN == NaN)"""
+    return tuple(sorted((key, None if isinstance(value, float) and value != value else value)
+                        for key, value in record.items()))
+
+
+def _substitute_label(record: Dict) -> Tuple[str, str]:
+    """(lower-cased name, 'Name (Dept: X)') as shown in substitute suggestions"""
+    return str(record.get('name')).lower(), f"{record['name']} (Dept: {record.get('department', 'N/A')})"
+
+
+@dataclass
+class RosterDiff:
+    """Row-level difference between two roster versions"""
+    added: List[Dict] = field(default_factory=list)
+    removed: List[Dict] = field(default_factory=list)
+    changed: List[Tuple[Dict, Dict]] = field(default_factory=list)  # (old, new)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+
+class RosterIndex:
+    """Read-only indexes over roster records; never mutated once published
+
+    A roster change produces a new RosterIndex via updated(), which reuses
+    the work done for unchanged rows and only re-normalizes the rows that
+    differ. Readers holding the old index keep a consistent view.
+    """
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        
+        # Per-row derived data, parallel to records
+        self.row_ids: List[Hashable] = [row_identity(record, i) for i, record in enumerate(records)]
+        self.signatures: List[Tuple] = [_row_signature(record) for record in records]
+        self.phone_keys: List[str] = [normalize_phone(record.get('phone', '')) for record in records]
+        self.name_keys: List[str] = [normalize_name(record.get('name')) for record in records]
+        self.substitute_labels: List[Tuple[str, str]] = [_substitute_label(record) for record in records]
+
+        # Normalized last-10-digit phone -> employee record
+        # (first row wins, same as the old top-to-bottom scan)
+        self.by_phone: Dict[str, Dict] = {}
+        for key, record in zip(self.phone_keys, records):
+            if key and key not in self.by_phone:
+                self.by_phone[key] = record
+        
+        # Case-folded name -> employee record
+        self.by_name: Dict[str, Dict] = {}
+        for key, record in zip(self.name_keys, records):
+            if key and key not in self.by_name:
+                self.by_name[key] = record
+        
+        # Trigram -> name keys, for the fuzzy fallback
+        self.trigrams: Dict[str, Set[str]] = {}
+        self.trigram_counts: Dict[str, int] = {}
+        for key in self.by_name:
+            self._add_trigrams(key)
+        
+        self._finish()
+
+    def _finish(self) -> None:
+        """Cheap list-shaped views recomputed from the per-row data"""
+        # Display names in roster order
+        self.names: List[str] = [record['name'] for key, record in zip(self.name_keys, self.records) if key]
+
+    def _add_trigrams(self, key: str) -> None:
+        grams = name_trigrams(key)
+        self.trigram_counts[key] = len(grams)
+        for gram in grams:
+            self.trigrams.setdefault(gram, set()).add(key)
+
+    def updated(self, records: List[Dict]) -> Tuple['RosterIndex', RosterDiff]:
+        """New index for a new version of the roster, plus the row diff
+
+        Unchanged rows keep their record objects and derived keys; only
+        added/changed rows are normalized, and only the phone/name/trigram
+        entries they touch are rewritten (on copies of the old tables).
+        """
+        old_positions = {row_id: i for i, row_id in enumerate(self.row_ids)}
+        index = RosterIndex.__new__(RosterIndex)
+        index.records, index.row_ids, index.signatures = [], [], []
+        index.phone_keys, index.name_keys, index.substitute_labels = [], [], []
+        diff = RosterDiff()
+        touched_phones: Set[str] = set()
+        touched_names: Set[str] = set()
+        seen: Set[int] = set()
+        carried: List[int] = []
+
+        for position, record in enumerate(records):
+            row_id = row_identity(record, position)
+            signature = _row_signature(record)
+            old = old_positions.get(row_id)
+            if old is not None and old not in seen and self.signatures[old] == signature:
+                # Unchanged: carry everything over
+                seen.add(old)
+                carried.append(old)
+                index.records.append(self.records[old])
+                index.row_ids.append(row_id)
+                index.signatures.append(signature)
+                index.phone_keys.append(self.phone_keys[old])
+                index.name_keys.append(self.name_keys[old])
+                index.substitute_labels.append(self.substitute_labels[old])
+                continue
+
+            phone_key = normalize_phone(record.get('phone', ''))
+            name_key = normalize_name(record.get('name'))
+            if old is not None and old not in seen:
+                seen.add(old)
+                diff.changed.append((self.records[old], record))
+                touched_phones.add(self.phone_keys[old])
+                touched_names.add(self.name_keys[old])
+            else:
+                diff.added.append(record)
+            touched_phones.add(phone_key)
+            touched_names.add(name_key)
+
+            index.records.append(record)
+            index.row_ids.append(row_id)
+            index.signatures.append(signature)
+            index.phone_keys.append(phone_key)
+            index.name_keys.append(name_key)
+            index.substitute_labels.append(_substitute_label(record))
+
+        for old, record in enumerate(self.records):
+            if old not in seen:
+                diff.removed.append(record)
+                touched_phones.add(self.phone_keys[old])
+                touched_names.add(self.name_keys[old])
+
+        if carried != sorted(carried):
+            # Rows were re-sorted: "first row wins" may pick differently for any key
+            touched_phones.update(index.phone_keys)
+            touched_names.update(index.name_keys)
+        elif diff.empty:
+            # Nothing moved or changed: keep the published tables
+            index.by_phone, index.by_name = self.by_phone, self.by_name
+            index.trigrams, index.trigram_counts = self.trigrams, self.trigram_counts
+            index.names = self.names
+            return index, diff
+
+        touched_phones.discard('')
+        touched_names.discard('')
+
+        # Re-resolve "first row wins" only for the keys the diff touched
+        index.by_phone = dict(self.by_phone)
+        _resolve(index.by_phone, touched_phones, index.phone_keys, index.records)
+        index.by_name = dict(self.by_name)
+        _resolve(index.by_name, touched_names, index.name_keys, index.records)
+
+        # Trigram postings: copy-on-write for the grams of names that came or went
+        index.trigrams = dict(self.trigrams)
+        index.trigram_counts = dict(self.trigram_counts)
+        for key in touched_names:
+            if key in self.by_name and key not in index.by_name:
+                for gram in name_trigrams(key):
+                    postings = index.trigrams[gram] = set(index.trigrams[gram])
+                    postings.discard(key)
+                    if not postings:
+                        del index.trigrams[gram]
+                del index.trigram_counts[key]
+            elif key in index.by_name and key not in self.by_name:
+                for gram in name_trigrams(key):
+                    index.trigrams[gram] = set(index.trigrams.get(gram, ())) | {key}
+                index.trigram_counts[key] = len(name_trigrams(key))
+
+        index._finish()
+        return index, diff
+
+    def find_by_phone(self, phone: str) -> Optional[Dict]:
+        """Find employee record by phone number (matches on last 10 digits)"""
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        return self.by_phone.get(key)
+
+    def find_by_name(self, name: str, fuzzy: bool = False) -> Optional[Dict]:
+        """Find employee record by name: exact case-folded match, then optional trigram fallback"""
+        key = normalize_name(name)
+        if not key:
+            return None
+        
+        record = self.by_name.get(key)
+        if record is not None or not fuzzy:
+            return record
+        
+        match = self.closest_name(key)
+        return self.by_name[match] if match else None
+    
+    def closest_name(self, key: str) -> Optional[str]:
+        """Best trigram (Dice coefficient) match for a normalized name, if close enough"""
+        grams = name_trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] += 1
+        
+        best_key, best_score = None, 0.0
+        for candidate, common in shared.items():
+            score = 2.0 * common / (len(grams) + self.trigram_counts[candidate])
+            if score > best_score:
+                best_key, best_score = candidate, score
+        
+        return best_key if best_score >= FUZZY_NAME_THRESHOLD else None
+    
+    def employee_names(self, exclude: Optional[str] = None) -> List[str]:
+        """Display names in roster order, optionally excluding one employee"""
+        excluded = normalize_name(exclude)
+        return [name for name in self.names if normalize_name(name) != excluded]
+
+    def substitute_candidates(self, requesting_name: str, limit: int = 3) -> List[str]:
+        """First `limit` colleagues in roster order, labelled with their department"""
+        excluded = requesting_name.lower()
+        candidates = []
+        for name, label in self.substitute_labels:
+            if name != excluded:
+                candidates.append(label)
+                if len(candidates) == limit:
+                    break
+        return candidates
+
+
+def _resolve(table: Dict[str, Dict], keys: Set[str], row_keys: List[str], records: List[Dict]) -> None:
+    """Point each key in `keys` at its first row (or drop it if no row has it any more)"""
+    winners: Dict[str, Dict] = {}
+    for key, record in zip(row_keys, records):
+        if key in keys and key not in winners:
+            winners[key] = record
+    for key in keys:
+        if key in winners:
+            table[key] = winners[key]
+        else:
+            table.pop(key, None)
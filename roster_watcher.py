@@ -0,0 +1,82 @@
+"""
+Roster Watcher - Hot reload of employees.xlsx
+Polls the workbook's mtime/size and, once a change has settled, calls the
+reload callback (IntegratedHRAgent.reload_roster), which diffs the rows and
+swaps in an incrementally updated index. No process restart needed.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+
+class RosterWatcher:
+    """Background poller that reloads the roster when its file changes"""
+
+    def __init__(self, path: str, on_change: Callable[[], object], interval: Optional[float] = None):
+        self.path = path
+        self.on_change = on_change
+        # 0 disables watching
+        self.interval = interval if interval is not None else float(os.getenv('ROSTER_WATCH_SECONDS', '5'))
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload: Optional[str] = None
+        self.last_diff: Optional[str] = None
+        self._seen = self._signature()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def start(self) -> 'RosterWatcher':
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="roster-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            current = self._signature()
+            if current is None or current == self._seen:
+                continue
+
+            # Editors and to_excel write in several steps: wait until the file stops changing
+            time.sleep(min(self.interval, 1.0))
+            if self._signature() != current:
+                continue
+            self.check_now(current)
+
+    def check_now(self, signature: Optional[Tuple[int, int]] = None) -> None:
+        """Reload immediately (also used by the poll loop)"""
+        signature = signature or self._signature()
+        try:
+            diff = self.on_change()
+        except Exception as e:
+            # Keep serving the previous roster; retry on the next change
+            self.failures += 1
+            print(f"Roster reload from {self.path} failed: {e}")
+        else:
+            self.reloads += 1
+            self.last_reload = datetime.now().isoformat()
+            self.last_diff = str(diff) if diff is not None else None
+            print(f"Roster reloaded from {self.path}: {self.last_diff}")
+        self._seen = signature
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "interval_seconds": self.interval,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload": self.last_reload,
+            "last_diff": self.last_diff
+        }
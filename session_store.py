@@ -0,0 +1,209 @@
+"""
+Session Store - Conversation state for the WhatsApp handlers
+Sessions are loaded at the start of a turn and saved at the end, so with the
+SQLite backend any gunicorn worker can serve any turn of a conversation.
+
+Both backends are bounded: a session expires after SESSION_IDLE_TTL_SECONDS
+without a turn, and beyond SESSION_MAX_COUNT the least recently used
+sessions are evicted. Sessions hold the employee's phone key, not the
+roster record.
+"""
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlite_db import SQLiteDatabase
+from ttl_cache import TTLCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    kind TEXT NOT NULL,          -- 'user' or 'manager'
+    session_key TEXT NOT NULL,   -- phone number
+    data TEXT NOT NULL,          -- session dict as JSON
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, session_key)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (kind, updated_at);
+"""
+
+
+def _json_default(value):
+    """Encode numpy scalars coming from the pandas roster"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _encode(session: Dict) -> str:
+    return json.dumps(session, default=_json_default)
+
+
+def _limits(maxsize: Optional[int], ttl: Optional[float]):
+    return (maxsize or int(os.getenv('SESSION_MAX_COUNT', '10000')),
+            ttl or float(os.getenv('SESSION_IDLE_TTL_SECONDS', '3600')))
+
+
+class MemorySessionStore:
+    """Process-local sessions (single worker) in a TTL/LRU cache"""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        maxsize, ttl = _limits(maxsize, ttl)
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._last_purge = time.monotonic()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.cache
+
+    def __getitem__(self, key: str) -> Dict:
+        session = self.cache.get(key)
+        if session is None:
+            raise KeyError(key)
+        return session
+
+    def __setitem__(self, key: str, session: Dict) -> None:
+        # Expired sessions are otherwise only dropped when looked up again
+        if time.monotonic() - self._last_purge > 60:
+            self.cache.purge_expired()
+            self._last_purge = time.monotonic()
+        self.cache.set(key, session)
+
+    def __delitem__(self, key: str) -> None:
+        if self.cache.pop(key) is None:
+            raise KeyError(key)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def get(self, key: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        return self.cache.get(key, default)
+
+    def save(self, key: str, session: Dict) -> None:
+        """End of a turn: restart the idle timer (no-op if the turn deleted the session)"""
+        self.cache.replace(key, session)
+
+    def stats(self) -> Dict:
+        """Occupancy, evictions and approximate memory held by sessions"""
+        self.cache.purge_expired()
+        sessions = [session for _, session in self.cache.items()]
+        return {
+            **self.cache.stats(),
+            "approx_bytes": sum(len(_encode(session)) for session in sessions),
+            "by_state": dict(Counter(session.get('state', 'unknown') for session in sessions))
+        }
+
+
+class SQLiteSessionStore:
+    """Sessions in the shared SQLite database (any number of workers)
+
+    Reads return a fresh dict; call save() once the turn has changed it.
+    save() only updates sessions that still exist, so a turn that ended
+    the conversation (del store[key]) is not resurrected.
+    """
+
+    def __init__(self, kind: str, path: Optional[str] = None,
+                 maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        self.kind = kind
+        self.maxsize, self.ttl = _limits(maxsize, ttl)
+        self.db = SQLiteDatabase(path or os.getenv('HR_DB_PATH', 'hr.db'), SCHEMA)
+        self.expirations = 0
+        self.evictions = 0
+        self._last_purge = 0.0
+
+    def _load(self, key: str) -> Optional[Dict]:
+        row = self.db.conn.execute(
+            "SELECT data FROM sessions WHERE kind = ? AND session_key = ? AND updated_at > ?",
+            (self.kind, key, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def __contains__(self, key: str) -> bool:
+        return self._load(key) is not None
+
+    def __getitem__(self, key: str) -> Dict:
+        session = self._load(key)
+        if session is None:
+            raise KeyError(key)
+        return session
+
+    def __setitem__(self, key: str, session: Dict) -> None:
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (kind, session_key, data, updated_at) VALUES (?, ?, ?, ?)",
+                (self.kind, key, _encode(session), now)
+            )
+            if now - self._last_purge > 60:
+                self.expirations += conn.execute(
+                    "DELETE FROM sessions WHERE kind = ? AND updated_at <= ?", (self.kind, now - self.ttl)
+                ).rowcount
+                self._last_purge = now
+
+            # Least recently used (oldest turn) go first
+            excess = conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE kind = ?", (self.kind,)
+            ).fetchone()[0] - self.maxsize
+            if excess > 0:
+                self.evictions += conn.execute(
+                    "DELETE FROM sessions WHERE kind = ? AND session_key IN "
+                    "(SELECT session_key FROM sessions WHERE kind = ? ORDER BY updated_at LIMIT ?)",
+                    (self.kind, self.kind, excess)
+                ).rowcount
+
+    def __delitem__(self, key: str) -> None:
+        with self.db.transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE kind = ? AND session_key = ?", (self.kind, key)
+            ).rowcount
+        if not deleted:
+            raise KeyError(key)
+
+    def __len__(self) -> int:
+        return self.db.conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE kind = ? AND updated_at > ?", (self.kind, time.time() - self.ttl)
+        ).fetchone()[0]
+
+    def get(self, key: str, default: Optional[Dict] = None) -> Optional[Dict]:
+        session = self._load(key)
+        return default if session is None else session
+
+    def save(self, key: str, session: Dict) -> None:
+        """Write back a session changed during this turn (no-op if it was deleted or expired meanwhile)"""
+        now = time.time()
+        with self.db.transaction() as conn:
+            conn.execute(
+                "UPDATE sessions SET data = ?, updated_at = ? WHERE kind = ? AND session_key = ? AND updated_at > ?",
+                (_encode(session), now, self.kind, key, now - self.ttl)
+            )
+
+    def stats(self) -> Dict:
+        """Occupancy, evictions and bytes held by live sessions"""
+        conn = self.db.conn
+        cutoff = time.time() - self.ttl
+        size, approx_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE kind = ? AND updated_at > ?",
+            (self.kind, cutoff)
+        ).fetchone()
+        by_state = conn.execute(
+            "SELECT json_extract(data, '$.state') AS state, COUNT(*) AS n FROM sessions "
+            "WHERE kind = ? AND updated_at > ? GROUP BY state",
+            (self.kind, cutoff)
+        ).fetchall()
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "approx_bytes": approx_bytes,
+            "by_state": {row["state"] or "unknown": row["n"] for row in by_state}
+        }
+
+
+def create_session_store(kind: str, backend: Optional[str] = None):
+    """Session store for HR_STORAGE_BACKEND: process-local for 'memory', shared for 'sqlite'"""
+    backend = (backend or os.getenv('HR_STORAGE_BACKEND', 'memory')).lower()
+    if backend == 'sqlite':
+        return SQLiteSessionStore(kind)
+    return MemorySessionStore()
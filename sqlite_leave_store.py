@@ -0,0 +1,257 @@
+"""
+SQLite Leave Store - Leaves, substitutions and the roster in a shared SQLite file
+Same interface as the in-memory LeaveStore, but every gunicorn worker sees the
+same state, and status/teacher/department queries are indexed SQL.
+"""
+import json
+import os
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+
+from leave_store import Leave, Substitution
+from roster_index import normalize_name, normalize_phone
+from sqlite_db import SQLiteDatabase
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leaves (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    teacher_id INTEGER,
+    teacher_name TEXT NOT NULL,
+    teacher_key TEXT NOT NULL,              -- normalize_name(teacher_name)
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    suggested_substitute TEXT,
+    substitute_note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_leaves_status ON leaves (status, id);
+CREATE INDEX IF NOT EXISTS idx_leaves_teacher ON leaves (teacher_key, id);
+
+CREATE TABLE IF NOT EXISTS substitutions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    leave_id INTEGER NOT NULL REFERENCES leaves (id),
+    substitute_name TEXT NOT NULL,
+    substitute_key TEXT NOT NULL,           -- normalize_name(substitute_name)
+    status TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS idx_subs_leave ON substitutions (leave_id, substitute_key, id);
+
+CREATE TABLE IF NOT EXISTS employees (
+    row_number INTEGER PRIMARY KEY,         -- position in employees.xlsx
+    employee_id TEXT,
+    name TEXT,
+    name_key TEXT NOT NULL,
+    department TEXT COLLATE NOCASE,
+    role TEXT,
+    phone_key TEXT,
+    record TEXT NOT NULL                    -- full roster row as JSON
+);
+CREATE INDEX IF NOT EXISTS idx_employees_name ON employees (name_key);
+CREATE INDEX IF NOT EXISTS idx_employees_department ON employees (department, name_key);
+CREATE INDEX IF NOT EXISTS idx_employees_phone ON employees (phone_key);
+"""
+
+LEAVE_COLUMNS = ("id", "teacher_id", "teacher_name", "start_date", "end_date", "days", "reason",
+                 "status", "suggested_substitute", "substitute_note")
+
+
+def _plain(value):
+    """JSON-friendly copy of a pandas cell (numpy scalars -> Python, NaN -> None)"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _text(value) -> Optional[str]:
+    """Stripped text of a cell (numeric cells included), None when empty"""
+    return None if value is None else str(value).strip() or None
+
+
+def _leave_from_row(row) -> Leave:
+    fields = {column: row[column] for column in LEAVE_COLUMNS}
+    fields["start_date"] = date.fromisoformat(fields["start_date"])
+    fields["end_date"] = date.fromisoformat(fields["end_date"])
+    return Leave(**fields)
+
+
+def _substitution_from_row(row) -> Substitution:
+    return Substitution(id=row["id"], leave_id=row["leave_id"],
+                        substitute_name=row["substitute_name"], status=row["status"])
+
+
+def _status_filter(statuses) -> str:
+    return f" AND status IN ({', '.join('?' for _ in statuses)})" if statuses else ""
+
+
+class SQLiteLeaveStore:
+    """LeaveStore backed by SQLite (WAL, one connection per thread)
+
+    Records handed out are detached copies; change them through
+    set_leave_status / set_substitution_status like with the memory store.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.db = SQLiteDatabase(path or os.getenv('HR_DB_PATH', 'hr.db'), SCHEMA)
+        self.journal = None
+        # Serializes this process's writers; other processes wait on SQLite's lock
+        self._lock = threading.Lock()
+
+    def _next_id(self, table: str) -> int:
+        row = self.db.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        return (row["seq"] if row else 0) + 1
+
+    @property
+    def leave_counter(self) -> int:
+        return self._next_id("leaves")
+
+    @property
+    def sub_counter(self) -> int:
+        return self._next_id("substitutions")
+
+    # ---------- leaves ----------
+
+    def add_leave(self, teacher_id: int, teacher_name: str, start_date: date, end_date: date,
+                  days: int, reason: str, suggested_substitute: Optional[str] = None,
+                  substitute_note: Optional[str] = None) -> Leave:
+        """Create a pending leave with the next id"""
+        with self._lock, self.db.transaction() as conn:
+            leave_id = conn.execute(
+                "INSERT INTO leaves (teacher_id, teacher_name, teacher_key, start_date, end_date, days, reason, "
+                "status, suggested_substitute, substitute_note) VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (_plain(teacher_id), teacher_name, normalize_name(teacher_name), start_date.isoformat(),
+                 end_date.isoformat(), days, reason, suggested_substitute, substitute_note)
+            ).lastrowid
+        return Leave(id=leave_id, teacher_id=teacher_id, teacher_name=teacher_name, start_date=start_date,
+                     end_date=end_date, days=days, reason=reason, status="pending",
+                     suggested_substitute=suggested_substitute, substitute_note=substitute_note)
+
+    def get_leave(self, leave_id: int) -> Optional[Leave]:
+        """Leave by id"""
+        row = self.db.conn.execute("SELECT * FROM leaves WHERE id = ?", (leave_id,)).fetchone()
+        return _leave_from_row(row) if row else None
+
+    def set_leave_status(self, leave: Leave, status: str) -> None:
+        """Change a leave's status"""
+        with self._lock, self.db.transaction() as conn:
+            conn.execute("UPDATE leaves SET status = ? WHERE id = ?", (status, leave.id))
+        leave.status = status
+
+    def list_leaves(self, *statuses: str) -> List[Leave]:
+        """Leaves in id order, optionally only those with one of the given statuses"""
+        rows = self.db.conn.execute(
+            "SELECT * FROM leaves WHERE 1 = 1" + _status_filter(statuses) + " ORDER BY id", statuses
+        ).fetchall()
+        return [_leave_from_row(row) for row in rows]
+
+    def leaves_for_teacher(self, teacher_name: str) -> List[Leave]:
+        """All leaves requested by a teacher, in id order"""
+        rows = self.db.conn.execute(
+            "SELECT * FROM leaves WHERE teacher_key = ? ORDER BY id", (normalize_name(teacher_name),)
+        ).fetchall()
+        return [_leave_from_row(row) for row in rows]
+
+    def leaves_for_department(self, department: str, *statuses: str) -> List[Leave]:
+        """Leaves of everyone in a department (case-insensitive), optionally by status"""
+        rows = self.db.conn.execute(
+            "SELECT * FROM leaves WHERE teacher_key IN "
+            "(SELECT name_key FROM employees WHERE department = ?)"
+            + _status_filter(statuses) + " ORDER BY id",
+            (department.strip(), *statuses)
+        ).fetchall()
+        return [_leave_from_row(row) for row in rows]
+
+    def count_leaves(self, status: Optional[str] = None) -> int:
+        """Number of leaves, overall or with one status"""
+        if status is None:
+            return self.db.conn.execute("SELECT COUNT(*) FROM leaves").fetchone()[0]
+        return self.db.conn.execute("SELECT COUNT(*) FROM leaves WHERE status = ?", (status,)).fetchone()[0]
+
+    def statuses(self) -> List[str]:
+        """Statuses that currently have at least one leave"""
+        return [row["status"] for row in self.db.conn.execute("SELECT DISTINCT status FROM leaves")]
+
+    # ---------- substitutions ----------
+
+    def add_substitution(self, leave_id: int, substitute_name: str) -> Substitution:
+        """Create a pending substitution with the next id"""
+        with self._lock, self.db.transaction() as conn:
+            sub_id = conn.execute(
+                "INSERT INTO substitutions (leave_id, substitute_name, substitute_key, status) "
+                "VALUES (?, ?, ?, 'pending')",
+                (leave_id, substitute_name, normalize_name(substitute_name))
+            ).lastrowid
+        return Substitution(id=sub_id, leave_id=leave_id, substitute_name=substitute_name, status="pending")
+
+    def get_substitution(self, substitution_id: int) -> Optional[Substitution]:
+        """Substitution by id"""
+        row = self.db.conn.execute("SELECT * FROM substitutions WHERE id = ?", (substitution_id,)).fetchone()
+        return _substitution_from_row(row) if row else None
+
+    def find_substitution(self, leave_id: int, substitute_name: str) -> Optional[Substitution]:
+        """Substitution for a leave by substitute name (case-insensitive, first assignment wins)"""
+        row = self.db.conn.execute(
+            "SELECT * FROM substitutions WHERE leave_id = ? AND substitute_key = ? ORDER BY id LIMIT 1",
+            (leave_id, normalize_name(substitute_name))
+        ).fetchone()
+        return _substitution_from_row(row) if row else None
+
+    def substitutions_for_leave(self, leave_id: int, status: Optional[str] = None) -> List[Substitution]:
+        """Substitutions of a leave in id order, optionally filtered by status"""
+        statuses = (status,) if status is not None else ()
+        rows = self.db.conn.execute(
+            "SELECT * FROM substitutions WHERE leave_id = ?" + _status_filter(statuses) + " ORDER BY id",
+            (leave_id, *statuses)
+        ).fetchall()
+        return [_substitution_from_row(row) for row in rows]
+
+    def set_substitution_status(self, sub: Substitution, status: str) -> None:
+        """Change a substitution's status"""
+        with self._lock, self.db.transaction() as conn:
+            conn.execute("UPDATE substitutions SET status = ? WHERE id = ?", (status, sub.id))
+        sub.status = status
+
+    def list_substitutions(self) -> List[Substitution]:
+        """All substitutions in id order"""
+        rows = self.db.conn.execute("SELECT * FROM substitutions ORDER BY id").fetchall()
+        return [_substitution_from_row(row) for row in rows]
+
+    # ---------- roster ----------
+
+    def sync_roster(self, records: List[Dict]) -> None:
+        """Replace the employees table with the current roster rows"""
+        rows = []
+        for number, record in enumerate(records):
+            plain = {key: _plain(value) for key, value in record.items()}
+            rows.append((
+                number,
+                None if plain.get('employee_id') is None else str(plain['employee_id']),
+                plain.get('name'),
+                normalize_name(plain.get('name')),
+                _text(plain.get('department')),
+                plain.get('role'),
+                normalize_phone(record.get('phone', '')) or None,
+                json.dumps(plain, default=str)
+            ))
+        with self._lock, self.db.transaction() as conn:
+            conn.execute("DELETE FROM employees")
+            conn.executemany(
+                "INSERT INTO employees (row_number, employee_id, name, name_key, department, role, phone_key, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    # ---------- durability (SQLite already is the durable copy) ----------
+
+    def recover(self) -> int:
+        return 0
+
+    def snapshot(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
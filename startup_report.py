@@ -0,0 +1,104 @@
+"""
+Startup Report - Where cold-start time goes
+Runs a fresh interpreter with `python -X importtime`, then times building
+the handler and warming the AI chain, and prints:
+  * startup phases (import, handler construction, AI warm-up)
+  * import time grouped by top-level package
+  * the slowest individual modules (cumulative)
+
+Usage:
+    python startup_report.py                 # unified_whatsapp_handler
+    python startup_report.py --top 30
+    python startup_report.py --module manager_whatsapp_handler
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+PHASES_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+module = __import__({module!r})
+imported = time.perf_counter()
+handler = getattr(module, {factory!r})() if {factory!r} else None
+constructed = time.perf_counter()
+if handler is not None and hasattr(handler, 'hr_agent'):
+    handler.hr_agent.warm_up()
+warmed = time.perf_counter()
+print("PHASES " + json.dumps({{
+    "import": imported - started,
+    "construct": constructed - imported,
+    "warm_up": warmed - constructed
+}}))
+"""
+
+FACTORIES = {
+    "unified_whatsapp_handler": "get_unified_handler",
+    "manager_whatsapp_handler": "ManagerWhatsAppHandler",
+}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def run(module: str) -> Tuple[Dict, List[Tuple[str, int, int, int]]]:
+    env = {**os.environ, "AI_WARMUP": "false", "ROSTER_WATCH_SECONDS": "0",
+           "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "startup-report")}
+    script = PHASES_SCRIPT.format(module=module, factory=FACTORIES.get(module, ""))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                            env=env, capture_output=True, text=True)
+    phases = {}
+    for line in result.stdout.splitlines():
+        if line.startswith("PHASES "):
+            phases = json.loads(line[len("PHASES "):])
+    if not phases:
+        print(result.stdout[-2000:])
+        print(result.stderr[-2000:])
+        raise SystemExit(f"❌ Could not start {module}")
+    return phases, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="unified_whatsapp_handler")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    phases, rows = run(args.module)
+
+    print(f"🚀 Startup of {args.module}\n")
+    print("Phases:")
+    for phase, seconds in phases.items():
+        print(f"  {phase:<10} {seconds * 1000:9.1f} ms")
+    print(f"  {'total':<10} {sum(phases.values()) * 1000:9.1f} ms")
+    print("  (import + construct happen before the first webhook is answered; warm_up runs in the background)")
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    total_us = sum(by_package.values()) or 1
+    print(f"\nImport time by top-level package (self time, {total_us / 1000:.0f} ms total):")
+    for package, micros in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<32} {micros / 1000:9.1f} ms  {micros / total_us:6.1%}")
+
+    print(f"\nSlowest modules (cumulative, including what they import):")
+    for name, _, cumulative_us, depth in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"  {name:<48} {cumulative_us / 1000:9.1f} ms  (depth {depth})")
+
+
+if __name__ == "__main__":
+    main()
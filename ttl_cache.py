@@ -0,0 +1,122 @@
+"""
+TTL Cache - Bounded, thread-safe mapping with per-entry expiry and LRU eviction
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TTLCache:
+    """Entries expire `ttl` seconds after they were last written; beyond `maxsize` the least recently used go first"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[Any]:
+        """Return a live entry and mark it recently used (caller holds the lock)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: Hashable, value: Any, now: float) -> None:
+        """Insert or refresh an entry, evicting LRU entries past maxsize (caller holds the lock)"""
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Value for key, or default if missing/expired"""
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value and restart its TTL"""
+        with self._lock:
+            self._store(key, value, time.monotonic())
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Atomically fetch a live value or store factory(); returns (value, created)"""
+        with self._lock:
+            now = time.monotonic()
+            value = self._lookup(key, now)
+            if value is not None:
+                self.hits += 1
+                return value, False
+            self.misses += 1
+            value = factory()
+            self._store(key, value, now)
+            return value, True
+
+    def replace(self, key: Hashable, value: Any) -> bool:
+        """Overwrite a live entry and restart its TTL; False (and nothing stored) if it is gone"""
+        with self._lock:
+            now = time.monotonic()
+            if self._lookup(key, now) is None:
+                return False
+            self._store(key, value, now)
+            return True
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Snapshot of live (key, value) pairs, least recently used first"""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove and return a value"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry is not None else default
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed"""
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in expired:
+                del self._data[key]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._lookup(key, time.monotonic()) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict:
+        """Size and hit/eviction counters"""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions
+            }
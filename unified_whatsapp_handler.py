@@ -2,38 +2,86 @@
 Unified WhatsApp Handler - Handles both employee and manager messages
 Routes internally based on phone number authorization
 """
+import functools
+import heapq
+import hmac
+import itertools
 import os
 import re
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 from flask import Flask, request, Response
 from twilio.twiml.messaging_response import MessagingResponse
-from twilio.rest import Client as TwilioClient
 from dotenv import load_dotenv
 
+import message_classifier
+from message_classifier import MessageClassification
 from integrated_hr_agent import IntegratedHRAgent
+from outbound_queue import OutboundQueue, PRIORITY_BULK, PRIORITY_INTERACTIVE, create_twilio_client
+from roster_index import normalize_phone
+from session_store import create_session_store
+from webhook_dedupe import create_webhook_deduplicator
 
 load_dotenv()
 
+# Seconds to wait for the AI analysis before notifying the manager without it
+AI_ANALYSIS_TIMEOUT = float(os.getenv('AI_ANALYSIS_TIMEOUT', '20'))
+
+EMPLOYEE_NOT_FOUND_MESSAGE = ("❌ Sorry, I couldn't find your employee record."
+                              " Please contact HR directly or ensure you're messaging from your registered phone number.")
+
+
+class SessionEmployeeNotFound(LookupError):
+    """A session's phone no longer matches anyone on the (reloaded) roster"""
+
 app = Flask(__name__)
 
+# Bearer token for the operator endpoints (/metrics, /outbound/<id>); unset = they are disabled
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+
+
+def require_admin_token(view):
+    """Serve an operator endpoint only to requests carrying 'Authorization: Bearer <ADMIN_API_TOKEN>'"""
+    @functools.wraps(view)
+    def guarded(*args, **kwargs):
+        if not ADMIN_API_TOKEN:
+            return {"status": "error", "message": "Not found"}, 404
+        expected = f"Bearer {ADMIN_API_TOKEN}".encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return {"status": "error", "message": "Unauthorized"}, 401
+        return view(*args, **kwargs)
+    return guarded
+
 # Global instance to maintain session state across requests
 unified_handler_instance = None
+_unified_handler_lock = threading.Lock()
 
 class UnifiedWhatsAppHandler:
     def __init__(self):
         self.hr_agent = IntegratedHRAgent()
-        self.twilio_client = TwilioClient(
-            os.getenv('TWILIO_ACCOUNT_SID'),
-            os.getenv('TWILIO_AUTH_TOKEN')
-        )
+        self.twilio_client = create_twilio_client()
         self.twilio_from = os.getenv('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
         
-        # Session storage for conversation state
+        # Notifications are queued and sent by background workers
+        self.outbound = OutboundQueue(self.twilio_client, self.twilio_from)
+        
+        # Replays responses for Twilio webhook retries (keyed on MessageSid)
+        self.dedupe = create_webhook_deduplicator()
+        
+        # Pending AI-analysis timeouts: (deadline, sequence, callback) heap served by one thread
+        self._deadlines = []
+        self._deadline_seq = itertools.count()
+        self._deadlines_ready = threading.Condition()
+        threading.Thread(target=self._deadline_loop, name="analysis-deadlines", daemon=True).start()
+        
+        # Session storage for conversation state (shared by all workers with HR_STORAGE_BACKEND=sqlite)
         if not hasattr(UnifiedWhatsAppHandler, '_user_sessions'):
-            UnifiedWhatsAppHandler._user_sessions = {}
+            UnifiedWhatsAppHandler._user_sessions = create_session_store('user')
         if not hasattr(UnifiedWhatsAppHandler, '_manager_sessions'):
-            UnifiedWhatsAppHandler._manager_sessions = {}
+            UnifiedWhatsAppHandler._manager_sessions = create_session_store('manager')
     
     @property
     def user_sessions(self):
@@ -64,113 +112,142 @@ class UnifiedWhatsAppHandler:
         print(f"DEBUG: Cleaned phone: {clean_phone}")
         print(f"DEBUG: Last 10 digits: {clean_phone[-10:]}")
         
-        # Search in Excel database
-        for _, employee in self.hr_agent.df.iterrows():
-            emp_phone = str(employee.get('phone', ''))
-            clean_emp_phone = re.sub(r'[^\d]', '', emp_phone)
-            
-            # Match last 10 digits (handles country codes)
-            if len(clean_phone) >= 10 and len(clean_emp_phone) >= 10:
-                if clean_phone[-10:] == clean_emp_phone[-10:]:
-                    print(f"DEBUG: Found employee: {employee.get('name')} with phone {emp_phone}")
-                    return employee.to_dict()
+        # O(1) lookup in the roster phone index (matches last 10 digits)
+        employee = self.hr_agent.find_teacher_by_phone(phone)
+        if employee:
+            print(f"DEBUG: Found employee: {employee.get('name')} with phone {employee.get('phone')}")
+            return employee
         
         print(f"DEBUG: No employee found for phone {phone}")
         return None
     
-    def send_whatsapp_message(self, to_phone: str, message: str) -> bool:
-        """Send WhatsApp message via Twilio"""
-        try:
-            if not to_phone.startswith('whatsapp:'):
-                to_phone = f'whatsapp:{to_phone}'
-            
-            self.twilio_client.messages.create(
-                from_=self.twilio_from,
-                to=to_phone,
-                body=message
-            )
+    def session_employee(self, session: Dict) -> Dict:
+        """Roster record of the employee a session belongs to (sessions keep only the phone key)
+        
+        Raises SessionEmployeeNotFound if a roster reload removed them mid-conversation.
+        """
+        employee = self.hr_agent.find_teacher_by_phone(session['employee_key'])
+        if employee is None:
+            raise SessionEmployeeNotFound(session['employee_key'])
+        return employee
+    
+    def send_whatsapp_message(self, to_phone: str, message: str, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        """Queue a WhatsApp message for delivery via Twilio (True if queued)
+        
+        Messages asking someone to act are interactive; status updates use PRIORITY_BULK
+        so they yield to interactive ones when the sender is rate limited.
+        """
+        if not to_phone.startswith('whatsapp:'):
+            to_phone = f'whatsapp:{to_phone}'
+        
+        return self.outbound.enqueue(to_phone, message, priority) is not None
+    
+    def notify_manager_after_analysis(self, leave_id: int, build_message: Callable[[Optional[str]], str]) -> None:
+        """Notify the manager once the background AI analysis is ready, or without it after a timeout
+        
+        An analysis that finishes after the timeout is sent on as a follow-up at PRIORITY_BULK.
+        """
+        manager_phone = os.getenv('MANAGER_PHONE')
+        if not manager_phone:
+            return
+        
+        future = self.hr_agent.prefetch_ai_analysis(leave_id)
+        lock = threading.Lock()
+        delivered = []
+        
+        def deliver(ai_text: Optional[str]) -> bool:
+            # Whichever of analysis/timeout fires first sends the notification
+            with lock:
+                if delivered:
+                    return False
+                delivered.append(True)
+            self.send_whatsapp_message(f"whatsapp:{manager_phone}", build_message(ai_text))
             return True
-        except Exception as e:
-            print(f"Error sending WhatsApp message: {e}")
-            return False
+        
+        def on_analysis_done(done: Future) -> None:
+            try:
+                result = done.result()
+            except Exception as e:
+                print(f"AI analysis failed for leave #{leave_id}: {e}")
+                result = {}
+            ai_text = result.get('ai_analysis') if result.get('status') == 'success' else None
+            if not deliver(ai_text) and ai_text:
+                self.send_whatsapp_message(f"whatsapp:{manager_phone}",
+                                           f"🤖 AI analysis for #{leave_id}:\n{ai_text[:500]}...",
+                                           priority=PRIORITY_BULK)
+        
+        self.schedule_after(AI_ANALYSIS_TIMEOUT, lambda: deliver(None))
+        future.add_done_callback(on_analysis_done)
+    
+    def schedule_after(self, delay: float, callback: Callable[[], object]) -> None:
+        """Run callback on the handler's deadline thread after `delay` seconds"""
+        with self._deadlines_ready:
+            heapq.heappush(self._deadlines, (time.monotonic() + delay, next(self._deadline_seq), callback))
+            self._deadlines_ready.notify()
+    
+    def _deadline_loop(self) -> None:
+        """One thread for every notification timeout (instead of a Timer thread per leave)"""
+        while True:
+            with self._deadlines_ready:
+                while not self._deadlines or self._deadlines[0][0] > time.monotonic():
+                    self._deadlines_ready.wait(self._deadlines[0][0] - time.monotonic() if self._deadlines else None)
+                _, _, callback = heapq.heappop(self._deadlines)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Scheduled callback failed: {e}")
+    
+    def format_ai_section(self, ai_text: Optional[str], limit: int = 400) -> str:
+        """Format the AI summary block of a manager notification"""
+        if ai_text:
+            return f"🤖 AI Analysis Summary:\n{ai_text[:limit]}..."
+        return "🤖 AI Analysis Summary:\nStill in progress - please review the details above."
     
     def route_message(self, phone: str, message: str) -> Tuple[str, str]:
         """Route message to appropriate handler based on phone number and message content"""
+        # Classified once; the handlers below read this instead of rescanning the text
+        classified = message_classifier.classify(message)
         
         # Check if message is a substitute response (Accept/Decline #ID)
-        if self.is_substitute_response(message):
-            return "substitute", self.handle_substitute_response(phone, message)
+        if classified.substitute_response:
+            return "substitute", self.handle_substitute_response(phone, message, classified)
         
         # Check if user is a manager
         if self.is_manager(phone):
             # Check if message looks like a manager command
-            if self.is_manager_command(message):
-                return "manager", self.handle_manager_message(phone, message)
+            if classified.manager_command:
+                return "manager", self.handle_manager_message(phone, message, classified)
             else:
                 # Manager might be applying for leave as an employee
                 employee = self.find_employee_by_phone(phone)
                 if employee:
-                    return "employee", self.handle_employee_message(phone, message, employee)
+                    return "employee", self.handle_employee_message(phone, message, employee, classified)
                 else:
                     return "manager", "👋 Hi! You can use manager commands or apply for leave as an employee.\n\nManager commands: 'List', 'Approve #1', 'Reject #1 reason'\nEmployee: 'I need 3 days leave for...'"
         else:
             # Regular employee
             employee = self.find_employee_by_phone(phone)
             if employee:
-                return "employee", self.handle_employee_message(phone, message, employee)
+                return "employee", self.handle_employee_message(phone, message, employee, classified)
             else:
-                return "error", "❌ Sorry, I couldn't find your employee record. Please contact HR directly or ensure you're messaging from your registered phone number."
+                return "error", EMPLOYEE_NOT_FOUND_MESSAGE
     
     def is_substitute_response(self, message: str) -> bool:
         """Check if message is a substitute response"""
-        message_lower = message.lower().strip()
-        
-        # Check for accept/decline patterns with leave ID
-        accept_patterns = [
-            r'accept\s+#?\d+',
-            r'yes\s+#?\d+',
-            r'confirm\s+#?\d+',
-            r'ok\s+#?\d+',
-        ]
-        
-        decline_patterns = [
-            r'decline\s+#?\d+',
-            r'reject\s+#?\d+',
-            r'no\s+#?\d+',
-            r'cannot\s+#?\d+',
-            r'can\'t\s+#?\d+',
-        ]
-        
-        all_patterns = accept_patterns + decline_patterns
-        
-        return any(re.search(pattern, message_lower) for pattern in all_patterns)
+        return message_classifier.is_substitute_response(message)
     
     def is_manager_command(self, message: str) -> bool:
         """Check if message looks like a manager command"""
-        message_lower = message.lower().strip()
-        
-        manager_keywords = [
-            'approve', 'reject', 'deny', 'status', 'list', 'pending', 
-            'assign', 'help', 'commands'
-        ]
-        
-        # Check for manager command patterns
-        has_leave_id = re.search(r'#?\d+', message)
-        has_manager_keyword = any(keyword in message_lower for keyword in manager_keywords)
-        
-        return has_manager_keyword or (has_leave_id and len(message.split()) <= 5)
+        return message_classifier.is_manager_command(message)
     
-    def handle_substitute_response(self, phone: str, message: str) -> str:
+    def handle_substitute_response(self, phone: str, message: str,
+                                   classified: Optional[MessageClassification] = None) -> str:
         """Handle substitute accept/decline responses"""
-        message_lower = message.lower().strip()
-        
-        # Extract leave ID
-        leave_id_match = re.search(r'#?(\d+)', message)
-        if not leave_id_match:
+        classified = classified or message_classifier.classify(message)
+        leave_id = classified.leave_id
+        if leave_id is None:
             return "❌ Please include the leave request ID. Example: 'Accept #1' or 'Decline #1'"
         
-        leave_id = int(leave_id_match.group(1))
-        
         # Find the substitute in database
         substitute = self.find_employee_by_phone(phone)
         if not substitute:
@@ -179,12 +256,10 @@ class UnifiedWhatsAppHandler:
         substitute_name = substitute['name']
         
         # Check if this person is actually assigned as substitute for this leave (case-insensitive comparison)
-        substitution = next((s for s in self.hr_agent.substitutions 
-                           if s.leave_id == leave_id 
-                           and s.substitute_name.lower().strip() == substitute_name.lower().strip()), None)
+        substitution = self.hr_agent.find_substitution(leave_id, substitute_name)
         if not substitution:
             # Debug: Show what we're looking for
-            all_subs_for_leave = [s for s in self.hr_agent.substitutions if s.leave_id == leave_id]
+            all_subs_for_leave = self.hr_agent.get_substitutions(leave_id)
             if all_subs_for_leave:
                 assigned_names = [s.substitute_name for s in all_subs_for_leave]
                 return f"❌ You are not assigned as substitute for leave request #{leave_id}.\n\nAssigned substitutes: {', '.join(assigned_names)}\nYour name in system: {substitute_name}"
@@ -192,9 +267,10 @@ class UnifiedWhatsAppHandler:
                 return f"❌ No substitute has been assigned to leave request #{leave_id} yet."
         
         # Determine if accepting or declining
-        if any(word in message_lower for word in ['accept', 'yes', 'confirm', 'ok']):
+        action = classified.substitute_action
+        if action == 'accept':
             return self.handle_substitute_accept(leave_id, substitute_name)
-        elif any(word in message_lower for word in ['decline', 'reject', 'no', 'cannot', 'can\'t']):
+        elif action == 'decline':
             return self.handle_substitute_decline(leave_id, substitute_name)
         else:
             return "❌ Please clearly state 'Accept' or 'Decline'. Example: 'Accept #1' or 'Decline #1'"
@@ -207,17 +283,13 @@ class UnifiedWhatsAppHandler:
             return f"❌ Error confirming substitution: {result['message']}"
         
         # Get leave details for notifications
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
+        leave = self.hr_agent.get_leave(leave_id)
         if not leave:
             return f"❌ Leave request #{leave_id} not found."
         
-        # Get AI analysis for manager
-        ai_analysis = self.hr_agent.get_ai_analysis(leave_id)
-        
-        # Notify the manager with substitute's acceptance
-        manager_phone = os.getenv('MANAGER_PHONE')
-        if manager_phone:
-            manager_msg = f"""
+        # Notify the manager with substitute's acceptance once the AI analysis is ready
+        def build_manager_msg(ai_text: Optional[str]) -> str:
+            return f"""
 🔔 New Leave Request #{leave_id} - Ready for Review
 
 👤 Employee: {leave.teacher_name}
@@ -227,8 +299,7 @@ class UnifiedWhatsAppHandler:
 👥 Substitute Status: ✅ ACCEPTED
 • {substitute_name} has confirmed availability
 
-🤖 AI Analysis Summary:
-{ai_analysis.get('ai_analysis', 'Analysis not available')[:400]}...
+{self.format_ai_section(ai_text)}
 
 📋 Action Required:
 • "Approve #{leave_id}" - Approve this request
@@ -237,8 +308,8 @@ class UnifiedWhatsAppHandler:
 
 Note: Employee will be notified after your decision.
             """.strip()
-            
-            self.send_whatsapp_message(f"whatsapp:{manager_phone}", manager_msg)
+        
+        self.notify_manager_after_analysis(leave_id, build_manager_msg)
         
         # Notify the employee that substitute accepted
         employee_phone = self.get_employee_phone_by_leave_id(leave_id)
@@ -253,7 +324,7 @@ Note: Employee will be notified after your decision.
 You'll be notified once a decision is made.
             """.strip()
             
-            self.send_whatsapp_message(employee_phone, employee_msg)
+            self.send_whatsapp_message(employee_phone, employee_msg, PRIORITY_BULK)
         
         return f"""
 ✅ Thank you for accepting the substitute assignment!
@@ -271,26 +342,21 @@ Thank you for your support! 🙏
     def handle_substitute_decline(self, leave_id: int, substitute_name: str) -> str:
         """Handle substitute declining the assignment"""
         # Update substitution status to declined
-        substitution = next((s for s in self.hr_agent.substitutions if s.leave_id == leave_id and s.substitute_name.lower().strip() == substitute_name.lower().strip()), None)
-        if substitution:
-            substitution.status = "declined"
+        self.hr_agent.decline_substitution(leave_id, substitute_name)
         
         # Get leave details
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
+        leave = self.hr_agent.get_leave(leave_id)
         if not leave:
             return f"❌ Leave request #{leave_id} not found."
         
-        # Get AI analysis for manager
-        ai_analysis = self.hr_agent.get_ai_analysis(leave_id)
+        # Available substitutes come from the roster; only the AI summary waits on the LLM
+        leave_info = self.hr_agent.get_leave_summary(leave_id)
+        substitutes = leave_info.get('substitutes', []) if leave_info['status'] == 'success' else []
+        substitute_list = "\n".join([f"• {sub}" for sub in substitutes]) if substitutes else "• No other substitutes available"
         
         # Notify the manager that substitute declined
-        manager_phone = os.getenv('MANAGER_PHONE')
-        if manager_phone:
-            # Get available substitutes for manager
-            substitutes = ai_analysis.get('substitutes', []) if ai_analysis['status'] == 'success' else []
-            substitute_list = "\n".join([f"• {sub}" for sub in substitutes]) if substitutes else "• No other substitutes available"
-            
-            manager_msg = f"""
+        def build_manager_msg(ai_text: Optional[str]) -> str:
+            return f"""
 🔔 Leave Request #{leave_id} - Substitute Declined
 
 👤 Employee: {leave.teacher_name}
@@ -300,8 +366,7 @@ Thank you for your support! 🙏
 👥 Substitute Status: ❌ DECLINED
 • {substitute_name} is not available
 
-🤖 AI Analysis Summary:
-{ai_analysis.get('ai_analysis', 'Analysis not available')[:400]}...
+{self.format_ai_section(ai_text)}
 
 💡 Available Alternatives:
 {substitute_list}
@@ -313,8 +378,8 @@ Thank you for your support! 🙏
 
 Note: Employee will be notified after your decision.
             """.strip()
-            
-            self.send_whatsapp_message(f"whatsapp:{manager_phone}", manager_msg)
+        
+        self.notify_manager_after_analysis(leave_id, build_manager_msg)
         
         # Notify the employee that substitute declined
         employee_phone = self.get_employee_phone_by_leave_id(leave_id)
@@ -332,7 +397,7 @@ Note: Employee will be notified after your decision.
 You'll be notified once a decision is made.
             """.strip()
             
-            self.send_whatsapp_message(employee_phone, employee_msg)
+            self.send_whatsapp_message(employee_phone, employee_msg, PRIORITY_BULK)
         
         return f"""
 ✅ Thank you for your response!
@@ -345,28 +410,17 @@ They will assign another substitute or make a decision on the leave request.
 
 Thank you for your prompt response! 🙏
         """.strip()
-        """Check if message looks like a manager command"""
-        message_lower = message.lower().strip()
-        
-        manager_keywords = [
-            'approve', 'reject', 'deny', 'status', 'list', 'pending', 
-            'assign', 'help', 'commands'
-        ]
-        
-        # Check for manager command patterns
-        has_leave_id = re.search(r'#?\d+', message)
-        has_manager_keyword = any(keyword in message_lower for keyword in manager_keywords)
-        
-        return has_manager_keyword or (has_leave_id and len(message.split()) <= 5)
     
     # ==================== EMPLOYEE HANDLERS ====================
     
-    def handle_employee_message(self, phone: str, message: str, employee: Dict) -> str:
+    def handle_employee_message(self, phone: str, message: str, employee: Dict,
+                                classified: Optional[MessageClassification] = None) -> str:
         """Handle employee leave application flow"""
         session_key = phone
+        classified = classified or message_classifier.classify(message)
         
         # Special commands
-        if message.lower().strip() in ['reset', 'restart', 'clear']:
+        if classified.text in ['reset', 'restart', 'clear']:
             if session_key in self.user_sessions:
                 del self.user_sessions[session_key]
             return f"Hi {employee['name']}! Session reset. How can I help you today?"
@@ -375,19 +429,34 @@ Thank you for your prompt response! 🙏
         if session_key not in self.user_sessions:
             self.user_sessions[session_key] = {
                 'state': 'initial',
-                'employee': employee,
+                'employee_key': normalize_phone(phone),
                 'leave_data': {}
             }
             print(f"DEBUG: Created new employee session for {phone}")
         
         session = self.user_sessions[session_key]
+        try:
+            return self.continue_employee_session(session_key, session, phone, message, employee, classified)
+        except SessionEmployeeNotFound:
+            print(f"DEBUG: Employee for session {session_key} left the roster; dropping the session")
+            if session_key in self.user_sessions:
+                del self.user_sessions[session_key]
+            return EMPLOYEE_NOT_FOUND_MESSAGE
+        finally:
+            # Persist this turn's changes so the next turn can land on any worker
+            self.user_sessions.save(session_key, session)
+    
+    def continue_employee_session(self, session_key: str, session: Dict, phone: str, message: str, employee: Dict,
+                                  classified: Optional[MessageClassification] = None) -> str:
+        """Advance the leave application conversation by one message"""
+        classified = classified or message_classifier.classify(message)
         state = session['state']
         
         print(f"DEBUG: Employee - Phone {phone}, State: {state}, Message: {message}")
         
         if state == 'initial':
-            if self.parse_leave_intent(message):
-                details = self.extract_leave_details(message)
+            if classified.leave_intent:
+                details = classified.leave_details
                 session['leave_data'].update(details)
                 
                 print(f"DEBUG: Extracted details: {details}")
@@ -410,7 +479,7 @@ Thank you for your prompt response! 🙏
                 return f"Hi {employee['name']}! I can help you apply for leave. Please tell me:\n• How many days do you need?\n• What's the reason?\n\nExample: 'I need 3 days leave for family emergency'\n\n(Type 'reset' to start over)"
         
         elif state == 'collecting_info':
-            new_details = self.extract_leave_details(message)
+            new_details = classified.leave_details
             session['leave_data'].update(new_details)
             
             print(f"DEBUG: New details from collecting_info: {new_details}")
@@ -429,9 +498,9 @@ Thank you for your prompt response! 🙏
                 return f"I still need:\n• {chr(10).join(missing)}\n\nPlease provide the missing information."
         
         elif state == 'confirming':
-            if message.lower().strip() in ['yes', 'y', 'confirm', 'ok', 'proceed']:
+            if classified.text in ['yes', 'y', 'confirm', 'ok', 'proceed']:
                 return self.ask_for_substitute(session)
-            elif message.lower().strip() in ['no', 'n', 'cancel']:
+            elif classified.text in ['no', 'n', 'cancel']:
                 del self.user_sessions[session_key]
                 return "Leave application cancelled. Feel free to start again anytime!"
             else:
@@ -443,169 +512,17 @@ Thank you for your prompt response! 🙏
         return "I didn't understand. Please try again or type 'help' for assistance.\n\n(Type 'reset' to start over)"
     
     def parse_leave_intent(self, message: str) -> bool:
-        """Check if message contains leave application intent using enhanced NLP"""
-        message_lower = message.lower().strip()
-        
-        # Enhanced leave keywords and phrases
-        leave_keywords = [
-            # Direct leave requests
-            'leave', 'apply for leave', 'need leave', 'want leave', 'request leave',
-            'take leave', 'get leave', 'have leave', 'go on leave',
-            
-            # Time off variations
-            'time off', 'day off', 'days off', 'week off', 'weeks off',
-            'vacation', 'holiday', 'break', 'rest',
-            
-            # Absence indicators
-            'absent', 'away', 'not available', 'unavailable', 'out of office',
-            'won\'t be in', 'will be away', 'cannot come', 'can\'t come',
-            
-            # Specific leave types
-            'sick leave', 'medical leave', 'casual leave', 'emergency leave',
-            'personal leave', 'family leave', 'maternity leave', 'paternity leave',
-            
-            # Informal expressions
-            'need to be away', 'have to go', 'going away', 'traveling',
-            'not coming', 'skip work', 'miss work', 'off work'
-        ]
-        
-        # Intent patterns with regex
-        intent_patterns = [
-            r'\bi\s+(need|want|would like|require|request)\s+.*(leave|time off|day off|vacation)',
-            r'\bi\s+(will be|am going to be|gonna be)\s+.*(away|absent|unavailable|out)',
-            r'\bi\s+(have to|need to|must)\s+.*(go|travel|be away|take time)',
-            r'\bcan\s+i\s+(get|have|take)\s+.*(leave|time off|day off)',
-            r'\bi\s+(won\'t|will not|cannot|can\'t)\s+be\s+(in|available|here)',
-            r'\bapply\s+for\s+.*(leave|vacation|time off)',
-            r'\brequest\s+.*(leave|vacation|time off)',
-            r'\btake\s+.*(leave|vacation|time off|day off|week off)',
-            r'\bneed\s+.*(leave|vacation|time off|day off|week off)',
-            r'\bgoing\s+on\s+.*(leave|vacation|holiday)',
-        ]
-        
-        # Check keywords
-        keyword_match = any(keyword in message_lower for keyword in leave_keywords)
-        
-        # Check patterns
-        pattern_match = any(re.search(pattern, message_lower) for pattern in intent_patterns)
-        
-        return keyword_match or pattern_match
+        """Check if message contains leave application intent"""
+        return message_classifier.parse_leave_intent(message)
     
     def extract_leave_details(self, message: str) -> Dict:
-        """Extract leave details from message using enhanced NLP"""
-        details = {}
-        message_lower = message.lower().strip()
-        
-        # Enhanced day extraction patterns
-        day_patterns = [
-            # Direct numbers with days/weeks
-            r'(\d+)\s*days?',
-            r'(\d+)\s*weeks?',
-            r'(\d+)\s*months?',
-            
-            # Written numbers
-            r'(one|two|three|four|five|six|seven|eight|nine|ten)\s*days?',
-            r'(one|two|three|four)\s*weeks?',
-            r'(a|an)\s*day',
-            r'(a|an)\s*week',
-            r'(a|an)\s*month',
-            
-            # Time expressions
-            r'for\s+(\d+)\s*days?',
-            r'for\s+(\d+)\s*weeks?',
-            r'for\s+(a|an|one)\s*(day|week)',
-            r'(\d+)\s*day\s*(leave|off|vacation)',
-            r'(\d+)\s*week\s*(leave|off|vacation)',
-            
-            # Casual expressions
-            r'couple\s+of\s+days',
-            r'few\s+days',
-            r'several\s+days',
-        ]
-        
-        # Extract days
-        for pattern in day_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                day_text = match.group(1)
-                
-                # Convert text numbers to digits
-                text_to_num = {
-                    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
-                    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10,
-                    'a': 1, 'an': 1, 'couple': 2, 'few': 3, 'several': 4
-                }
-                
-                if day_text.isdigit():
-                    days = int(day_text)
-                elif day_text in text_to_num:
-                    days = text_to_num[day_text]
-                else:
-                    continue
-                
-                # Convert weeks/months to days
-                if 'week' in match.group(0):
-                    days *= 7
-                elif 'month' in match.group(0):
-                    days *= 30
-                
-                details['days'] = days
-                break
-        
-        # Enhanced reason extraction patterns
-        reason_patterns = [
-            # Common prepositions
-            r'for\s+(.+?)(?:\.|$|because|due to|since)',
-            r'because\s+(.+?)(?:\.|$|for|due to)',
-            r'due to\s+(.+?)(?:\.|$|because|for)',
-            r'since\s+(.+?)(?:\.|$|because|for)',
-            r'as\s+(.+?)(?:\.|$|because|for)',
-            r'to\s+(.+?)(?:\.|$|because|for|due to)',  # Added "to" pattern
-            
-            # Reason indicators
-            r'reason:?\s*(.+?)(?:\.|$)',
-            r'purpose:?\s*(.+?)(?:\.|$)',
-            
-            # Medical/personal reasons (standalone)
-            r'(sick|ill|unwell|not feeling well)',
-            r'(doctor|hospital|medical|appointment)',
-            r'(family|personal|emergency)',
-            r'(vacation|holiday|travel|trip)',
-            r'(wedding|marriage|funeral)',
-            r'(pregnant|pregnancy|maternity|paternity)',
-            r'(business|conference|meeting|training)',  # Added business reasons
-            
-            # Contextual extraction - more comprehensive
-            r'i\s+(am|will be|have to|need to|must)\s+(.+?)(?:\.|$)',
-            r'my\s+(.+?)(?:\.|$)',
-            r'going\s+(.+?)(?:\.|$)',
-            r'attending\s+(.+?)(?:\.|$)',  # Added attending pattern
-            
-            # Catch-all for "off" constructions
-            r'off\s+(.+?)(?:\.|$)',
-            r'leave\s+(.+?)(?:\.|$)',
-        ]
-        
-        for pattern in reason_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                reason = match.group(1).strip()
-                
-                # Clean up the reason
-                reason = re.sub(r'^(to|for|because|due to|since|as)\s+', '', reason)
-                reason = re.sub(r'\s+', ' ', reason)  # Remove extra spaces
-                
-                # Skip very short or generic reasons
-                if len(reason) > 2 and reason not in ['it', 'this', 'that', 'some', 'the']:
-                    details['reason'] = reason
-                    break
-        
-        return details
+        """Extract leave days and reason from message"""
+        return message_classifier.extract_leave_details(message)
     
     def confirm_leave_details(self, session: Dict) -> str:
         """Show leave details for confirmation"""
         leave_data = session['leave_data']
-        employee = session['employee']
+        employee = self.session_employee(session)
         
         confirmation_msg = f"""
 📋 Leave Application Summary:
@@ -624,7 +541,7 @@ Please reply 'YES' to confirm or 'NO' to cancel.
     def ask_for_substitute(self, session: Dict) -> str:
         """Ask employee to suggest a substitute"""
         leave_data = session['leave_data']
-        employee = session['employee']
+        employee = self.session_employee(session)
         
         # Get available substitutes from HR system
         substitutes = self.hr_agent.suggest_substitutes(employee['name'], leave_data['days'])
@@ -674,10 +591,12 @@ Example: "Priya Sharma" or "Skip"
         substitute_name = self.extract_substitute_name(message)
         
         if substitute_name:
-            # Validate if substitute exists in database
-            substitute = self.hr_agent.find_teacher_by_name(substitute_name)
+            # Validate if substitute exists in database (tolerates case and small typos)
+            substitute = self.hr_agent.find_teacher_by_name(substitute_name, fuzzy=True)
             
             if substitute:
+                # Use the roster spelling so later Accept/Decline replies match
+                substitute_name = substitute['name']
                 session['leave_data']['suggested_substitute'] = substitute_name
                 session['leave_data']['substitute_note'] = f"Employee suggested: {substitute_name}"
                 
@@ -686,10 +605,7 @@ Example: "Priya Sharma" or "Skip"
                 return result
             else:
                 # Show available employees to help user
-                available_employees = []
-                for _, emp in self.hr_agent.df.iterrows():
-                    if emp.get('name') and emp['name'].lower() != session['employee']['name'].lower():
-                        available_employees.append(emp['name'])
+                available_employees = self.hr_agent.employee_names(exclude=self.session_employee(session)['name'])
                 
                 suggestion_list = ""
                 if available_employees:
@@ -724,7 +640,7 @@ Example: "Priya Sharma" or "Skip"
     def submit_leave_request_with_substitute(self, session: Dict, phone: str, substitute_name: str, substitute: Dict) -> str:
         """Submit leave request and notify substitute immediately"""
         leave_data = session['leave_data']
-        employee = session['employee']
+        employee = self.session_employee(session)
         
         # Submit to HR system
         result = self.hr_agent.submit_leave_request(
@@ -792,36 +708,12 @@ Thank you! 🙏
     
     def extract_substitute_name(self, message: str) -> str:
         """Extract substitute name from message"""
-        message = message.strip()
-        
-        # Remove common prefixes
-        prefixes_to_remove = [
-            'i suggest', 'i recommend', 'i prefer', 'i want', 'i choose',
-            'suggest', 'recommend', 'prefer', 'choose', 'select',
-            'my suggestion is', 'i think', 'maybe', 'how about'
-        ]
-        
-        message_lower = message.lower()
-        for prefix in prefixes_to_remove:
-            if message_lower.startswith(prefix):
-                message = message[len(prefix):].strip()
-                break
-        
-        # Clean up the name
-        message = re.sub(r'^(is|would be|could be|should be)\s+', '', message, flags=re.IGNORECASE)
-        message = message.strip('.,!?')
-        
-        # Basic name validation (at least 1 word, reasonable length)
-        words = message.split()
-        if len(words) >= 1 and len(message) <= 50 and len(message) >= 2 and all(word.replace('-', '').replace("'", '').isalpha() for word in words):
-            return message.title()  # Proper case
-        
-        return ""
+        return message_classifier.extract_substitute_name(message)
     
     def submit_leave_request(self, session: Dict, phone: str) -> str:
         """Submit the leave request and notify manager"""
         leave_data = session['leave_data']
-        employee = session['employee']
+        employee = self.session_employee(session)
         
         # Submit to HR system
         result = self.hr_agent.submit_leave_request(
@@ -835,9 +727,6 @@ Thank you! 🙏
         if result['status'] == 'success':
             leave_id = result['leave_id']
             
-            # Get AI analysis
-            ai_analysis = self.hr_agent.get_ai_analysis(leave_id)
-            
             # Prepare substitute information for manager
             substitute_info = ""
             if leave_data.get('suggested_substitute'):
@@ -845,10 +734,9 @@ Thank you! 🙏
             elif leave_data.get('substitute_note'):
                 substitute_info = f"\n\n👥 Substitute Coverage:\n• {leave_data['substitute_note']}"
             
-            # Notify manager
-            manager_phone = os.getenv('MANAGER_PHONE')
-            if manager_phone:
-                manager_msg = f"""
+            # Notify manager once the background AI analysis is ready
+            def build_manager_msg(ai_text: Optional[str]) -> str:
+                return f"""
 🔔 New Leave Request #{leave_id}
 
 👤 Employee: {employee['name']}
@@ -857,16 +745,15 @@ Thank you! 🙏
 📅 Days Requested: {leave_data['days']} days
 📝 Reason: {leave_data['reason']}{substitute_info}
 
-🤖 AI Analysis Summary:
-{ai_analysis.get('ai_analysis', 'Analysis not available')[:500]}...
+{self.format_ai_section(ai_text, limit=500)}
 
 Commands:
 • "Approve #{leave_id}" - Approve this request
 • "Reject #{leave_id} [reason]" - Reject with reason
 • "Status #{leave_id}" - Check status
                 """.strip()
-                
-                self.send_whatsapp_message(f"whatsapp:{manager_phone}", manager_msg)
+            
+            self.notify_manager_after_analysis(leave_id, build_manager_msg)
             
             # Clear session
             if phone in self.user_sessions:
@@ -893,9 +780,10 @@ Thank you! 🙏
     
     # ==================== MANAGER HANDLERS ====================
     
-    def handle_manager_message(self, phone: str, message: str) -> str:
+    def handle_manager_message(self, phone: str, message: str,
+                               classified: Optional[MessageClassification] = None) -> str:
         """Handle manager WhatsApp messages"""
-        command = self.parse_manager_command(message)
+        command = (classified or message_classifier.classify(message)).command
         action = command.get('action')
         
         print(f"DEBUG: Manager command - Action: {action}, Command: {command}")
@@ -919,62 +807,21 @@ Thank you! 🙏
     
     def parse_manager_command(self, message: str) -> Dict:
         """Parse manager commands from WhatsApp message"""
-        message_lower = message.lower().strip()
-        
-        # Check for approval commands
-        if any(word in message_lower for word in ['approve', 'accept']):
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
-                return {'action': 'approve', 'leave_id': int(leave_id_match.group(1))}
-        
-        # Check for rejection commands
-        elif any(word in message_lower for word in ['reject', 'deny']):
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
-                return {'action': 'reject', 'leave_id': int(leave_id_match.group(1)), 'reason': message}
-        
-        # Check for substitute assignment
-        elif 'assign' in message_lower:
-            assign_match = re.search(r'assign\s+(.+?)\s+to\s+#?(\d+)', message_lower)
-            if assign_match:
-                return {
-                    'action': 'assign',
-                    'substitute_name': assign_match.group(1).strip(),
-                    'leave_id': int(assign_match.group(2))
-                }
-        
-        # Check for status inquiry - differentiate between single leave and all leaves
-        elif any(word in message_lower for word in ['status', 'check', 'info']):
-            leave_id_match = re.search(r'#?(\d+)', message)
-            if leave_id_match:
-                return {'action': 'status', 'leave_id': int(leave_id_match.group(1))}
-            else:
-                # No ID provided, show all leaves status
-                return {'action': 'status_all'}
-        
-        # Check for list pending leaves
-        elif any(word in message_lower for word in ['list', 'pending', 'show']):
-            return {'action': 'list'}
-        
-        # Check for help
-        elif 'help' in message_lower or 'commands' in message_lower:
-            return {'action': 'help'}
-        
-        return {'action': 'unknown'}
+        return message_classifier.parse_manager_command(message)
     
     def approve_leave(self, leave_id: int) -> str:
         """Approve a leave request (only after substitute is confirmed)"""
-        ai_result = self.hr_agent.get_ai_analysis(leave_id)
-        if ai_result['status'] != 'success':
-            return f"❌ Error: {ai_result['message']}"
+        leave_info = self.hr_agent.get_leave_summary(leave_id)
+        if leave_info['status'] != 'success':
+            return f"❌ Error: {leave_info['message']}"
         
         result = self.hr_agent.approve_leave(leave_id)
         if result['status'] != 'success':
             return f"❌ Error: {result['message']}"
         
         # Get substitute info
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
-        subs = [s for s in self.hr_agent.substitutions if s.leave_id == leave_id and s.status == 'confirmed']
+        leave = self.hr_agent.get_leave(leave_id)
+        subs = self.hr_agent.get_substitutions(leave_id, 'confirmed')
         substitute_name = subs[0].substitute_name if subs else "None"
         
         # Notify the employee of final approval
@@ -985,8 +832,8 @@ Thank you! 🙏
 
 Your leave request #{leave_id} has been approved! 🎉
 
-📅 Days: {ai_result['leave_days']} days
-📝 Reason: {ai_result['reason']}
+📅 Days: {leave_info['leave_days']} days
+📝 Reason: {leave_info['reason']}
 👥 Substitute: {substitute_name}
 
 Your leave is now official. Enjoy your time off! 🌟
@@ -994,7 +841,7 @@ Your leave is now official. Enjoy your time off! 🌟
 Have a great time!
             """.strip()
             
-            self.send_whatsapp_message(employee_phone, employee_msg)
+            self.send_whatsapp_message(employee_phone, employee_msg, PRIORITY_BULK)
         
         # Notify the substitute of final approval
         if subs:
@@ -1006,20 +853,20 @@ Have a great time!
 The leave request you accepted has been approved!
 
 📋 Leave Request: #{leave_id}
-👤 Employee: {ai_result['teacher_name']}
-📅 Days: {ai_result['leave_days']} days
+👤 Employee: {leave_info['teacher_name']}
+📅 Days: {leave_info['leave_days']} days
 👥 Your Role: Substitute Teacher
 
 The leave is now official. Thank you for your support! 🙏
                 """.strip()
                 
-                self.send_whatsapp_message(f"whatsapp:+{substitute.get('phone')}", substitute_msg)
+                self.send_whatsapp_message(f"whatsapp:+{substitute.get('phone')}", substitute_msg, PRIORITY_BULK)
         
         return f"""
 ✅ Leave #{leave_id} APPROVED!
 
-👤 Employee: {ai_result['teacher_name']}
-📅 Days: {ai_result['leave_days']} days
+👤 Employee: {leave_info['teacher_name']}
+📅 Days: {leave_info['leave_days']} days
 👥 Substitute: {substitute_name}
 
 ✅ Notifications sent to:
@@ -1060,12 +907,12 @@ Thank you for your support! 🙏
     
     def reject_leave(self, leave_id: int, reason: str) -> str:
         """Reject a leave request"""
-        ai_result = self.hr_agent.get_ai_analysis(leave_id)
-        if ai_result['status'] != 'success':
-            return f"❌ Error: {ai_result['message']}"
+        leave_info = self.hr_agent.get_leave_summary(leave_id)
+        if leave_info['status'] != 'success':
+            return f"❌ Error: {leave_info['message']}"
         
         # Get substitute info before rejecting
-        subs = [s for s in self.hr_agent.substitutions if s.leave_id == leave_id]
+        subs = self.hr_agent.get_substitutions(leave_id)
         substitute_name = subs[0].substitute_name if subs else None
         substitute_status = subs[0].status if subs else None
         
@@ -1081,15 +928,15 @@ Thank you for your support! 🙏
 
 Your leave request #{leave_id} has been reviewed and cannot be approved at this time.
 
-📅 Requested: {ai_result['leave_days']} days
-📝 Reason: {ai_result['reason']}
+📅 Requested: {leave_info['leave_days']} days
+📝 Reason: {leave_info['reason']}
 
 💬 Manager's feedback: {reason}
 
 Please contact your manager to discuss alternative arrangements or resubmit with different dates.
             """.strip()
             
-            self.send_whatsapp_message(employee_phone, employee_msg)
+            self.send_whatsapp_message(employee_phone, employee_msg, PRIORITY_BULK)
         
         # Notify the substitute if they had accepted
         if substitute_name and substitute_status == 'confirmed':
@@ -1101,14 +948,14 @@ Please contact your manager to discuss alternative arrangements or resubmit with
 The leave request you accepted has been declined by management.
 
 📋 Leave Request: #{leave_id}
-👤 Employee: {ai_result['teacher_name']}
-📅 Days: {ai_result['leave_days']} days
+👤 Employee: {leave_info['teacher_name']}
+📅 Days: {leave_info['leave_days']} days
 
 Your substitute assignment is no longer needed.
 Thank you for your willingness to help! 🙏
                 """.strip()
                 
-                self.send_whatsapp_message(f"whatsapp:+{substitute.get('phone')}", substitute_msg)
+                self.send_whatsapp_message(f"whatsapp:+{substitute.get('phone')}", substitute_msg, PRIORITY_BULK)
         
         notifications = "• Employee - Leave rejected"
         if substitute_name and substitute_status == 'confirmed':
@@ -1117,7 +964,7 @@ Thank you for your willingness to help! 🙏
         return f"""
 ❌ Leave #{leave_id} REJECTED
 
-👤 Employee: {ai_result['teacher_name']}
+👤 Employee: {leave_info['teacher_name']}
 📝 Rejection reason: {reason}
 
 ✅ Notifications sent to:
@@ -1157,7 +1004,7 @@ Thank you for your support! 🙏
             return f"❌ Error: {result['message']}"
         
         # Get leave and employee details
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
+        leave = self.hr_agent.get_leave(leave_id)
         employee_name = leave.teacher_name if leave else "Unknown Employee"
         
         # Notify the substitute immediately
@@ -1176,7 +1023,7 @@ Thank you for your support! 🙏
 You'll be notified once they respond and the manager makes a final decision.
             """.strip()
             
-            self.send_whatsapp_message(employee_phone, employee_msg)
+            self.send_whatsapp_message(employee_phone, employee_msg, PRIORITY_BULK)
         
         notification_status = "✅ Notified via WhatsApp" if notification_sent else "⚠️ WhatsApp notification failed"
         
@@ -1222,24 +1069,18 @@ Current Status: Substitute Assigned (Pending Confirmation)
     
     def get_all_leaves_status(self) -> str:
         """Get comprehensive status of all leave requests"""
-        if not self.hr_agent.leaves:
+        total = self.hr_agent.leave_count()
+        if not total:
             return "📋 No leave requests in the system yet."
         
-        # Group leaves by status
-        pending_leaves = []
-        approved_leaves = []
-        rejected_leaves = []
-        in_progress_leaves = []
-        
-        for leave in self.hr_agent.leaves:
-            if leave.status == 'approved':
-                approved_leaves.append(leave)
-            elif leave.status == 'rejected':
-                rejected_leaves.append(leave)
-            elif leave.status == 'pending':
-                pending_leaves.append(leave)
-            else:
-                in_progress_leaves.append(leave)
+        # Group leaves by status (served straight from the status index)
+        pending_leaves = self.hr_agent.list_leaves('pending')
+        approved_leaves = self.hr_agent.list_leaves('approved')
+        rejected_leaves = self.hr_agent.list_leaves('rejected')
+        in_progress_leaves = self.hr_agent.list_leaves('substitute_assigned', 'substitute_confirmed')
+        
+        # Warm the analyses of the open leaves in one batch
+        self.hr_agent.prefetch_ai_analyses([leave.id for leave in pending_leaves + in_progress_leaves])
         
         msg = "📊 ALL LEAVE REQUESTS STATUS\n"
         msg += "=" * 35 + "\n\n"
@@ -1261,7 +1102,7 @@ Current Status: Substitute Assigned (Pending Confirmation)
             msg += "-" * 35 + "\n"
             for leave in in_progress_leaves:
                 # Get substitute info
-                subs = [s for s in self.hr_agent.substitutions if s.leave_id == leave.id]
+                subs = self.hr_agent.get_substitutions(leave.id)
                 sub_info = "None"
                 if subs:
                     sub_info = f"{subs[0].substitute_name} ({subs[0].status})"
@@ -1285,7 +1126,7 @@ Current Status: Substitute Assigned (Pending Confirmation)
             msg += "-" * 35 + "\n"
             for leave in approved_leaves:
                 # Get substitute info
-                subs = [s for s in self.hr_agent.substitutions if s.leave_id == leave.id]
+                subs = self.hr_agent.get_substitutions(leave.id)
                 sub_info = "None"
                 if subs:
                     sub_info = subs[0].substitute_name
@@ -1307,7 +1148,7 @@ Current Status: Substitute Assigned (Pending Confirmation)
         # Summary
         msg += "=" * 35 + "\n"
         msg += f"📊 SUMMARY:\n"
-        msg += f"Total: {len(self.hr_agent.leaves)} | "
+        msg += f"Total: {total} | "
         msg += f"Pending: {len(pending_leaves)} | "
         msg += f"In Progress: {len(in_progress_leaves)} | "
         msg += f"Approved: {len(approved_leaves)} | "
@@ -1317,11 +1158,14 @@ Current Status: Substitute Assigned (Pending Confirmation)
     
     def list_pending_leaves(self) -> str:
         """List all pending leave requests"""
-        pending_leaves = [l for l in self.hr_agent.leaves if l.status == 'pending']
+        pending_leaves = self.hr_agent.list_leaves('pending')
         
         if not pending_leaves:
             return "📋 No pending leave requests at the moment."
         
+        # Warm the analyses of everything listed in one batch (served from cache afterwards)
+        self.hr_agent.prefetch_ai_analyses([leave.id for leave in pending_leaves])
+        
         msg = "📋 Pending Leave Requests:\n\n"
         for leave in pending_leaves:
             msg += f"#{leave.id} - {leave.teacher_name}\n"
@@ -1333,7 +1177,7 @@ Current Status: Substitute Assigned (Pending Confirmation)
     
     def get_employee_phone_by_leave_id(self, leave_id: int) -> Optional[str]:
         """Get employee phone number by leave ID"""
-        leave = next((l for l in self.hr_agent.leaves if l.id == leave_id), None)
+        leave = self.hr_agent.get_leave(leave_id)
         if not leave:
             return None
         
@@ -1371,17 +1215,26 @@ You can also apply for leave as an employee by saying:
 "I need 3 days leave for..."
         """.strip()
 
-# Flask webhook endpoint
-@app.route('/webhook', methods=['POST', 'GET'])
-def unified_webhook():
-    """Handle all incoming WhatsApp messages - routes internally"""
+def get_unified_handler() -> UnifiedWhatsAppHandler:
+    """Get the process-wide handler, creating it on first use"""
     global unified_handler_instance
     
     # Use singleton pattern to maintain session state
     if unified_handler_instance is None:
-        unified_handler_instance = UnifiedWhatsAppHandler()
+        with _unified_handler_lock:
+            if unified_handler_instance is None:
+                handler = UnifiedWhatsAppHandler()
+                # Build the Gemini chain off the request path
+                handler.hr_agent.start_warm_up()
+                unified_handler_instance = handler
     
-    handler = unified_handler_instance
+    return unified_handler_instance
+
+# Flask webhook endpoint
+@app.route('/webhook', methods=['POST', 'GET'])
+def unified_webhook():
+    """Handle all incoming WhatsApp messages - routes internally"""
+    handler = get_unified_handler()
     
     print(f"Unified webhook called with method: {request.method}")
     print(f"Request data: {request.values}")
@@ -1393,23 +1246,28 @@ def unified_webhook():
         # Get message details
         incoming_msg = request.values.get('Body', '').strip()
         from_number = request.values.get('From', '')
+        message_sid = request.values.get('MessageSid')
         
-        print(f"Incoming message: '{incoming_msg}' from {from_number}")
+        print(f"Incoming message: '{incoming_msg}' from {from_number} ({message_sid})")
         
-        # Extract phone number
-        phone = handler.extract_phone_number(from_number)
-        print(f"Extracted phone: {phone}")
-        
-        # Route message to appropriate handler
-        message_type, response_msg = handler.route_message(phone, incoming_msg)
-        print(f"Message type: {message_type}")
-        print(f"Response: {response_msg}")
-        
-        # Create response
-        resp = MessagingResponse()
-        resp.message(response_msg)
+        def process_message() -> str:
+            # Extract phone number
+            phone = handler.extract_phone_number(from_number)
+            print(f"Extracted phone: {phone}")
+            
+            # Route message to appropriate handler
+            message_type, response_msg = handler.route_message(phone, incoming_msg)
+            print(f"Message type: {message_type}")
+            print(f"Response: {response_msg}")
+            
+            # Create response
+            resp = MessagingResponse()
+            resp.message(response_msg)
+            return str(resp)
         
-        return Response(str(resp), mimetype='text/xml')
+        # Twilio retries slow deliveries with the same MessageSid: answer those from cache
+        twiml = handler.dedupe.process(message_sid, process_message, lambda: str(MessagingResponse()))
+        return Response(twiml, mimetype='text/xml')
         
     except Exception as e:
         print(f"Error in unified webhook: {e}")
@@ -1424,6 +1282,39 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "unified-whatsapp-handler", "timestamp": datetime.now().isoformat()}
 
+@app.route('/metrics', methods=['GET'])
+@require_admin_token
+def metrics():
+    """Runtime metrics (outbound notification queue, webhook dedupe, sessions, roster, AI fast path, response cache, LLM guard)"""
+    if unified_handler_instance is None:
+        return {"status": "idle"}
+    
+    handler = unified_handler_instance
+    return {
+        "outbound": handler.outbound.stats(),
+        "webhook_dedupe": handler.dedupe.stats(),
+        "sessions": {
+            "user": handler.user_sessions.stats(),
+            "manager": handler.manager_sessions.stats()
+        },
+        "roster": {
+            "employees": len(handler.hr_agent.roster_index.records),
+            **handler.hr_agent.roster_watcher.stats()
+        },
+        "ai_analysis": handler.hr_agent.analysis_stats(),
+        "llm_cache": handler.hr_agent.llm_cache.stats() if handler.hr_agent.llm_cache else None,
+        "llm_guard": handler.hr_agent.llm_guard.stats()
+    }
+
+@app.route('/outbound/<message_id>', methods=['GET'])
+@require_admin_token
+def outbound_status(message_id):
+    """Delivery status of a queued outbound message (no recipient or text)"""
+    status = get_unified_handler().outbound.get_status(message_id)
+    if status is None:
+        return {"status": "error", "message": "Message not found"}, 404
+    return status
+
 if __name__ == '__main__':
     import os
     port = int(os.getenv('PORT', 5000))
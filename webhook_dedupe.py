@@ -0,0 +1,168 @@
+"""
+Webhook Dedupe - Process each Twilio MessageSid once
+Twilio re-delivers a webhook when the first attempt is slow; retries get the
+original TwiML response instead of re-running the conversation logic.
+With HR_STORAGE_BACKEND=sqlite the record is shared, so a retry that lands
+on a different gunicorn worker is still recognised.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlite_db import SQLiteDatabase
+from ttl_cache import TTLCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    message_sid TEXT PRIMARY KEY,
+    response TEXT,               -- NULL while the first delivery is still running
+    received_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received ON webhook_deliveries (received_at);
+"""
+
+
+class _Delivery:
+    """Outcome of the first delivery of a MessageSid (filled in when it finishes)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response: Optional[str] = None
+
+
+class WebhookDeduplicator:
+    """Bounded, TTL-evicting MessageSid -> response cache with in-flight joining"""
+
+    def __init__(self, maxsize: Optional[int] = None, ttl: Optional[float] = None,
+                 retry_wait: Optional[float] = None):
+        self.cache = TTLCache(
+            maxsize=maxsize or int(os.getenv('WEBHOOK_DEDUPE_SIZE', '10000')),
+            ttl=ttl or float(os.getenv('WEBHOOK_DEDUPE_TTL_SECONDS', '3600'))
+        )
+        # How long a retry waits for the original delivery that is still running
+        self.retry_wait = retry_wait or float(os.getenv('WEBHOOK_RETRY_WAIT_SECONDS', '10'))
+        self.duplicates = 0
+        self.duplicates_unanswered = 0
+
+    def process(self, message_sid: Optional[str], handler: Callable[[], str],
+                empty_response: Callable[[], str]) -> str:
+        """Run handler() for the first delivery of a MessageSid; replay its response for retries"""
+        if not message_sid:
+            return handler()
+
+        delivery, first = self.cache.get_or_create(message_sid, _Delivery)
+        if first:
+            try:
+                delivery.response = handler()
+            except BaseException:
+                # Let Twilio's next retry try again from scratch
+                self.cache.pop(message_sid)
+                raise
+            finally:
+                delivery.done.set()
+            return delivery.response
+
+        self.duplicates += 1
+        print(f"Duplicate delivery of {message_sid}; replaying original response")
+        if delivery.done.wait(self.retry_wait) and delivery.response is not None:
+            return delivery.response
+
+        # Original is still being processed (or failed): acknowledge without a reply
+        # rather than running the conversation logic a second time
+        self.duplicates_unanswered += 1
+        return empty_response()
+
+    def stats(self) -> Dict:
+        """Duplicate counters and cache occupancy"""
+        return {
+            "duplicates": self.duplicates,
+            "duplicates_unanswered": self.duplicates_unanswered,
+            **self.cache.stats()
+        }
+
+
+class SQLiteWebhookDeduplicator:
+    """MessageSid -> response records in the shared SQLite database
+
+    The first worker to insert a MessageSid runs the handler; any other
+    worker receiving a retry polls for the stored response.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None,
+                 retry_wait: Optional[float] = None):
+        self.db = SQLiteDatabase(path or os.getenv('HR_DB_PATH', 'hr.db'), SCHEMA)
+        self.ttl = ttl or float(os.getenv('WEBHOOK_DEDUPE_TTL_SECONDS', '3600'))
+        self.retry_wait = retry_wait or float(os.getenv('WEBHOOK_RETRY_WAIT_SECONDS', '10'))
+        self.poll_interval = 0.1
+        self.duplicates = 0
+        self.duplicates_unanswered = 0
+        self._last_prune = 0.0
+
+    def _claim(self, message_sid: str) -> bool:
+        now = time.time()
+        with self.db.transaction() as conn:
+            if now - self._last_prune > 60:
+                conn.execute("DELETE FROM webhook_deliveries WHERE received_at < ?", (now - self.ttl,))
+                self._last_prune = now
+            return conn.execute(
+                "INSERT OR IGNORE INTO webhook_deliveries (message_sid, received_at) VALUES (?, ?)",
+                (message_sid, now)
+            ).rowcount == 1
+
+    def _stored_response(self, message_sid: str) -> Optional[str]:
+        row = self.db.conn.execute(
+            "SELECT response FROM webhook_deliveries WHERE message_sid = ?", (message_sid,)
+        ).fetchone()
+        return row["response"] if row else None
+
+    def process(self, message_sid: Optional[str], handler: Callable[[], str],
+                empty_response: Callable[[], str]) -> str:
+        """Run handler() for the first delivery of a MessageSid; replay its response for retries"""
+        if not message_sid:
+            return handler()
+
+        if self._claim(message_sid):
+            try:
+                response = handler()
+            except BaseException:
+                # Let Twilio's next retry try again from scratch
+                with self.db.transaction() as conn:
+                    conn.execute("DELETE FROM webhook_deliveries WHERE message_sid = ?", (message_sid,))
+                raise
+            with self.db.transaction() as conn:
+                conn.execute("UPDATE webhook_deliveries SET response = ? WHERE message_sid = ?",
+                             (response, message_sid))
+            return response
+
+        self.duplicates += 1
+        print(f"Duplicate delivery of {message_sid}; replaying original response")
+        deadline = time.monotonic() + self.retry_wait
+        while True:
+            response = self._stored_response(message_sid)
+            if response is not None:
+                return response
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        self.duplicates_unanswered += 1
+        return empty_response()
+
+    def stats(self) -> Dict:
+        """Duplicate counters (this worker) and shared record count"""
+        size = self.db.conn.execute("SELECT COUNT(*) FROM webhook_deliveries").fetchone()[0]
+        return {
+            "duplicates": self.duplicates,
+            "duplicates_unanswered": self.duplicates_unanswered,
+            "size": size,
+            "ttl_seconds": self.ttl
+        }
+
+
+def create_webhook_deduplicator(backend: Optional[str] = None):
+    """Deduplicator for HR_STORAGE_BACKEND: in-process for 'memory', shared for 'sqlite'"""
+    backend = (backend or os.getenv('HR_STORAGE_BACKEND', 'memory')).lower()
+    if backend == 'sqlite':
+        return SQLiteWebhookDeduplicator()
+    return WebhookDeduplicator()